@@ -0,0 +1,272 @@
+import heapq
+import threading
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from functools import lru_cache
+from records import DAY_MICROS, EXCLUDED_STATUSES, from_micros
+
+BUCKETS = ("day", "week", "month")
+FUNNEL = ["pending", "processing", "shipped", "delivered"]
+
+@lru_cache(maxsize=4096)
+def bucket_keys(day: str) -> tuple:
+    """(day, week, month) keys for a YYYY-MM-DD day; weeks are keyed by their Monday"""
+    try:
+        d = date.fromisoformat(day)
+    except ValueError:
+        return (day, day, day[:7])
+    return (day, (d - timedelta(days=d.weekday())).isoformat(), day[:7])
+
+class SalesRollups:
+    """Revenue per day/week/month, product totals and status counts
+
+    Kept current from orders store notifications, so reads only touch the
+    rolled-up tables. reset() is the full rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.revenue = {bucket: defaultdict(lambda: [0, 0.0]) for bucket in BUCKETS}
+        self.products = defaultdict(lambda: [0, 0.0])
+        self.by_status = Counter()
+
+    def _add(self, order, sign):
+        """Count (sign=1) or uncount (sign=-1) an order's sales"""
+        keys = bucket_keys(str(order.get("date", ""))[:10])
+        total = order.get("total") or 0
+        for bucket, key in zip(BUCKETS, keys):
+            row = self.revenue[bucket][key]
+            row[0] += sign
+            row[1] += sign * total
+        for name, qty in order["items"].items():
+            row = self.products[name]
+            row[0] += sign
+            row[1] += sign * qty
+
+    def _add_archive(self, archive):
+        """Count every archived order straight from the archive's columns"""
+        statuses = archive.dictionary("status")
+        excluded = {code for code, status in enumerate(statuses) if status in EXCLUDED_STATUSES}
+        days = defaultdict(lambda: [0, 0.0])
+        lines = defaultdict(lambda: [0, 0.0])
+        items, quantities = archive.column("item"), archive.column("quantity")
+        counts = Counter()
+        lo = 0
+        for status, micros, total, hi in archive.scan("status", "date", "total", "item_end"):
+            counts[status] += 1
+            if status not in excluded:
+                row = days[micros // DAY_MICROS]
+                row[0] += 1
+                row[1] += total
+                for j in range(lo, hi):
+                    row = lines[items[j]]
+                    row[0] += 1
+                    row[1] += quantities[j]
+            lo = hi
+        for code, n in counts.items():
+            self.by_status[statuses[code]] += n
+        for day, (n, revenue) in days.items():
+            for bucket, key in zip(BUCKETS, bucket_keys(from_micros(day * DAY_MICROS)[:10])):
+                row = self.revenue[bucket][key]
+                row[0] += n
+                row[1] += revenue
+        names = archive.dictionary("item")
+        for code, (n, qty) in lines.items():
+            row = self.products[names[code]]
+            row[0] += n
+            row[1] += qty
+
+    def reset(self, orders, archive=None):
+        with self._lock:
+            self._clear()
+            if archive is not None and archive.rows:
+                self._add_archive(archive)
+            for order in orders:
+                self.by_status[order["status"]] += 1
+                if order["status"] not in EXCLUDED_STATUSES:
+                    self._add(order, 1)
+
+    def order_added(self, order):
+        with self._lock:
+            self.by_status[order["status"]] += 1
+            if order["status"] not in EXCLUDED_STATUSES:
+                self._add(order, 1)
+
+    def status_changed(self, order, old_status):
+        with self._lock:
+            self.by_status[old_status] -= 1
+            self.by_status[order["status"]] += 1
+            was, now = old_status not in EXCLUDED_STATUSES, order["status"] not in EXCLUDED_STATUSES
+            if was != now:
+                self._add(order, 1 if now else -1)
+
+    def revenue_series(self, bucket="day", start=None, end=None):
+        """[{bucket, orders, revenue}] oldest first, optionally limited to the buckets holding start..end days"""
+        index = BUCKETS.index(bucket)
+        start = bucket_keys(start)[index] if start is not None else None
+        end = bucket_keys(end)[index] if end is not None else None
+        with self._lock:
+            rows = [(key, n, revenue) for key, (n, revenue) in self.revenue[bucket].items() if n]
+        rows.sort()
+        return [{"bucket": key, "orders": n, "revenue": round(revenue, 2)} for key, n, revenue in rows
+                if (start is None or key >= start) and (end is None or key <= end)]
+
+    def top_products(self, limit=10, by="quantity"):
+        column = 1 if by == "quantity" else 0
+        with self._lock:
+            rows = [(name, n, qty) for name, (n, qty) in self.products.items() if n]
+        rows.sort(key=lambda r: (-r[column + 1], r[0]))
+        return [{"name": name, "orders": n, "quantity": round(qty, 3)} for name, n, qty in rows[:limit]]
+
+    def status_funnel(self):
+        """Orders per status, plus how many reached each stage of FUNNEL or beyond"""
+        with self._lock:
+            counts = {status: n for status, n in self.by_status.items() if n}
+        stages = []
+        reached = 0
+        for status in reversed(FUNNEL):
+            reached += counts.get(status, 0)
+            stages.append({"status": status, "orders": counts.get(status, 0), "reached": reached})
+        stages.reverse()
+        other = {status: n for status, n in counts.items() if status not in FUNNEL}
+        return {"stages": stages, "other": other, "total": sum(counts.values())}
+
+CUSTOMER_SORTS = ("spend", "orders", "last_order", "username", "email")
+# Pages this far into the list or further sort every customer (and keep that
+# order); nearer pages are picked with a heap.
+FULL_SORT_FRACTION = 0.1
+
+class CustomerLedger:
+    """Per-customer order count, spend, last order date and status mix
+
+    Kept current from orders store notifications like SalesRollups; users
+    are joined in at read time so customers without orders still show up.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.customers = {}
+        # Bumped on every change, so cached orderings know when they are stale.
+        self.version = 0
+        self._users = (None, [])
+        self._orderings = {}
+
+    def _count(self, order):
+        row = self.customers.get(order["email"])
+        if row is None:
+            # [orders, spend, last order date, orders per status]
+            row = self.customers[order["email"]] = [0, 0.0, "", Counter()]
+        row[0] += 1
+        if order["status"] not in EXCLUDED_STATUSES:
+            row[1] += order.get("total") or 0
+        row[2] = max(row[2], str(order.get("date", "")))
+        row[3][order["status"]] += 1
+
+    def _count_archive(self, archive):
+        """Count every archived order straight from the archive's columns"""
+        statuses = archive.dictionary("status")
+        excluded = {code for code, status in enumerate(statuses) if status in EXCLUDED_STATUSES}
+        # email code -> [orders, spend, last order (micros), orders per status code]
+        rows = {}
+        for email, status, micros, total in archive.scan("email", "status", "date", "total"):
+            row = rows.get(email)
+            if row is None:
+                row = rows[email] = [0, 0.0, micros, Counter()]
+            row[0] += 1
+            if status not in excluded:
+                row[1] += total
+            if micros > row[2]:
+                row[2] = micros
+            row[3][status] += 1
+        emails = archive.dictionary("email")
+        for code, (n, spend, last, by_status) in rows.items():
+            self.customers[emails[code]] = [n, spend, from_micros(last),
+                                            Counter({statuses[s]: k for s, k in by_status.items()})]
+
+    def reset(self, orders, archive=None):
+        with self._lock:
+            self.version += 1
+            self.customers = {}
+            if archive is not None and archive.rows:
+                self._count_archive(archive)
+            for order in orders:
+                self._count(order)
+
+    def order_added(self, order):
+        with self._lock:
+            self.version += 1
+            self._count(order)
+
+    def status_changed(self, order, old_status):
+        with self._lock:
+            self.version += 1
+            row = self.customers.get(order["email"])
+            if row is None:
+                return
+            row[3][old_status] -= 1
+            row[3][order["status"]] += 1
+            was, now = old_status not in EXCLUDED_STATUSES, order["status"] not in EXCLUDED_STATUSES
+            if was != now:
+                row[1] += (order.get("total") or 0) * (1 if now else -1)
+
+    def _customer_emails(self, users):
+        """Emails of role "user" accounts, sorted; kept until the users dict is replaced"""
+        if self._users[0] is not users:
+            self._users = (users, sorted(email for email, user in users.items()
+                                         if user.get("role", "user") == "user"))
+        return self._users[1]
+
+    def _ordered(self, users, sort, descending, count):
+        """At least the first count customer emails in page order"""
+        cached = self._orderings.get((sort, descending))
+        if cached is not None and cached[0] == self.version and cached[1] is users and \
+                (cached[3] or len(cached[2]) >= count):
+            return cached[2]
+        emails = self._customer_emails(users)
+        customers = self.customers
+        empty = (0, 0.0, "")
+        if sort == "spend":
+            value = lambda email: round((customers.get(email) or empty)[1], 2)
+        elif sort == "orders":
+            value = lambda email: (customers.get(email) or empty)[0]
+        elif sort == "last_order":
+            # Customers without orders have no last order date; they sort as oldest.
+            value = lambda email: (customers.get(email) or empty)[2]
+        elif sort == "username":
+            value = lambda email: users[email].get("username", "")
+        else:
+            value = None
+        # emails is in email order, and both the sort and the heap keep that
+        # order between ties, so pages stay stable between requests.
+        complete = count >= len(emails) * FULL_SORT_FRACTION
+        if complete:
+            ordered = sorted(emails, key=value, reverse=descending)
+        else:
+            ordered = (heapq.nlargest if descending else heapq.nsmallest)(count, emails, key=value)
+        self._orderings[(sort, descending)] = (self.version, users, ordered, complete)
+        return ordered
+
+    def summary(self, users, sort="spend", descending=True, offset=0, limit=50):
+        """One page of customers (role "user") with their totals, and how many there are
+
+        users is the users store's {email: record} dict, which the store
+        replaces rather than edits, so orderings are cached against it.
+        """
+        with self._lock:
+            rows = []
+            for email in self._ordered(users, sort, descending, offset + limit)[offset:offset + limit]:
+                user = users[email]
+                n, spend, last_order, by_status = self.customers.get(email) or (0, 0.0, "", {})
+                rows.append({
+                    "email": email,
+                    "username": user.get("username", ""),
+                    "joined": user.get("created_at"),
+                    "orders": n,
+                    "spend": round(spend, 2),
+                    "last_order": last_order or None,
+                    "by_status": {status: k for status, k in by_status.items() if k}
+                })
+            return rows, len(self._customer_emails(users))
@@ -1,22 +1,82 @@
-from fastapi import FastAPI, HTTPException
-import json
-import os
-import bcrypt
+import base64
+import csv
+import io
+import time
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from email_validator import validate_email, EmailNotValidError
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+import codec
+from storage import open_storage
+from billing import PriceEngine, PricingError, parse_tiers
+from stats import UserStats, ProductStats, OrderStats
+from search import CATALOG_PAGE_SIZE, ProductIndex, SEARCH_LIMIT
+from analytics import CUSTOMER_SORTS, CustomerLedger, SalesRollups
+from passwords import HashPool, PoolBusy, needs_rehash
+from metrics import REGISTRY, REQUEST_SECONDS
+from records import STATUSES
 
-app = FastAPI() 
+class FastJSONResponse(Response):
+    """Compact JSON rendered by codec (orjson when installed)"""
+    media_type = "application/json"
 
-USERS_FILE = "users.json"
-PRODUCTS_FILE = "products.json"
-ORDERS_FILE = "orders.json"
+    def render(self, content) -> bytes:
+        return codec.dumps(content)
 
-def hash_password(password: str) -> bytes:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+app = FastAPI(default_response_class=FastJSONResponse)
 
-def verify_password(password: str, hashed: bytes) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed)
+MAX_BATCH_SIZE = 5000
+# Bytes gathered before a streamed export hands a chunk to the server.
+EXPORT_CHUNK_BYTES = 64 * 1024
+EXPORT_CSV_COLUMNS = ["order_id", "date", "email", "username", "status", "item", "quantity",
+                      "subtotal", "discount_amount", "tax_amount", "total"]
+DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+
+storage = open_storage()
+users_store = storage.users
+products_store = storage.products
+orders_store = storage.orders
+
+user_stats = UserStats()
+product_stats = ProductStats()
+order_stats = OrderStats()
+product_index = ProductIndex()
+sales_rollups = SalesRollups()
+customer_ledger = CustomerLedger()
+users_store.subscribe(user_stats)
+products_store.subscribe(product_stats)
+products_store.subscribe(product_index)
+orders_store.subscribe(order_stats)
+orders_store.subscribe(sales_rollups)
+orders_store.subscribe(customer_ledger)
+
+password_pool = HashPool()
+price_engine = PriceEngine()
+
+@app.on_event("shutdown")
+def shutdown_password_pool():
+    password_pool.shutdown()
+
+async def run_password_job(job):
+    try:
+        return await job
+    except PoolBusy:
+        raise HTTPException(status_code=503, detail="Server busy, please try again", headers={"Retry-After": "1"})
+
+def make_etag(name: str, *versions: int) -> str:
+    # Versions are shared by every worker and never repeat (see coordination.py),
+    # so a tag means the same data whichever worker or restart issued it.
+    return f'"{name}-{".".join(map(str, versions))}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or etag in tags
 
 def validate_email_format(email: str) -> bool:
     try:
@@ -44,165 +104,415 @@ class Order(BaseModel):
     email: str
     username: str
     items: dict
+    # Amounts sent by clients are ignored; create_order prices the items itself.
+    subtotal: Optional[float] = None
+    discount_amount: Optional[float] = None
+    tax_amount: Optional[float] = None
+    total: Optional[float] = None
+    status: str = "pending"
+    date: str = Field(default_factory=lambda: datetime.now().isoformat())
+
+class Cart(BaseModel):
+    items: dict
+
+class WhatIf(BaseModel):
+    tiers: Optional[str] = None
+    tax_rate: Optional[float] = None
+    prices: Optional[dict] = None
+
+class OrderUpdate(BaseModel):
+    status: str
+
+class QuoteLine(BaseModel):
+    name: str
+    quantity: float
+    unit: Optional[str] = None
+    price: float
+    amount: float
+
+# Typed responses are serialized by pydantic directly instead of jsonable_encoder.
+class Quote(BaseModel):
+    lines: list[QuoteLine]
     subtotal: float
+    discount_rate: float
     discount_amount: float
+    tax_rate: float
     tax_amount: float
     total: float
-    status: str = "pending"
-    date: str = datetime.now().isoformat()
 
-class OrderUpdate(BaseModel):
+class WhatIfReport(BaseModel):
+    orders: int
+    unpriced_lines: int
+    current_total: float
+    what_if_total: float
+    difference: float
+
+class ProductBatch(BaseModel):
+    products: list[Product]
+
+class OrderStatusChange(BaseModel):
+    order_id: str
     status: str
 
+class OrderStatusBatch(BaseModel):
+    updates: list[OrderStatusChange]
+
+def batch_report(key_name: str, keys: list, results: list, failure: str) -> dict:
+    report = []
+    for key, ok in zip(keys, results):
+        item = {key_name: key, "success": ok}
+        if not ok:
+            item["detail"] = failure
+        report.append(item)
+    return {"success": all(results), "applied": sum(results), "results": report}
+
+def check_batch_size(items: list):
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch too large (max {MAX_BATCH_SIZE} items)")
+
+def check_statuses(*statuses: str):
+    for status in statuses:
+        if status not in STATUSES:
+            raise HTTPException(status_code=400, detail=f"Unknown status: {status} (expected one of {', '.join(STATUSES)})")
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not the raw path, so ids don't explode the series count.
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method,
+                                route=route.path if route is not None else "unmatched", status=status)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Grocery Store API! Docs at /docs"}
 
+@app.get("/stats")
+def get_stats():
+    # Give each store a chance to pick up file changes before reading counters.
+    users_store.refresh()
+    products_store.refresh()
+    orders_store.refresh()
+    return {
+        "users": {"by_role": user_stats.snapshot()},
+        "products": {"count": product_stats.count},
+        "orders": order_stats.snapshot()
+    }
+
 @app.get("/users")
-def get_users():
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, "r") as f:
-            users = json.load(f)
-            return users
-    return {}
+def get_users(request: Request):
+    # Read the version before the data so a racing write can only make the
+    # tag older than the body, never newer.
+    etag = make_etag("users", users_store.current_version())
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    # Stored records are already JSON-shaped, so skip FastAPI's generic encoder.
+    return FastJSONResponse(users_store.get(), headers={"ETag": etag})
+
+@app.get("/users/summary")
+def users_summary(request: Request, sort: str = Query("spend", pattern=f"^({'|'.join(CUSTOMER_SORTS)})$"),
+                  order: str = Query("desc", pattern="^(asc|desc)$"),
+                  limit: int = Query(50, ge=1, le=500), offset: int = Query(0, ge=0)):
+    """Customers with order count, lifetime spend, last order date and status mix"""
+    etag = make_etag("customers", users_store.current_version(), orders_store.current_version())
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    customers, total = customer_ledger.summary(users_store.get(), sort, order == "desc", offset, limit)
+    return FastJSONResponse({"customers": customers, "total": total, "offset": offset, "limit": limit},
+                            headers={"ETag": etag})
 
 @app.post("/users")
-def create_user(user: User):
-    users = get_users()
-    if user.email in users:
+async def create_user(user: User):
+    # Lookups read files (JSON backend) or the database, so keep them off the event loop.
+    if await run_in_threadpool(users_store.lookup, user.email) is not None:
         raise HTTPException(status_code=400, detail="Email already registered")
-    if not validate_email_format(user.email):
+    if not await run_in_threadpool(validate_email_format, user.email):
         raise HTTPException(status_code=400, detail="Invalid email format")
-    hashed = hash_password(user.password)
-    users[user.email] = {
+    hashed = await run_password_job(password_pool.hash(user.password))
+    record = {
         "username": user.username,
-        "password": hashed.decode('utf-8'),
+        "password": hashed,
         "role": "user",
         "created_at": datetime.now().isoformat()
     }
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f, indent=4)
+    if not (await users_store.batch_async([("add", user.email, record)]))[0]:
+        raise HTTPException(status_code=400, detail="Email already registered")
     return {"success": True}
 
 @app.post("/login")
-def login(creds: LoginCreds):
-    users = get_users()
-    if creds.email not in users:
+async def login(creds: LoginCreds):
+    user = await run_in_threadpool(users_store.lookup, creds.email)
+    if user is None:
         raise HTTPException(status_code=400, detail="Email not found")
-    stored_password = users[creds.email]['password']
-    if isinstance(stored_password, str):
-        stored_password = stored_password.encode('utf-8')
-    if verify_password(creds.password, stored_password):
-        return {"role": users[creds.email]['role'], "username": users[creds.email]['username']}
-    raise HTTPException(status_code=400, detail="Incorrect password")
+    if not await run_password_job(password_pool.verify(creds.password, user['password'])):
+        raise HTTPException(status_code=400, detail="Incorrect password")
+    if needs_rehash(user['password'], password_pool.rounds):
+        # Upgrade legacy $2a$ or old-cost hashes while we have the plaintext.
+        # A busy pool just means we try again on the next login.
+        try:
+            rehashed = await password_pool.hash(creds.password)
+        except PoolBusy:
+            rehashed = None
+        if rehashed is not None:
+            await users_store.batch_async([("replace", creds.email, {**user, "password": rehashed})])
+    return {"role": user['role'], "username": user['username']}
 
 @app.get("/products")
-def get_products():
-    if os.path.exists(PRODUCTS_FILE):
-        with open(PRODUCTS_FILE, "r") as f:
-            return json.load(f)
-    default = {
-        "apple": {"price": 100, "unit": "kg"},
-        "banana": {"price": 50, "unit": "dozen"},
-        "milk": {"price": 120, "unit": "litre"},
-        "bread": {"price": 80, "unit": "loaf"},
-        "egg": {"price": 15, "unit": "piece"},
-        "orange": {"price": 60, "unit": "kg"},
-        "mango": {"price": 150, "unit": "kg"},
-        "potato": {"price": 30, "unit": "kg"},
-        "tomato": {"price": 40, "unit": "kg"},
-        "onion": {"price": 25, "unit": "kg"},
-        "carrot": {"price": 50, "unit": "kg"},
-        "cucumber": {"price": 20, "unit": "kg"},
-        "spinach": {"price": 30, "unit": "kg"},
-        "cauliflower": {"price": 40, "unit": "piece"},
-        "broccoli": {"price": 60, "unit": "kg"},
-        "juice": {"price": 150, "unit": "litre"},
-        "biscuits": {"price": 80, "unit": "packet"},
-        "chips": {"price": 50, "unit": "packet"},
-        "soap": {"price": 60, "unit": "piece"},
-        "shampoo": {"price": 200, "unit": "bottle"},
-        "detergent": {"price": 120, "unit": "kg"},
-        "toothpaste": {"price": 90, "unit": "tube"},
-        "oil": {"price": 200, "unit": "litre"},
-        "salt": {"price": 20, "unit": "kg"},
-        "sugar": {"price": 60, "unit": "kg"},
-        "tea": {"price": 200, "unit": "packet"},
-        "coffee": {"price": 300, "unit": "packet"},
-        "butter": {"price": 250, "unit": "pack"},
-        "cheese": {"price": 400, "unit": "kg"},
-        "yogurt": {"price": 100, "unit": "litre"},
-        "chicken": {"price": 300, "unit": "kg"},
-        "fish": {"price": 500, "unit": "kg"},
-        "rice": {"price": 80, "unit": "kg"},
-        "wheat": {"price": 45, "unit": "kg"},
-        "pasta": {"price": 100, "unit": "packet"},
-        "noodles": {"price": 70, "unit": "packet"},
-        "jam": {"price": 150, "unit": "jar"},
-        "honey": {"price": 300, "unit": "jar"},
-        "cereal": {"price": 200, "unit": "box"},
-        "chocolate": {"price": 100, "unit": "bar"}
-    }
-    with open(PRODUCTS_FILE, "w") as f:
-        json.dump(default, f, indent=4)
-    return default
+def get_products(request: Request, unit: Optional[str] = None,
+                 min_price: Optional[float] = Query(None, ge=0), max_price: Optional[float] = Query(None, ge=0),
+                 limit: Optional[int] = Query(None, ge=1, le=200), offset: Optional[int] = Query(None, ge=0)):
+    etag = make_etag("products", products_store.current_version())
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    if unit is None and min_price is None and max_price is None and limit is None and offset is None:
+        return FastJSONResponse(products_store.get(), headers={"ETag": etag})
+    # Any filter or paging parameter switches to a name-ordered catalog page.
+    offset = offset or 0
+    limit = limit or CATALOG_PAGE_SIZE
+    products, total, units = product_index.catalog(unit, min_price, max_price, offset, limit)
+    return FastJSONResponse({"products": products, "total": total, "offset": offset, "limit": limit, "units": units},
+                            headers={"ETag": etag})
+
+@app.get("/products/search")
+def search_products(request: Request, q: str = "", limit: int = Query(SEARCH_LIMIT, ge=1, le=100)):
+    etag = make_etag("products", products_store.current_version())
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return FastJSONResponse(product_index.search(q, limit), headers={"ETag": etag})
 
+# Writes await the group commit on the event loop instead of parking a
+# threadpool thread on each fsync, so a burst of writers is not capped by the
+# threadpool size. Reads stay plain def: they serialize whole collections and
+# can wait on a store lock, neither of which belongs on the event loop.
 @app.post("/products")
-def add_product(product: Product):
-    products = get_products()
-    if product.name in products:
+async def add_product(product: Product):
+    if not (await products_store.batch_async([("add", product.name, {"price": product.price, "unit": product.unit})]))[0]:
         raise HTTPException(status_code=400, detail="Product already exists")
-    products[product.name] = {"price": product.price, "unit": product.unit}
-    with open(PRODUCTS_FILE, "w") as f:
-        json.dump(products, f, indent=4)
     return {"success": True}
 
+@app.post("/products/batch")
+async def add_products(batch: ProductBatch):
+    check_batch_size(batch.products)
+    results = await products_store.batch_async([("add", p.name, {"price": p.price, "unit": p.unit}) for p in batch.products])
+    return batch_report("name", [p.name for p in batch.products], results, "Product already exists")
+
+@app.patch("/products/batch")
+async def update_products(batch: ProductBatch):
+    check_batch_size(batch.products)
+    results = await products_store.batch_async([("replace", p.name, {"price": p.price, "unit": p.unit}) for p in batch.products])
+    return batch_report("name", [p.name for p in batch.products], results, "Product not found")
+
 class ProductUpdate(BaseModel):
     price: float
     unit: str
 
 @app.put("/products/{name}")
-def update_product(name: str, product: ProductUpdate):
-    products = get_products()
-    if name not in products:
+async def update_product(name: str, product: ProductUpdate):
+    if not (await products_store.batch_async([("replace", name, {"price": product.price, "unit": product.unit})]))[0]:
         raise HTTPException(status_code=404, detail="Product not found")
-    products[name] = {"price": product.price, "unit": product.unit}
-    with open(PRODUCTS_FILE, "w") as f:
-        json.dump(products, f, indent=4)
     return {"success": True}
 
 @app.delete("/products/{name}")
-def delete_product(name: str):
-    products = get_products()
-    if name not in products:
+async def delete_product(name: str):
+    if not (await products_store.batch_async([("delete", name, None)]))[0]:
         raise HTTPException(status_code=404, detail="Product not found")
-    del products[name]
-    with open(PRODUCTS_FILE, "w") as f:
-        json.dump(products, f, indent=4)
     return {"success": True}
 
+def encode_cursor(direction: str, position: int) -> str:
+    return base64.urlsafe_b64encode(f"{direction}:{position}".encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        direction, position = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        if direction not in ("before", "after"):
+            raise ValueError(direction)
+        return direction, int(position)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @app.get("/orders")
-def get_orders():
-    if os.path.exists(ORDERS_FILE):
-        with open(ORDERS_FILE, "r") as f:
-            return json.load(f)
-    return []
+def get_orders(request: Request, email: Optional[str] = None, status: Optional[str] = None,
+               limit: Optional[int] = Query(None, ge=1, le=500), cursor: Optional[str] = None):
+    etag = make_etag("orders", orders_store.current_version())
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    headers = {"ETag": etag}
+    if email is not None:
+        return FastJSONResponse(orders_store.by_email(email), headers=headers)
+    if limit is None and cursor is None:
+        if status is not None:
+            return FastJSONResponse(orders_store.by_status(status), headers=headers)
+        return FastJSONResponse(orders_store.all(), headers=headers)
+    before = after = None
+    if cursor is not None:
+        direction, position = decode_cursor(cursor)
+        if direction == "before":
+            before = position
+        else:
+            after = position
+    orders, total, older, newer = orders_store.page(status, limit or 20, before, after)
+    return FastJSONResponse({
+        "orders": orders,
+        "total": total,
+        "next_cursor": encode_cursor("before", older) if older is not None else None,
+        "prev_cursor": encode_cursor("after", newer) if newer is not None else None
+    }, headers=headers)
+
+def export_ndjson(orders):
+    chunk = []
+    size = 0
+    for order in orders:
+        line = codec.dumps(order) + b"\n"
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield b"".join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield b"".join(chunk)
+
+def export_csv(orders):
+    """One row per order line; order fields repeat on each of its lines"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_CSV_COLUMNS)
+    for order in orders:
+        head = [order["order_id"], order["date"], order["email"], order["username"], order["status"]]
+        tail = [order.get(name) for name in ("subtotal", "discount_amount", "tax_amount", "total")]
+        lines = order["items"].items() or [("", "")]
+        writer.writerows(head + [item, quantity] + tail for item, quantity in lines)
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+@app.get("/orders/export")
+def export_orders(format: str = Query("ndjson", pattern="^(ndjson|csv)$"), status: Optional[str] = None,
+                  start: Optional[str] = Query(None, alias="from", pattern=DATE_PATTERN),
+                  end: Optional[str] = Query(None, alias="to", pattern=DATE_PATTERN)):
+    """Stream every matching order (archive included), oldest first; from/to are inclusive days"""
+    for day in (start, end):
+        if day is not None:
+            try:
+                datetime.strptime(day, "%Y-%m-%d")
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid date: {day}")
+    orders = orders_store.iter_orders(status, start, end)
+    if format == "csv":
+        body, media_type = export_csv(orders), "text/csv"
+    else:
+        body, media_type = export_ndjson(orders), "application/x-ndjson"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="orders.{format}"'})
+
+@app.get("/orders/{order_id}")
+def get_order(order_id: str):
+    order = orders_store.get(order_id)
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return FastJSONResponse(order)
+
+@app.get("/analytics/revenue")
+def revenue_analytics(request: Request, bucket: str = Query("day", pattern="^(day|week|month)$"),
+                      start: Optional[str] = None, end: Optional[str] = None):
+    etag = make_etag("orders", orders_store.current_version())
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return FastJSONResponse({"bucket": bucket, "series": sales_rollups.revenue_series(bucket, start, end)},
+                            headers={"ETag": etag})
+
+@app.get("/analytics/top-products")
+def top_products(request: Request, limit: int = Query(10, ge=1, le=100),
+                 by: str = Query("quantity", pattern="^(quantity|orders)$")):
+    etag = make_etag("orders", orders_store.current_version())
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return FastJSONResponse(sales_rollups.top_products(limit, by), headers={"ETag": etag})
+
+@app.get("/analytics/status-funnel")
+def status_funnel(request: Request):
+    etag = make_etag("orders", orders_store.current_version())
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return FastJSONResponse(sales_rollups.status_funnel(), headers={"ETag": etag})
+
+@app.post("/analytics/rebuild")
+def rebuild_analytics():
+    """Recompute the rollups from every stored order"""
+    orders_store.replay(sales_rollups)
+    return {"success": True, "orders": sales_rollups.status_funnel()["total"]}
+
+def quote_items(items: dict) -> dict:
+    try:
+        return price_engine.quote(items, products_store.lookup)
+    except PricingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/quote", response_model=Quote)
+def quote(cart: Cart):
+    return quote_items(cart.items)
+
+@app.post("/billing/what-if", response_model=WhatIfReport)
+def what_if(scenario: WhatIf):
+    try:
+        engine = PriceEngine(
+            parse_tiers(scenario.tiers) if scenario.tiers is not None else price_engine.tiers,
+            scenario.tax_rate if scenario.tax_rate is not None else price_engine.tax_rate
+        )
+    except (ValueError, ArithmeticError):
+        raise HTTPException(status_code=400, detail="Invalid tiers, expected e.g. '2000:0.15,1000:0.10'")
+    prices = {name: p["price"] for name, p in products_store.get().items()}
+    prices.update(scenario.prices or {})
+    orders = orders_store.all()
+    try:
+        repriced = engine.reprice_orders(orders, prices)
+    except ImportError:
+        raise HTTPException(status_code=501, detail="What-if repricing needs numpy installed")
+    current = sum(o.get("total") or 0 for o in orders)
+    what_if_total = float(repriced["total"].sum())
+    return {
+        "orders": len(orders),
+        "unpriced_lines": repriced["unpriced_lines"],
+        "current_total": round(current, 2),
+        "what_if_total": round(what_if_total, 2),
+        "difference": round(what_if_total - current, 2)
+    }
 
 @app.post("/orders")
-def create_order(order: Order):
-    orders = get_orders()
-    orders.append(order.dict())
-    with open(ORDERS_FILE, "w") as f:
-        json.dump(orders, f, indent=4)
+async def create_order(order: Order):
+    check_statuses(order.status)
+    bill = await run_in_threadpool(quote_items, order.items)
+    record = order.model_dump()
+    # Store the quantities as priced, not as sent ("3" is priced as 3).
+    record["items"] = {line["name"]: float(line["quantity"]) for line in bill["lines"]}
+    for field in ("subtotal", "discount_amount", "tax_amount", "total"):
+        record[field] = float(bill[field])
+    if not await orders_store.append_order_async(record):
+        raise HTTPException(status_code=400, detail="Order already exists")
     return {"success": True}
 
+@app.patch("/orders/status")
+async def update_orders(batch: OrderStatusBatch):
+    check_batch_size(batch.updates)
+    check_statuses(*(u.status for u in batch.updates))
+    results = await orders_store.set_statuses_async([(u.order_id, u.status) for u in batch.updates])
+    return batch_report("order_id", [u.order_id for u in batch.updates], results, "Order not found")
+
 @app.put("/orders/{order_id}")
-def update_order(order_id: str, update: OrderUpdate):
-    orders = get_orders()
-    for i, o in enumerate(orders):
-        if o['order_id'] == order_id:
-            orders[i]['status'] = update.status
-            with open(ORDERS_FILE, "w") as f:
-                json.dump(orders, f, indent=4)
-            return {"success": True}
+async def update_order(order_id: str, update: OrderUpdate):
+    check_statuses(update.status)
+    if (await orders_store.set_statuses_async([(order_id, update.status)]))[0]:
+        return {"success": True}
     raise HTTPException(status_code=404, detail="Order not found")
\ No newline at end of file
@@ -0,0 +1,453 @@
+import array
+import mmap
+import os
+import sys
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from itertools import chain
+import codec
+from coordination import FileLock
+from records import from_micros, to_micros
+from store import atomic_write_json, file_stamp, fsync_dir, read_json
+
+ARCHIVE_DIR = "orders_archive"
+CLOSED_STATUSES = ("delivered", "cancelled")
+# Archived rows page with positions far below any live position, so one cursor
+# space covers both and archive positions stay stable as the archive grows.
+ARCHIVE_BASE = -(1 << 62)
+
+# One value per order; ends are cumulative offsets into order_ids.bin and the line columns.
+ORDER_COLUMNS = {"date": "q", "subtotal": "d", "discount_amount": "d", "tax_amount": "d", "total": "d",
+                 "email": "I", "username": "I", "status": "I", "id_end": "Q", "item_end": "Q"}
+# One value per order line.
+LINE_COLUMNS = {"item": "I", "quantity": "d"}
+DICTIONARIES = ("email", "username", "status", "item")
+IDS_FILE = "order_ids.bin"
+META_FILE = "meta.json"
+APPEND_LOCK_FILE = "append.lock"
+
+class OrderArchive:
+    """Append-only columnar store for closed orders, read through mmap
+
+    Each column is a file of fixed-width values (array typecodes above).
+    Emails, usernames, statuses and item names are dictionary-encoded, and
+    order lines are a ragged pair of item/quantity columns cut by item_end.
+    meta.json holds the committed row, line and byte counts; anything past
+    them is a torn append and is ignored by readers and cut by the next one.
+    """
+
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self.rows = 0
+        self._lock = threading.Lock()
+        self._meta = None
+        self._stamp = None
+        self._columns = {}
+        self._ids = b""
+        self._dicts = {name: [] for name in DICTIONARIES}
+        # value -> code for the columns rows_for() looks up by value.
+        self._codes = {"email": {}, "status": {}}
+        self._indexed = 0
+        # (earliest, latest) date in micros over the mapped rows, or None until needed.
+        self._date_span = None
+        self._by_email = {}
+        self._by_status = {}
+        # order_id -> row, kept covering every mapped row.
+        self._by_id = {}
+        self._append_lock = None
+        self.refresh()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_meta(self):
+        path = self._path(META_FILE)
+        if not os.path.exists(path):
+            return {"rows": 0, "lines": 0, "id_bytes": 0, "dicts": {name: [0, 0] for name in DICTIONARIES},
+                    "byteorder": sys.byteorder}
+        meta = read_json(path)
+        if meta["byteorder"] != sys.byteorder:
+            raise RuntimeError(f"Order archive was written on a {meta['byteorder']}-endian machine")
+        return meta
+
+    def _map(self, name, length):
+        """Read-only mapping of the first length bytes of a file (no copy)"""
+        if length == 0:
+            return memoryview(b"")
+        with open(self._path(name), "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapped)[:length]
+
+    def _read_dictionary(self, name, count, size):
+        if count == 0:
+            return []
+        with open(self._path(f"{name}.dict"), "rb") as f:
+            raw = f.read(size)
+        return [codec.loads(line) for line in raw.splitlines()[:count]]
+
+    def refresh(self):
+        """Map whatever has been committed since the last refresh"""
+        with self._lock:
+            stamp = file_stamp(self._path(META_FILE))
+            if stamp is not None and stamp == self._stamp:
+                return
+            meta = self._read_meta()
+            # Old mappings are dropped rather than closed; readers may still hold views.
+            self._columns = {}
+            for name, code in ORDER_COLUMNS.items():
+                self._columns[name] = self._map(f"{name}.col", meta["rows"] * array.array(code).itemsize).cast(code)
+            for name, code in LINE_COLUMNS.items():
+                self._columns[name] = self._map(f"{name}.col", meta["lines"] * array.array(code).itemsize).cast(code)
+            self._ids = self._map(IDS_FILE, meta["id_bytes"])
+            self._dicts = {name: self._read_dictionary(name, *meta["dicts"][name]) for name in DICTIONARIES}
+            self._codes = {name: {value: code for code, value in enumerate(self._dicts[name])} for name in self._codes}
+            if meta["rows"] < self._indexed:
+                self._indexed = 0
+                self._by_email = {}
+                self._by_status = {}
+            if meta["rows"] < len(self._by_id):
+                self._by_id = {}
+            first = len(self._by_id)
+            if meta["rows"] > first:
+                start = self._columns["id_end"][first - 1] if first else 0
+                ids = bytes(self._ids[start:self._columns["id_end"][meta["rows"] - 1] - 1]).decode("utf-8")
+                self._by_id.update(zip(ids.split("\n"), range(first, meta["rows"])))
+            self._meta = meta
+            self._stamp = stamp
+            self.rows = meta["rows"]
+            self._date_span = None
+
+    def column(self, name):
+        """Zero-copy view of a column, e.g. numpy.frombuffer(archive.column("total"))"""
+        return self._columns[name]
+
+    def dictionary(self, name):
+        """Values for a dictionary-encoded column, indexed by code"""
+        return self._dicts[name]
+
+    def _order_id(self, row):
+        start = self._columns["id_end"][row - 1] if row else 0
+        return bytes(self._ids[start:self._columns["id_end"][row] - 1]).decode("utf-8")
+
+    def order(self, row):
+        """Rebuild the order dict stored at row"""
+        c = self._columns
+        items = self._dicts["item"]
+        lo = c["item_end"][row - 1] if row else 0
+        return {
+            "order_id": self._order_id(row),
+            "email": self._dicts["email"][c["email"][row]],
+            "username": self._dicts["username"][c["username"][row]],
+            "items": {items[c["item"][j]]: c["quantity"][j] for j in range(lo, c["item_end"][row])},
+            "subtotal": c["subtotal"][row],
+            "discount_amount": c["discount_amount"][row],
+            "tax_amount": c["tax_amount"][row],
+            "total": c["total"][row],
+            "status": self._dicts["status"][c["status"][row]],
+            "date": from_micros(c["date"][row])
+        }
+
+    def orders(self, rows=None):
+        return (self.order(row) for row in (range(self.rows) if rows is None else rows))
+
+    def scan(self, *names):
+        """One tuple of raw column values per row, in row order
+
+        Dictionary-encoded columns come back as codes (see dictionary()), so
+        listeners can aggregate the whole archive without building orders.
+        """
+        return zip(*(self._columns[name] for name in names))
+
+    def find(self, order_id):
+        """Return the row holding order_id, or None"""
+        return self._by_id.get(order_id)
+
+    def _committed_ids(self, meta):
+        if meta["id_bytes"] == 0:
+            return set()
+        with open(self._path(IDS_FILE), "rb") as f:
+            raw = f.read(meta["id_bytes"])
+        return set(raw.decode("utf-8").split("\n")[:meta["rows"]])
+
+    def _index(self):
+        """Extend the per-email and per-status row lists to cover every mapped row"""
+        with self._lock:
+            emails, statuses = self._columns["email"], self._columns["status"]
+            for row in range(self._indexed, self.rows):
+                self._by_email.setdefault(emails[row], array.array("q")).append(row)
+                self._by_status.setdefault(statuses[row], array.array("q")).append(row)
+            self._indexed = self.rows
+
+    def rows_for(self, email=None, status=None):
+        """Row numbers (ascending) for one email or one status; all rows if neither"""
+        if email is None and status is None:
+            return range(self.rows)
+        self._index()
+        name, value, index = ("email", email, self._by_email) if email is not None else ("status", status, self._by_status)
+        code = self._codes[name].get(value)
+        if code is None:
+            return ()
+        return index.get(code, ())
+
+    def rows_between(self, rows, start=None, end=None):
+        """The rows among rows dated from start to end (inclusive YYYY-MM-DD days, either may be None)"""
+        lo = to_micros(f"{start}T00:00:00") if start is not None else -(1 << 63)
+        hi = to_micros(f"{date.fromisoformat(end) + timedelta(days=1)}T00:00:00") if end is not None else 1 << 63
+        dates = self._columns["date"]
+        if not rows:
+            return ()
+        if self._date_span is None:
+            self._date_span = (min(dates), max(dates))
+        first, last = self._date_span
+        if last < lo or first >= hi:
+            return ()
+        if lo <= first and last < hi:
+            return rows
+        return [row for row in rows if lo <= dates[row] < hi]
+
+    def append(self, orders):
+        """Durably add orders; returns how many were written
+
+        Orders whose id is already archived are skipped, so a job that
+        crashed after archiving but before trimming live storage can rerun.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        if self._append_lock is None:
+            self._append_lock = FileLock(self._path(APPEND_LOCK_FILE))
+        # Archive jobs in other processes take turns; whoever goes second
+        # then skips the orders the first one already archived.
+        with self._append_lock.lock():
+            return self._append(orders)
+
+    def _append(self, orders):
+        meta = self._read_meta()
+        archived = self._committed_ids(meta)
+        orders = [o for o in orders if o["order_id"] not in archived and "\n" not in o["order_id"]]
+        if not orders:
+            return 0
+        dicts = {name: self._read_dictionary(name, *meta["dicts"][name]) for name in DICTIONARIES}
+        codes = {name: {value: code for code, value in enumerate(values)} for name, values in dicts.items()}
+        added = {name: [] for name in DICTIONARIES}
+
+        def encode(name, value):
+            code = codes[name].get(value)
+            if code is None:
+                code = codes[name][value] = len(codes[name])
+                added[name].append(value)
+            return code
+
+        columns = {name: array.array(code) for name, code in chain(ORDER_COLUMNS.items(), LINE_COLUMNS.items())}
+        ids = bytearray()
+        id_end, item_end = meta["id_bytes"], meta["lines"]
+        for order in orders:
+            columns["date"].append(to_micros(order["date"]))
+            for name in ("subtotal", "discount_amount", "tax_amount", "total"):
+                columns[name].append(float(order.get(name) or 0))
+            for name in ("email", "username", "status"):
+                columns[name].append(encode(name, order[name]))
+            raw_id = f"{order['order_id']}\n".encode("utf-8")
+            ids += raw_id
+            id_end += len(raw_id)
+            columns["id_end"].append(id_end)
+            for item, quantity in order["items"].items():
+                columns["item"].append(encode("item", item))
+                columns["quantity"].append(float(quantity))
+            item_end += len(order["items"])
+            columns["item_end"].append(item_end)
+
+        def write(name, committed, data):
+            with open(self._path(name), "ab") as f:
+                # Cut anything a crashed append left past the committed size.
+                f.truncate(committed)
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+        for name, values in columns.items():
+            count = meta["rows"] if name in ORDER_COLUMNS else meta["lines"]
+            write(f"{name}.col", count * values.itemsize, values.tobytes())
+        write(IDS_FILE, meta["id_bytes"], bytes(ids))
+        for name, values in added.items():
+            count, size = meta["dicts"][name]
+            raw = b"".join(codec.dumps(v) + b"\n" for v in values)
+            write(f"{name}.dict", size, raw)
+            meta["dicts"][name] = [count + len(values), size + len(raw)]
+        meta["rows"] += len(orders)
+        meta["lines"] = item_end
+        meta["id_bytes"] = id_end
+        fsync_dir(self._path(META_FILE))
+        # The commit point: readers only trust what meta.json counts.
+        atomic_write_json(self._path(META_FILE), meta)
+        return len(orders)
+
+class ArchivedOrders:
+    """Live order storage plus the closed-order archive, behind one OrderRepository
+
+    Writes go to the live store. Reads see archived orders first (oldest),
+    then live ones. The archive is re-read only when the live store reloads,
+    so a job that archives and then trims live storage never shows an order
+    twice.
+    """
+
+    def __init__(self, live, archive):
+        self.live = live
+        self.archive = archive
+        self._listeners = []
+        self._lock = threading.Lock()
+        live.subscribe(self)
+
+    @property
+    def version(self):
+        return self.live.version
+
+    # Listener hooks for the live store.
+    def reset(self, orders):
+        """orders may be iterated once per listener (a list, or sqlite_store.OrderScan)"""
+        self.archive.refresh()
+        for listener in self._listeners:
+            listener.reset(orders, self.archive)
+
+    def order_added(self, order):
+        for listener in self._listeners:
+            listener.order_added(order)
+
+    def status_changed(self, order, old_status):
+        for listener in self._listeners:
+            listener.status_changed(order, old_status)
+
+    def subscribe(self, listener):
+        """Register an object with reset(orders, archive), order_added(order) and
+        status_changed(order, old_status) hooks
+
+        reset() gets the live orders and the OrderArchive holding the older,
+        closed ones; listeners read the archive through its column views.
+        """
+        with self._lock:
+            self._listeners.append(listener)
+            self.replay(listener)
+
+    def replay(self, listener):
+        """Reset listener from every stored order"""
+        listener.reset(self.live.all(), self.archive)
+
+    def refresh(self):
+        self.live.refresh()
+
+    def current_version(self):
+        return self.live.current_version()
+
+    def all(self):
+        live = self.live.all()
+        return list(chain(self.archive.orders(), live))
+
+    def get(self, order_id):
+        order = self.live.get(order_id)
+        if order is None:
+            row = self.archive.find(order_id)
+            if row is not None:
+                order = self.archive.order(row)
+        return order
+
+    def by_email(self, email):
+        live = self.live.by_email(email)
+        return list(self.archive.orders(self.archive.rows_for(email=email))) + live
+
+    def by_status(self, status):
+        live = self.live.by_status(status)
+        return list(self.archive.orders(self.archive.rows_for(status=status))) + live
+
+    def iter_orders(self, status=None, start=None, end=None):
+        """Yield archived then live orders, oldest first; start and end are inclusive YYYY-MM-DD days"""
+        rows = self.archive.rows_for(status=status)
+        if start is not None or end is not None:
+            rows = self.archive.rows_between(rows, start, end)
+        yield from self.archive.orders(rows)
+        yield from self.live.iter_orders(status, start, end)
+
+    def page(self, status=None, limit=20, before=None, after=None):
+        """Return (orders newest first, total, older, newer) across archive and live orders"""
+        self.live.refresh()
+        rows = self.archive.rows_for(status=status)
+        archived = len(rows)
+        if (before is not None and before < 0) or (after is not None and after < 0):
+            live_total = self.live.page(status, 1)[1]
+            if after is not None:
+                lo = bisect_right(rows, after - ARCHIVE_BASE)
+                hi = min(lo + limit, archived)
+            else:
+                hi = bisect_left(rows, before - ARCHIVE_BASE)
+                lo = max(hi - limit, 0)
+            orders = [self.archive.order(rows[i]) for i in range(hi - 1, lo - 1, -1)]
+            newer = ARCHIVE_BASE + rows[hi - 1] if hi > lo and (hi < archived or live_total) else None
+            if after is not None and hi == archived and len(orders) < limit and live_total:
+                # Walked off the newest archived row: continue with the oldest live ones.
+                live, _, _, newer = self.live.page(status, limit - len(orders), after=-1)
+                orders = live + orders
+            if lo == archived:
+                # Only live orders on this page; 0 pages on into the newest archived row.
+                older = 0 if archived and orders else None
+            else:
+                older = ARCHIVE_BASE + rows[lo] if lo > 0 else None
+            return orders, live_total + archived, older, newer
+        orders, live_total, older, newer = self.live.page(status, limit, before, after)
+        if not orders:
+            newer = None
+        if older is None and archived:
+            take = min(limit - len(orders), archived) if after is None else 0
+            if take == 0:
+                # Live orders are exhausted; 0 is below every live position, so
+                # paging on from it lands in the archive.
+                older = 0 if orders else None
+            else:
+                if not orders and live_total:
+                    newer = ARCHIVE_BASE + rows[archived - 1]
+                orders += [self.archive.order(rows[i]) for i in range(archived - 1, archived - take - 1, -1)]
+                older = ARCHIVE_BASE + rows[archived - take] if take < archived else None
+        return orders, live_total + archived, older, newer
+
+    def append_order(self, order):
+        if self.archive.find(order["order_id"]) is not None:
+            return False
+        return self.live.append_order(order)
+
+    def set_status(self, order_id, status):
+        # Archived orders are closed and read-only.
+        return self.live.set_status(order_id, status)
+
+    def set_statuses(self, updates):
+        return self.live.set_statuses(updates)
+
+    async def append_order_async(self, order):
+        if self.archive.find(order["order_id"]) is not None:
+            return False
+        return await self.live.append_order_async(order)
+
+    async def set_statuses_async(self, updates):
+        return await self.live.set_statuses_async(updates)
+
+    def compact(self):
+        self.live.compact()
+
+    def remove(self, order_ids):
+        # Only live orders can be removed; the archive is append-only.
+        return self.live.remove(order_ids)
+
+    def archive_closed(self, cutoff, statuses=CLOSED_STATUSES):
+        """Move orders in statuses dated before cutoff (a datetime) into the archive
+
+        Returns how many orders left live storage.
+        """
+        cutoff = to_micros(cutoff.isoformat())
+        closed = []
+        for order in self.live.all():
+            if order["status"] in statuses:
+                try:
+                    if to_micros(order["date"]) < cutoff:
+                        closed.append(order)
+                except ValueError:
+                    continue
+        if not closed:
+            return 0
+        self.archive.append(closed)
+        return self.live.remove([o["order_id"] for o in closed])
@@ -0,0 +1,368 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+SCALES = [1_000, 100_000, 1_000_000]
+REQUESTS = 200
+CONCURRENCY = 16
+# Requests per route in the allocation pass, which runs under tracemalloc
+# separately so tracing does not slow the timed passes.
+MEMORY_REQUESTS = 20
+RESULTS_FILE = "bench_results.json"
+SEED = 42
+BENCH_BCRYPT_ROUNDS = 4
+BENCH_PASSWORD = "bench-password"
+STATUSES = ["pending", "processing", "shipped", "delivered", "cancelled"]
+UNITS = ["kg", "piece", "litre", "packet", "dozen"]
+WORDS = ["red", "green", "fresh", "organic", "basmati", "whole", "brown", "sweet", "spicy", "crisp",
+         "apple", "banana", "rice", "flour", "milk", "tea", "lentil", "mango", "onion", "butter"]
+
+def dataset_sizes(orders):
+    """Users and products scale with orders so per-user and per-product fan-out stays realistic"""
+    return max(100, orders // 10), min(20_000, max(50, orders // 50))
+
+def generate_dataset(directory, orders, seed=SEED):
+    """Write users.json, products.json and orders.json for a synthetic store"""
+    import bcrypt
+    rng = random.Random(seed)
+    n_users, n_products = dataset_sizes(orders)
+    password = bcrypt.hashpw(BENCH_PASSWORD.encode('utf-8'), bcrypt.gensalt(BENCH_BCRYPT_ROUNDS)).decode('utf-8')
+    users = {"admin@grocery.com": {"username": "Admin", "password": password, "role": "admin",
+                                   "created_at": "2024-01-01T00:00:00"}}
+    for i in range(n_users):
+        users[f"user{i}@example.com"] = {"username": f"user{i}", "password": password, "role": "user",
+                                         "created_at": "2024-01-01T00:00:00"}
+    products = {}
+    for i in range(n_products):
+        name = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}"
+        products[name] = {"price": rng.randint(10, 500), "unit": rng.choice(UNITS)}
+    names = list(products)
+    start = datetime(2024, 1, 1)
+    with open(os.path.join(directory, "orders.json"), "w") as f:
+        # Stream the array out; a million orders as one list would double peak memory here.
+        f.write("[")
+        for i in range(orders):
+            items = {name: rng.randint(1, 10) / 2 for name in rng.sample(names, rng.randint(1, 5))}
+            subtotal = round(sum(products[n]["price"] * q for n, q in items.items()), 2)
+            order = {
+                "order_id": f"B{i:08d}",
+                "email": f"user{rng.randrange(n_users)}@example.com",
+                "username": "bench",
+                "items": items,
+                "subtotal": subtotal,
+                "discount_amount": 0.0,
+                "tax_amount": round(subtotal * 0.05, 2),
+                "total": round(subtotal * 1.05, 2),
+                "status": rng.choice(STATUSES),
+                "date": (start + timedelta(minutes=i)).isoformat()
+            }
+            f.write(("," if i else "") + json.dumps(order))
+        f.write("]")
+    with open(os.path.join(directory, "users.json"), "w") as f:
+        json.dump(users, f)
+    with open(os.path.join(directory, "products.json"), "w") as f:
+        json.dump(products, f)
+    return n_users, n_products
+
+def rss_mb():
+    """Resident set size right now, or None where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+
+def rss_delta(before, after):
+    return round(after - before, 1) if before is not None and after is not None else None
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index] * 1000, 3)
+
+def endpoints(orders, n_users, product_names, requests):
+    """(name, request count, make_request(i) -> (method, path, kwargs)) for every API route"""
+    rng = random.Random(SEED + 1)
+    heavy = max(3, requests // 50)
+
+    def order_id(i):
+        return f"B{rng.randrange(orders):08d}"
+
+    def user_email(i):
+        return f"user{rng.randrange(n_users)}@example.com"
+
+    def product(i):
+        return rng.choice(product_names)
+
+    def cart(i):
+        return {name: 1.5 for name in rng.sample(product_names, 3)}
+
+    def day(i):
+        return (datetime(2024, 1, 1) + timedelta(minutes=rng.randrange(orders))).date().isoformat()
+
+    return [
+        ("GET /", requests, lambda i: ("GET", "/", {})),
+        ("GET /stats", requests, lambda i: ("GET", "/stats", {})),
+        ("GET /metrics", requests, lambda i: ("GET", "/metrics", {})),
+        ("GET /users", heavy, lambda i: ("GET", "/users", {})),
+        ("GET /users/summary", heavy, lambda i: ("GET", "/users/summary", {"params": {
+            "sort": rng.choice(["spend", "orders", "last_order", "username"]), "offset": rng.randrange(n_users)}})),
+        ("POST /users", heavy, lambda i: ("POST", "/users", {"json": {
+            "username": f"new{i}", "email": f"bench-new-{i}@grocery.com", "password": BENCH_PASSWORD}})),
+        ("POST /login", requests, lambda i: ("POST", "/login", {"json": {
+            "email": user_email(i), "password": BENCH_PASSWORD}})),
+        ("GET /products", heavy, lambda i: ("GET", "/products", {})),
+        ("GET /products?unit&price", requests, lambda i: ("GET", "/products", {"params": {
+            "unit": rng.choice(UNITS), "min_price": 100, "max_price": 300, "offset": rng.randrange(0, 100)}})),
+        ("GET /products/search", requests, lambda i: ("GET", "/products/search", {"params": {
+            "q": rng.choice(WORDS)[:rng.randint(2, 6)]}})),
+        ("POST /products", requests, lambda i: ("POST", "/products", {"json": {
+            "name": f"bench product {i}", "price": 10, "unit": "kg"}})),
+        ("PUT /products/{name}", requests, lambda i: ("PUT", f"/products/{product(i)}", {"json": {
+            "price": rng.randint(10, 500), "unit": "kg"}})),
+        ("DELETE /products/{name}", requests, lambda i: ("DELETE", f"/products/bench product {i}", {})),
+        ("POST /products/batch", heavy, lambda i: ("POST", "/products/batch", {"json": {"products": [
+            {"name": f"bench batch {i}-{j}", "price": 10, "unit": "kg"} for j in range(100)]}})),
+        ("PATCH /products/batch", heavy, lambda i: ("PATCH", "/products/batch", {"json": {"products": [
+            {"name": f"bench batch {i}-{j}", "price": 20, "unit": "kg"} for j in range(100)]}})),
+        ("GET /orders", heavy, lambda i: ("GET", "/orders", {})),
+        ("GET /orders?email", requests, lambda i: ("GET", "/orders", {"params": {"email": user_email(i)}})),
+        ("GET /orders?status&limit", requests, lambda i: ("GET", "/orders", {"params": {
+            "status": rng.choice(STATUSES), "limit": 20}})),
+        ("GET /orders/{order_id}", requests, lambda i: ("GET", f"/orders/{order_id(i)}", {})),
+        ("GET /orders/export", heavy, lambda i: ("GET", "/orders/export", {})),
+        ("GET /orders/export?csv&status&to", heavy, lambda i: ("GET", "/orders/export", {"params": {
+            "format": "csv", "status": rng.choice(STATUSES), "to": day(i)}})),
+        ("GET /analytics/revenue", requests, lambda i: ("GET", "/analytics/revenue", {"params": {
+            "bucket": rng.choice(["day", "week", "month"])}})),
+        ("GET /analytics/top-products", requests, lambda i: ("GET", "/analytics/top-products", {"params": {
+            "by": rng.choice(["quantity", "orders"])}})),
+        ("GET /analytics/status-funnel", requests, lambda i: ("GET", "/analytics/status-funnel", {})),
+        ("POST /quote", requests, lambda i: ("POST", "/quote", {"json": {"items": cart(i)}})),
+        ("POST /billing/what-if", heavy, lambda i: ("POST", "/billing/what-if", {"json": {"tax_rate": 0.06}})),
+        ("POST /orders", requests, lambda i: ("POST", "/orders", {"json": {
+            "order_id": f"N{i:08d}", "email": user_email(i), "username": "bench", "items": cart(i)}})),
+        ("PATCH /orders/status", heavy, lambda i: ("PATCH", "/orders/status", {"json": {"updates": [
+            {"order_id": order_id(i), "status": rng.choice(STATUSES)} for _ in range(100)]}})),
+        ("PUT /orders/{order_id}", requests, lambda i: ("PUT", f"/orders/{order_id(i)}", {"json": {
+            "status": rng.choice(STATUSES)}})),
+    ]
+
+async def drive(client, count, make_request, concurrency, offset):
+    """Issue count requests with at most concurrency in flight; return latencies and status counts"""
+    latencies = []
+    statuses = {}
+    next_index = iter(range(offset, offset + count))
+
+    async def worker():
+        for i in next_index:
+            method, path, kwargs = make_request(i)
+            started = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, count))))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": count,
+        "concurrency": concurrency,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "throughput_rps": round(count / elapsed, 1) if elapsed else None,
+        "status_codes": {str(code): n for code, n in sorted(statuses.items())}
+    }
+
+async def allocated_mb(client, count, make_request, concurrency, offset):
+    """Peak Python allocation above where it started while serving count requests, in MB"""
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        result = await drive(client, count, make_request, concurrency, offset)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return round((peak - baseline) / (1024 * 1024), 2), result["status_codes"]
+
+def failed_statuses(*status_codes):
+    """Status codes other than 2xx and 304 seen across the given status_codes dicts"""
+    failed = {}
+    for codes in status_codes:
+        for code, n in codes.items():
+            if not (code.startswith("2") or code == "304"):
+                failed[code] = failed.get(code, 0) + n
+    return failed
+
+async def bench_app(app, routes, concurrency):
+    import httpx
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, count, make_request in routes:
+            # Sequential latency first, then the same route under concurrent load.
+            serial = await drive(client, count, make_request, 1, 0)
+            loaded = await drive(client, count, make_request, concurrency, count)
+            allocated, codes = await allocated_mb(client, min(count, MEMORY_REQUESTS), make_request, concurrency,
+                                                  2 * count)
+            results[name] = {"serial": serial, "concurrent": loaded, "peak_alloc_mb": allocated}
+            failed = failed_statuses(serial["status_codes"], loaded["status_codes"], codes)
+            if failed:
+                # Timings of error responses say nothing about the route, so flag them.
+                results[name]["failed"] = failed
+            print(f"  {name:<32} p50 {serial['p50_ms']:>9} ms  p99 {serial['p99_ms']:>9} ms  "
+                  f"{loaded['throughput_rps']:>8} req/s @{concurrency}  {allocated:>7} MB"
+                  + (f"  FAILED {failed}" if failed else ""), file=sys.stderr)
+    return results
+
+def run_scale(orders, backend, requests, concurrency):
+    """Benchmark one dataset size in a fresh working directory; called in a child process"""
+    with tempfile.TemporaryDirectory(prefix="grocery-bench-") as directory:
+        started = time.perf_counter()
+        n_users, n_products = generate_dataset(directory, orders)
+        generated = time.perf_counter() - started
+        os.chdir(directory)
+        os.environ["STORAGE_BACKEND"] = backend
+        os.environ["BCRYPT_ROUNDS"] = str(BENCH_BCRYPT_ROUNDS)
+        # Let every concurrent client queue for the hash pool, so logins are
+        # timed rather than shed with 503s on machines with few cores.
+        os.environ.setdefault("HASH_QUEUE_LIMIT", str(concurrency))
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        # Deliverability checks are DNS lookups; they would time the network, not the API.
+        import email_validator
+        email_validator.CHECK_DELIVERABILITY = False
+        before_load = rss_mb()
+        started = time.perf_counter()
+        if backend == "sqlite":
+            import storage
+            storage.migrate_json_to_sqlite()
+        import api
+        from records import memory_report
+        loaded = time.perf_counter() - started
+        after_load = rss_mb()
+        # A small sample keeps the report itself from showing up in peak RSS.
+        order_memory = memory_report(api.orders_store.live.all(), sample=10_000)
+        product_names = list(api.products_store.get())
+        routes = endpoints(orders, n_users, product_names, requests)
+        try:
+            results = asyncio.run(bench_app(api.app, routes, concurrency))
+        finally:
+            api.password_pool.shutdown()
+        after_run = rss_mb()
+        return {
+            "orders": orders,
+            "users": n_users,
+            "products": n_products,
+            "generate_seconds": round(generated, 2),
+            "startup_seconds": round(loaded, 2),
+            # Deltas against the RSS before the app loaded, so generating the
+            # dataset in this process does not count.
+            "load_rss_mb": rss_delta(before_load, after_load),
+            "run_rss_mb": rss_delta(after_load, after_run),
+            "order_memory": order_memory,
+            "endpoints": results
+        }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run(args):
+    report = {
+        "commit": git_commit(),
+        "date": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": args.backend,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "scales": {}
+    }
+    for orders in args.scales:
+        print(f"{orders} orders ({args.backend})", file=sys.stderr)
+        # Each scale gets its own process so module state and peak RSS do not carry over.
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "scale", str(orders), "--backend", args.backend,
+             "--requests", str(args.requests), "--concurrency", str(args.concurrency)],
+            stdout=subprocess.PIPE, text=True)
+        if child.returncode != 0:
+            raise SystemExit(f"Benchmark at {orders} orders failed")
+        report["scales"][str(orders)] = json.loads(child.stdout)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=4)
+    print(f"Saved results to {args.out}", file=sys.stderr)
+    failed = [f"{name} at {orders} orders" for orders, scale in report["scales"].items()
+              for name, result in scale["endpoints"].items() if result.get("failed")]
+    if failed:
+        raise SystemExit("Routes answered with errors: " + ", ".join(failed))
+
+def compare(args):
+    """Print p50/p99/throughput ratios between two result files (new / old)"""
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(f"{old.get('commit')} -> {new.get('commit')}   (new / old: latency below 1x and throughput above 1x are wins)")
+    for scale, new_scale in new["scales"].items():
+        old_scale = old["scales"].get(scale)
+        if old_scale is None:
+            continue
+        print(f"\n{scale} orders: RSS growth loading {old_scale.get('load_rss_mb')} -> {new_scale.get('load_rss_mb')} MB, "
+              f"serving {old_scale.get('run_rss_mb')} -> {new_scale.get('run_rss_mb')} MB")
+        if "order_memory" in new_scale:
+            memory = new_scale["order_memory"]
+            print(f"  resident orders: {memory['record_bytes_per_order']} bytes/order "
+                  f"({memory['dict_bytes_per_order']} as dicts)")
+        for name, result in new_scale["endpoints"].items():
+            before = old_scale["endpoints"].get(name)
+            if before is None:
+                continue
+            ratios = []
+            for mode, key in (("serial", "p50_ms"), ("serial", "p99_ms"), ("concurrent", "throughput_rps"),
+                              (None, "peak_alloc_mb")):
+                a, b = (before.get(key), result.get(key)) if mode is None else (before[mode][key], result[mode][key])
+                ratios.append(f"{key} {b / a:5.2f}x" if a and b else f"{key}   n/a")
+            print(f"  {name:<32} " + "  ".join(ratios))
+
+def main():
+    parser = argparse.ArgumentParser(description="Grocery API benchmark suite")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_parser = sub.add_parser("run", help="benchmark every route at each dataset size")
+    run_parser.add_argument("--scales", type=lambda s: [int(n) for n in s.split(",")], default=SCALES,
+                            help="comma-separated order counts, e.g. 1000,100000")
+    run_parser.add_argument("--out", default=RESULTS_FILE, help="JSON file to write results to")
+    compare_parser = sub.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    scale_parser = sub.add_parser("scale", help=argparse.SUPPRESS)
+    scale_parser.add_argument("orders", type=int)
+    for p in (run_parser, scale_parser):
+        p.add_argument("--backend", default="json", choices=["json", "sqlite"])
+        p.add_argument("--requests", type=int, default=REQUESTS, help="requests per route and mode")
+        p.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    elif args.command == "compare":
+        compare(args)
+    else:
+        print(json.dumps(run_scale(args.orders, args.backend, args.requests, args.concurrency)))
+
+if __name__ == "__main__":
+    main()
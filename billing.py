@@ -0,0 +1,170 @@
+import math
+import os
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+CENT = Decimal("0.01")
+# Batch pricing scales quantities to integers with this many decimal places.
+QUANTITY_PLACES = 6
+QUANTITY_SCALE = 10 ** QUANTITY_PLACES
+# Largest quantity of one product in a cart; keeps amounts well inside Decimal precision.
+MAX_QUANTITY = Decimal(os.getenv("MAX_QUANTITY", "10000"))
+
+def parse_tiers(spec):
+    """Parse "2000:0.15,1000:0.10" into [(threshold, rate), ...], highest threshold first"""
+    tiers = []
+    for part in spec.split(","):
+        if part.strip():
+            threshold, rate = part.split(":")
+            tiers.append((Decimal(threshold.strip()), Decimal(rate.strip())))
+    return sorted(tiers, reverse=True)
+
+DISCOUNT_TIERS = parse_tiers(os.getenv("DISCOUNT_TIERS", "2000:0.15,1000:0.10"))
+TAX_RATE = Decimal(os.getenv("TAX_RATE", "0.05"))
+
+class PricingError(ValueError):
+    """Raised for carts that cannot be priced (unknown product, bad quantity)"""
+
+def to_money(value) -> Decimal:
+    return Decimal(str(value)).quantize(CENT, ROUND_HALF_UP)
+
+def _div_half_up(numerator, denominator):
+    """numerator / denominator rounded half up, for non-negative integers or int64 arrays"""
+    return (numerator * 2 + denominator) // (denominator * 2)
+
+def _paise(np, prices):
+    """Prices rounded to whole paise exactly as to_money() does"""
+    return np.array([int(to_money(p) * 100) for p in prices], dtype=np.int64)
+
+def _line_paise(np, quantities, paise):
+    """Each line's amount in paise, rounded half up like quote()
+
+    Quantities are scaled to exact integers, so no amount is rounded from a
+    float that sits just below a half paisa. The rare quantity with more than
+    QUANTITY_PLACES decimals is priced with Decimal instead.
+    """
+    quantities = np.asarray(quantities, dtype=np.float64)
+    paise = np.broadcast_to(paise, quantities.shape)
+    scaled = quantities * QUANTITY_SCALE
+    units = np.rint(scaled)
+    lines = _div_half_up(units.astype(np.int64) * paise, QUANTITY_SCALE)
+    for index in zip(*np.nonzero(np.abs(scaled - units) > 1e-6)):
+        amount = Decimal(str(float(quantities[index]))) * int(paise[index])
+        lines[index] = int(amount.quantize(Decimal(1), ROUND_HALF_UP))
+    return lines
+
+def _scaled(rates):
+    """Integer numerators and one power-of-ten denominator that represent rates exactly"""
+    places = max([-rate.as_tuple().exponent for rate in rates] + [0])
+    denominator = 10 ** places
+    return [int(rate * denominator) for rate in rates], denominator
+
+class PriceEngine:
+    """Discount tiers and tax applied with exact decimal money
+
+    quote() prices a single cart for checkout. price_carts() and
+    reprice_orders() are NumPy batch versions for what-if analysis that
+    work in int64 paise and round the same way as quote(), to the paisa.
+    """
+
+    def __init__(self, tiers=DISCOUNT_TIERS, tax_rate=TAX_RATE):
+        self.tiers = sorted(((Decimal(str(t)), Decimal(str(r))) for t, r in tiers), reverse=True)
+        self.tax_rate = Decimal(str(tax_rate))
+
+    def discount_rate(self, subtotal: Decimal) -> Decimal:
+        for threshold, rate in self.tiers:
+            if subtotal >= threshold:
+                return rate
+        return Decimal("0")
+
+    def quote(self, items, lookup):
+        """Price items ({name: quantity}) using lookup(name) -> product dict or None"""
+        if not items:
+            raise PricingError("Cart is empty")
+        lines = []
+        subtotal = Decimal("0")
+        for name, qty in items.items():
+            product = lookup(name)
+            if product is None:
+                raise PricingError(f"Unknown product: {name}")
+            try:
+                quantity = Decimal(str(qty))
+            except InvalidOperation:
+                raise PricingError(f"Invalid quantity for {name}: {qty}")
+            if not quantity.is_finite() or quantity <= 0 or quantity > MAX_QUANTITY:
+                raise PricingError(f"Invalid quantity for {name}: {qty}")
+            price = to_money(product["price"])
+            try:
+                amount = (price * quantity).quantize(CENT, ROUND_HALF_UP)
+            except InvalidOperation:
+                raise PricingError(f"Amount too large for {name}")
+            subtotal += amount
+            lines.append({"name": name, "quantity": quantity, "unit": product.get("unit"), "price": price, "amount": amount})
+        rate = self.discount_rate(subtotal)
+        discount_amount = (subtotal * rate).quantize(CENT, ROUND_HALF_UP)
+        after_discount = subtotal - discount_amount
+        tax_amount = (after_discount * self.tax_rate).quantize(CENT, ROUND_HALF_UP)
+        return {
+            "lines": lines,
+            "subtotal": subtotal,
+            "discount_rate": rate,
+            "discount_amount": discount_amount,
+            "tax_rate": self.tax_rate,
+            "tax_amount": tax_amount,
+            "total": after_discount + tax_amount
+        }
+
+    def _totals(self, np, subtotal):
+        """Apply tiers and tax to an int64 array of subtotals in paise"""
+        numerators, denominator = _scaled([rate for _, rate in self.tiers])
+        rates = np.zeros(len(subtotal), dtype=np.int64)
+        for (threshold, _), numerator in zip(reversed(self.tiers), reversed(numerators)):
+            rates = np.where(subtotal >= math.ceil(threshold * 100), numerator, rates)
+        discount = _div_half_up(subtotal * rates, denominator)
+        after_discount = subtotal - discount
+        (tax_numerator,), tax_denominator = _scaled([self.tax_rate])
+        tax = _div_half_up(after_discount * tax_numerator, tax_denominator)
+        total = after_discount + tax
+        return {
+            "subtotal": subtotal / 100,
+            "discount_rate": rates / denominator,
+            "discount_amount": discount / 100,
+            "tax_amount": tax / 100,
+            "total": total / 100
+        }
+
+    def price_carts(self, quantities, prices):
+        """Price a (carts x products) quantity matrix against a price vector"""
+        import numpy as np
+        # Round each line like quote() does before summing the cart.
+        lines = _line_paise(np, quantities, _paise(np, prices))
+        return self._totals(np, lines.sum(axis=1))
+
+    def reprice_orders(self, orders, prices):
+        """Reprice stored orders against prices ({name: price})
+
+        Items missing from prices are left out of the subtotal and counted
+        in the returned "unpriced_lines".
+        """
+        import numpy as np
+        names = list(prices)
+        column = {name: i for i, name in enumerate(names)}
+        paise = _paise(np, [prices[n] for n in names])
+        order_idx, product_idx, qty = [], [], []
+        unpriced = 0
+        count = 0
+        for i, order in enumerate(orders):
+            count += 1
+            for name, q in order["items"].items():
+                col = column.get(name)
+                if col is None:
+                    unpriced += 1
+                    continue
+                order_idx.append(i)
+                product_idx.append(col)
+                qty.append(q)
+        lines = _line_paise(np, qty, paise[np.array(product_idx, dtype=np.int64)])
+        subtotal = np.zeros(count, dtype=np.int64)
+        np.add.at(subtotal, np.array(order_idx, dtype=np.int64), lines)
+        result = self._totals(np, subtotal)
+        result["unpriced_lines"] = unpriced
+        return result
@@ -0,0 +1,45 @@
+import json
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    # Compact in-memory records (records.OrderRecord) turn into their public shape here.
+    to_dict = getattr(value, "to_dict", None)
+    if to_dict is not None:
+        return to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+if orjson is not None:
+    def dumps(data) -> bytes:
+        """Compact UTF-8 JSON"""
+        return orjson.dumps(data, default=_default)
+
+    def dumps_text(data) -> str:
+        return orjson.dumps(data, default=_default).decode("utf-8")
+
+    def dumps_pretty(data) -> bytes:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_INDENT_2)
+
+    def loads(raw):
+        return orjson.loads(raw)
+else:
+    def dumps(data) -> bytes:
+        """Compact UTF-8 JSON"""
+        return json.dumps(data, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    def dumps_text(data) -> str:
+        return json.dumps(data, default=_default, separators=(",", ":"), ensure_ascii=False)
+
+    def dumps_pretty(data) -> bytes:
+        return json.dumps(data, default=_default, indent=2, ensure_ascii=False).encode("utf-8")
+
+    def loads(raw):
+        return json.loads(raw)
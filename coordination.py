@@ -0,0 +1,75 @@
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+VERSION_FORMAT = "Q"
+VERSION_BYTES = struct.calcsize(VERSION_FORMAT)
+
+def first_version() -> int:
+    """Starting point for a new version counter
+
+    Counters start from the clock (microseconds) rather than zero, so one
+    that is deleted and recreated never repeats a version, and an ETag
+    built from it can never match data it was not issued for.
+    """
+    return time.time_ns() // 1000
+
+class FileLock:
+    """flock() on a lock file, shared by every process on the box and the threads in each
+
+    Re-entrant within a thread: a writer holding it exclusively can call
+    code that takes it shared. Without fcntl (Windows) it only covers the
+    threads of one process.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+
+    @contextmanager
+    def lock(self, shared=False):
+        with self._thread_lock:
+            if self._depth == 0 and fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+class SharedVersion(FileLock):
+    """Version counter for one collection, kept in its lock file and read through mmap
+
+    Writers bump it while holding the lock exclusively; every process
+    compares it with the version it last loaded, which costs a memory read,
+    and reloads only when it moved.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        with self.lock():
+            if os.fstat(self._fd).st_size < VERSION_BYTES:
+                os.ftruncate(self._fd, VERSION_BYTES)
+                os.write(self._fd, struct.pack(VERSION_FORMAT, first_version()))
+        self._counter = memoryview(mmap.mmap(self._fd, VERSION_BYTES)).cast(VERSION_FORMAT)
+
+    def value(self) -> int:
+        """The current version; only exact while holding the lock, a hint otherwise"""
+        return self._counter[0]
+
+    def bump(self) -> int:
+        """Move to the next version; the caller must hold the lock exclusively"""
+        self._counter[0] += 1
+        return self._counter[0]
@@ -1,45 +1,131 @@
 import streamlit as st
+import csv
+import html
+import io
 import os
-import smtplib
+import sqlite3
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from functools import partial
+from urllib.parse import urlencode
 from dotenv import load_dotenv
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from outbox import Outbox
+from metrics import REGISTRY
 
 load_dotenv()
 EMAIL_HOST = os.getenv("SMTP_SERVER", "smtp.gmail.com")
 EMAIL_PORT = int(os.getenv("SMTP_PORT", 587))
 EMAIL_USER = os.getenv("SMTP_EMAIL")
 EMAIL_PASSWORD = os.getenv("SMTP_PASSWORD")
+EMAIL_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() != "false"
 ADMIN_EMAIL = os.getenv("ADMIN_EMAIL", "admin@grocery.com")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "admin123")
-TAX_RATE = 0.05
+ORDERS_PAGE_SIZE = 20
+CUSTOMERS_PAGE_SIZE = 25
+CATALOG_PAGE_SIZE = 24
+CATALOG_CACHE_PAGES = 64
+CUSTOMER_SORTS = {
+    "Top spenders": ("spend", "desc"),
+    "Most orders": ("orders", "desc"),
+    "Recently ordered": ("last_order", "desc"),
+    "Name": ("username", "asc")
+}
+SEARCH_LIMIT = 20
+RESPONSE_CACHE_SIZE = 256
 API_BASE = "https://api-tau-orcin.vercel.app"
+HTTP_TIMEOUT = (3.05, 15)  # (connect, read) seconds
+HTTP_RETRIES = 3
+HTTP_POOL_SIZE = 10
+FETCH_WORKERS = 8  # stays below HTTP_POOL_SIZE so concurrent loads reuse pooled connections
+
+API_CALL_SECONDS = REGISTRY.histogram(
+    "client_api_seconds", "API call time seen by the Streamlit app", ["method", "route", "status"])
+SEND_EMAIL_SECONDS = REGISTRY.histogram(
+    "client_send_email_seconds", "Time spent in send_email by result", ["result"])
+
+@st.cache_resource
+def get_http_session():
+    """One keep-alive connection pool to the API per Streamlit server process"""
+    # Only idempotent methods are retried; a timed-out POST may already have
+    # created the order, so it is surfaced to the user instead.
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=0.3,
+        backoff_jitter=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+@st.cache_resource
+def get_fetch_pool():
+    """Threads for loading independent API resources at the same time"""
+    return ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="api-fetch")
+
+def load_concurrently(*loaders):
+    """Run independent load_* calls at once and return their results in order
+
+    A page then waits about one round trip instead of one per call. Loaders
+    must not call load_concurrently themselves.
+    """
+    ctx = get_script_run_ctx()
+
+    def run(loader):
+        # Lets a loader report failures with st.error from the worker thread.
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return loader()
+
+    futures = [get_fetch_pool().submit(run, loader) for loader in loaders]
+    return [future.result() for future in futures]
+
+def api_request(method, path, route=None, **kwargs):
+    """Call the API over the shared session with connect/read timeouts
+
+    route labels the timing (e.g. "/orders/{order_id}"); it defaults to path.
+    """
+    kwargs.setdefault("timeout", HTTP_TIMEOUT)
+    started = time.perf_counter()
+    status = "error"
+    try:
+        response = get_http_session().request(method, f"{API_BASE}{path}", **kwargs)
+        status = response.status_code
+        return response
+    finally:
+        API_CALL_SECONDS.observe(time.perf_counter() - started, method=method, route=route or path, status=status)
+
+@st.cache_resource
+def get_outbox():
+    """Start one outbox worker per Streamlit server process"""
+    outbox = Outbox(EMAIL_HOST, EMAIL_PORT, EMAIL_USER, EMAIL_PASSWORD, starttls=EMAIL_STARTTLS)
+    outbox.start()
+    return outbox
 
 def send_email(to_email, subject, body):
-    """Send email to user"""
-    if not EMAIL_USER or not EMAIL_PASSWORD:
+    """Queue email to user; the outbox worker delivers it in the background"""
+    if not EMAIL_USER:
         st.info("📧 Email not configured. Please update your .env file with SMTP_EMAIL and SMTP_PASSWORD to enable email notifications.")
         return False
    
+    started = time.perf_counter()
     try:
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_USER
-        msg['To'] = to_email
-        msg['Subject'] = subject
-       
-        msg.attach(MIMEText(body, 'html'))
-       
-        server = smtplib.SMTP(EMAIL_HOST, EMAIL_PORT)
-        server.starttls()
-        server.login(EMAIL_USER, EMAIL_PASSWORD)
-        server.send_message(msg)
-        server.quit()
+        get_outbox().enqueue(to_email, subject, body)
+        SEND_EMAIL_SECONDS.observe(time.perf_counter() - started, result="queued")
         return True
-    except Exception as e:
-        st.warning(f"📧 Email notification failed: {str(e)}. Please check your email configuration.")
+    except sqlite3.Error as e:
+        SEND_EMAIL_SECONDS.observe(time.perf_counter() - started, result="failed")
+        st.warning(f"📧 Email notification could not be queued: {str(e)}.")
         st.info("The system will continue to work without email notifications.")
         return False
 
@@ -113,45 +199,154 @@ def create_order_email(username, order_id, total, status="pending"):
     </html>
     """
 
-def load_users():
-    """Load users from API - FIXED for new response structure"""
+@st.cache_resource
+def get_response_cache():
+    """Last body and ETag per URL, shared by every session on this server"""
+    return {}
+
+def get_json_tagged(path, params=None):
+    """GET a JSON body from the API, revalidating any cached copy by ETag; returns (data, etag)"""
+    key = (path, tuple(sorted((params or {}).items())))
+    cache = get_response_cache()
+    cached = cache.get(key)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    response = api_request("GET", path, params=params, headers=headers)
+    if response.status_code == 304 and cached:
+        return cached[1], cached[0]
+    response.raise_for_status()
+    data = response.json()
+    etag = response.headers.get("ETag")
+    if etag:
+        if len(cache) >= RESPONSE_CACHE_SIZE and key not in cache:
+            cache.pop(next(iter(cache)))
+        cache[key] = (etag, data)
+    return data, etag
+
+def get_json(path, params=None):
+    """GET a JSON body from the API, revalidating any cached copy by ETag"""
+    return get_json_tagged(path, params)[0]
+
+def load_customers(sort="spend", order="desc", offset=0):
+    """Load one page of customers with their order totals from API"""
+    params = {"sort": sort, "order": order, "offset": offset, "limit": CUSTOMERS_PAGE_SIZE}
     try:
-        response = requests.get(f"{API_BASE}/users")
-        response.raise_for_status()
-        data = response.json()
-        
-        # Handle new API response structure: {"success": True, "users": {...}}
-        if isinstance(data, dict) and 'users' in data:
-            return data['users']
-        else:
-            # Fallback for direct response
-            return data
+        return get_json("/users/summary", params)
     except requests.exceptions.RequestException as e:
         st.error(f"Failed to load users: {str(e)}")
-        return {}
+        return {"customers": [], "total": 0, "offset": offset, "limit": CUSTOMERS_PAGE_SIZE}
 
-def load_orders():
-    """Load orders from API - FIXED for new response structure"""
+def load_stats():
+    """Load dashboard counters from API"""
     try:
-        response = requests.get(f"{API_BASE}/orders")
+        response = api_request("GET", "/stats")
         response.raise_for_status()
-        data = response.json()
-        
-        # Orders endpoint returns array directly
-        if isinstance(data, list):
-            return data
-        else:
-            return []
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        st.error(f"Failed to load stats: {str(e)}")
+        return {"users": {"by_role": {}}, "products": {"count": 0}, "orders": {"total": 0, "by_status": {}, "revenue": 0, "recent": []}}
+
+def load_revenue(bucket):
+    """Load revenue per day, week or month from API"""
+    try:
+        return get_json("/analytics/revenue", {"bucket": bucket})["series"]
+    except requests.exceptions.RequestException as e:
+        st.error(f"Failed to load revenue: {str(e)}")
+        return []
+
+def load_top_products():
+    """Load best sellers from API"""
+    try:
+        return get_json("/analytics/top-products", {"limit": 10})
+    except requests.exceptions.RequestException as e:
+        st.error(f"Failed to load top products: {str(e)}")
+        return []
+
+def load_status_funnel():
+    """Load order counts per status stage from API"""
+    try:
+        return get_json("/analytics/status-funnel")
+    except requests.exceptions.RequestException as e:
+        st.error(f"Failed to load status funnel: {str(e)}")
+        return {"stages": [], "other": {}, "total": 0}
+
+def load_user_orders(email):
+    """Load one customer's orders from API"""
+    try:
+        data = get_json("/orders", {"email": email})
+        return data if isinstance(data, list) else []
     except requests.exceptions.RequestException as e:
         st.error(f"Failed to load orders: {str(e)}")
         return []
 
+def load_orders_page(status=None, cursor=None):
+    """Load one page of orders from API, newest first"""
+    params = {"limit": ORDERS_PAGE_SIZE}
+    if status:
+        params["status"] = status
+    if cursor:
+        params["cursor"] = cursor
+    try:
+        data = get_json("/orders", params)
+        if isinstance(data, dict) and "orders" in data:
+            return data
+    except requests.exceptions.RequestException as e:
+        st.error(f"Failed to load orders: {str(e)}")
+    return {"orders": [], "total": 0, "next_cursor": None, "prev_cursor": None}
+
+def search_products(keyword):
+    """Ranked, typo-tolerant product matches from the API's search index"""
+    try:
+        results = get_json("/products/search", {"q": keyword, "limit": SEARCH_LIMIT})
+        return {p["name"]: p for p in results}
+    except requests.exceptions.RequestException as e:
+        st.error(f"Failed to search products: {str(e)}")
+        return {}
+
+def load_catalog(unit=None, min_price=None, max_price=None, offset=0):
+    """Load one name-ordered page of the catalog from API; returns (page, etag)"""
+    params = {"offset": offset, "limit": CATALOG_PAGE_SIZE}
+    if unit:
+        params["unit"] = unit
+    if min_price:
+        params["min_price"] = min_price
+    if max_price:
+        params["max_price"] = max_price
+    try:
+        return get_json_tagged("/products", params)
+    except requests.exceptions.RequestException as e:
+        st.error(f"Failed to load products: {str(e)}")
+        return {"products": [], "total": 0, "offset": offset, "limit": CATALOG_PAGE_SIZE, "units": []}, None
+
+def catalog_cards(products):
+    """Card grid HTML for a page of products"""
+    cards = "".join(f"""
+        <div style="background: linear-gradient(135deg, #e0f7fa, #ffffff); padding: 1rem; border-radius: 10px; text-align: center;">
+            <h3 style="color: #333;">{html.escape(p['name'].title())}</h3>
+            <p style="color: #666; font-size: 1.2rem;"><strong>Rs {p['price']}</strong> per {html.escape(str(p['unit']))}</p>
+        </div>""" for p in products)
+    return f'<div style="display: grid; grid-template-columns: repeat(3, 1fr); gap: 1rem; margin-bottom: 1rem;">{cards}</div>'
+
+@st.cache_data(max_entries=CATALOG_CACHE_PAGES, show_spinner=False)
+def cached_catalog_cards(etag, page_key, _products):
+    """catalog_cards() reused until the catalog's ETag changes; page_key names the page within it"""
+    return catalog_cards(_products)
+
+def load_quote(cart):
+    """Price the cart on the server so the bill matches what the order will be charged"""
+    try:
+        response = api_request("POST", "/quote", json={"items": cart})
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.HTTPError as e:
+        st.error(e.response.json().get("detail", "Failed to price cart"))
+    except requests.exceptions.RequestException as e:
+        st.error(f"Failed to price cart: {str(e)}")
+    return None
+
 def load_products():
     """Load products from API - FIXED for new response structure"""
     try:
-        response = requests.get(f"{API_BASE}/products")
-        response.raise_for_status()
-        data = response.json()
+        data = get_json("/products")
         
         # Products endpoint returns object directly
         if isinstance(data, dict):
@@ -174,6 +369,18 @@ def load_products():
             "egg": {"price": 15, "unit": "piece"}
         }
 
+def apply_product_batch(method, items):
+    """Send products to the batch endpoint and report the ones that failed"""
+    if not items:
+        return 0
+    response = api_request(method, "/products/batch", json={"products": items})
+    response.raise_for_status()
+    result = response.json()
+    for item in result["results"]:
+        if not item["success"]:
+            st.error(f"{item['name']}: {item['detail']}")
+    return result["applied"]
+
 def signup_page():
     st.title("🛒 Create Your Account")
    
@@ -195,7 +402,7 @@ def signup_page():
                 st.error("Passwords don't match!")
             else:
                 try:
-                    response = requests.post(f"{API_BASE}/users", json={"username": username, "email": email, "password": password})
+                    response = api_request("POST", "/users", json={"username": username, "email": email, "password": password})
                     response.raise_for_status()
                     welcome_email = create_welcome_email(username)
                     if send_email(email, "Welcome to Our Grocery Store! 🛒", welcome_email):
@@ -224,7 +431,7 @@ def login_page():
                 st.error("Please enter both email and password!")
             else:
                 try:
-                    response = requests.post(f"{API_BASE}/login", json={"email": email, "password": password})
+                    response = api_request("POST", "/login", json={"email": email, "password": password})
                     response.raise_for_status()
                     data = response.json()
                     
@@ -277,33 +484,65 @@ def user_dashboard():
             del st.session_state[key]
         st.rerun()
    
-    products = load_products()
-   
     menu = ["🏪 Browse Products", "🛒 Add to Cart", "👀 View Cart", "❌ Remove Item", "💳 Generate Bill", "📋 My Orders"]
     choice = st.sidebar.selectbox("Menu", menu)
    
     if choice == "🏪 Browse Products":
         st.subheader("Available Products")
        
-        cols = st.columns(3)
-        for idx, (item, data) in enumerate(products.items()):
-            with cols[idx % 3]:
-                st.markdown(f"""
-                <div style="background: linear-gradient(135deg, #e0f7fa, #ffffff); padding: 1rem; border-radius: 10px; text-align: center; margin-bottom: 1rem;">
-                    <h3 style="color: #333;">{item.title()}</h3>
-                    <p style="color: #666; font-size: 1.2rem;"><strong>Rs {data['price']}</strong> per {data['unit']}</p>
-                </div>
-                """, unsafe_allow_html=True)
+        # Filters are read from session state first so their page loads before the widgets are drawn.
+        unit = st.session_state.get("catalog_unit", "All")
+        min_price = st.session_state.get("catalog_min_price", 0.0)
+        max_price = st.session_state.get("catalog_max_price", 0.0)
+        filters = (unit, min_price, max_price)
+        if st.session_state.get("catalog_filters") != filters:
+            st.session_state.catalog_filters = filters
+            st.session_state.catalog_offset = 0
+       
+        offset = st.session_state.catalog_offset
+        page, etag = load_catalog(None if unit == "All" else unit, min_price, max_price, offset)
+        units = ["All"] + page["units"]
+        if unit not in units:
+            st.session_state.catalog_unit = "All"
+       
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.selectbox("Unit", units, key="catalog_unit")
+        with col2:
+            st.number_input("Min price (Rs)", min_value=0.0, step=10.0, key="catalog_min_price")
+        with col3:
+            st.number_input("Max price (Rs, 0 = any)", min_value=0.0, step=10.0, key="catalog_max_price")
+       
+        products_page = page["products"]
+        if products_page:
+            st.caption(f"Showing {offset + 1}-{offset + len(products_page)} of {page['total']}")
+            if etag:
+                cards = cached_catalog_cards(etag, (filters, offset), products_page)
+            else:
+                cards = catalog_cards(products_page)
+            st.markdown(cards, unsafe_allow_html=True)
+           
+            col_prev, col_next = st.columns(2)
+            with col_prev:
+                if offset > 0 and st.button("⬅️ Previous", use_container_width=True):
+                    st.session_state.catalog_offset = max(offset - CATALOG_PAGE_SIZE, 0)
+                    st.rerun()
+            with col_next:
+                if offset + len(products_page) < page["total"] and st.button("Next ➡️", use_container_width=True):
+                    st.session_state.catalog_offset = offset + CATALOG_PAGE_SIZE
+                    st.rerun()
+        else:
+            st.info("No products match these filters.")
    
     elif choice == "🛒 Add to Cart":
         st.subheader("Add to Cart")
         keyword = st.text_input("🔍 Search products", placeholder="Type product name...")
        
         if keyword:
-            matches = {k: v for k, v in products.items() if keyword.lower() in k.lower()}
+            matches = search_products(keyword)
             if matches:
                 item = st.selectbox("Select product", list(matches.keys()))
-                qty = st.number_input(f"Quantity ({products[item]['unit']})", min_value=0.1, step=0.1)
+                qty = st.number_input(f"Quantity ({matches[item]['unit']})", min_value=0.1, step=0.1)
                
                 if st.button("Add to Cart", use_container_width=True):
                     if qty > 0:
@@ -315,7 +554,7 @@ def user_dashboard():
                         else:
                             st.session_state.cart[item] = qty
                        
-                        st.success(f"✅ Added {qty} {products[item]['unit']} of {item.title()} to cart!")
+                        st.success(f"✅ Added {qty} {matches[item]['unit']} of {item.title()} to cart!")
                     else:
                         st.error("Quantity must be greater than zero!")
             else:
@@ -327,6 +566,7 @@ def user_dashboard():
         if "cart" not in st.session_state or not st.session_state.cart:
             st.info("🛒 Your cart is empty!")
         else:
+            products = load_products()
             total = 0
             for item, qty in st.session_state.cart.items():
                 price = products[item]["price"] * qty
@@ -349,6 +589,7 @@ def user_dashboard():
         if "cart" not in st.session_state or not st.session_state.cart:
             st.info("🛒 Your cart is empty!")
         else:
+            products = load_products()
             item = st.selectbox("Select item to remove", list(st.session_state.cart.keys()))
             current_qty = st.session_state.cart[item]
             qty_to_remove = st.number_input(f"Quantity to remove (current: {current_qty})", min_value=0.1, step=0.1)
@@ -372,64 +613,48 @@ def user_dashboard():
             st.info("🛒 Your cart is empty!")
         else:
             cart = st.session_state.cart
-            total = sum(products[item]["price"] * qty for item, qty in cart.items())
-           
-            discount_rate = 0
-            if total >= 2000:
-                discount_rate = 0.15
-            elif total >= 1000:
-                discount_rate = 0.10
-           
-            discount_amount = total * discount_rate
-            total_after_discount = total - discount_amount
-            tax_amount = total_after_discount * TAX_RATE
-            final_total = total_after_discount + tax_amount
-           
-            st.markdown("### 🧾 Bill Summary")
-           
-            for item, qty in cart.items():
-                price = products[item]["price"] * qty
-                st.write(f"{item.title()} - {qty} {products[item]['unit']} × Rs {products[item]['price']} = Rs {price:.2f}")
+            bill = load_quote(cart)
            
-            st.markdown("---")
-            st.write(f"Subtotal: Rs {total:.2f}")
-            if discount_rate > 0:
-                st.write(f"Discount ({int(discount_rate*100)}%): -Rs {discount_amount:.2f}")
-            st.write(f"Tax (5%): +Rs {tax_amount:.2f}")
-            st.markdown(f"**Final Total: Rs {final_total:.2f}**")
-           
-            if st.button("🛒 Place Order", use_container_width=True):
-                order_id = str(uuid.uuid4())[:8].upper()
-                order = {
-                    "order_id": order_id,
-                    "email": st.session_state.user_email,
-                    "username": st.session_state.username,
-                    "items": cart.copy(),
-                    "subtotal": total,
-                    "discount_amount": discount_amount,
-                    "tax_amount": tax_amount,
-                    "total": final_total,
-                    "status": "pending",
-                    "date": datetime.now().isoformat()
-                }
+            if bill:
+                st.markdown("### 🧾 Bill Summary")
                
-                try:
-                    response = requests.post(f"{API_BASE}/orders", json=order)
-                    response.raise_for_status()
-                    order_email = create_order_email(st.session_state.username, order_id, final_total, "pending")
-                    send_email(st.session_state.user_email, f"Order Confirmation - {order_id}", order_email)
+                for line in bill["lines"]:
+                    st.write(f"{line['name'].title()} - {line['quantity']} {line['unit']} × Rs {line['price']} = Rs {line['amount']:.2f}")
+               
+                st.markdown("---")
+                st.write(f"Subtotal: Rs {bill['subtotal']:.2f}")
+                if bill["discount_rate"] > 0:
+                    st.write(f"Discount ({bill['discount_rate']*100:g}%): -Rs {bill['discount_amount']:.2f}")
+                st.write(f"Tax ({bill['tax_rate']*100:g}%): +Rs {bill['tax_amount']:.2f}")
+                st.markdown(f"**Final Total: Rs {bill['total']:.2f}**")
+               
+                if st.button("🛒 Place Order", use_container_width=True):
+                    order_id = str(uuid.uuid4())[:8].upper()
+                    order = {
+                        "order_id": order_id,
+                        "email": st.session_state.user_email,
+                        "username": st.session_state.username,
+                        "items": cart.copy(),
+                        "status": "pending",
+                        "date": datetime.now().isoformat()
+                    }
                    
-                    st.success(f"🎉 Order placed successfully! Order ID: {order_id}")
-                    st.session_state.cart = {}
-                    st.balloons()
-                except requests.exceptions.RequestException as e:
-                    st.error(f"Failed to place order: {str(e)}")
+                    try:
+                        response = api_request("POST", "/orders", json=order)
+                        response.raise_for_status()
+                        order_email = create_order_email(st.session_state.username, order_id, bill["total"], "pending")
+                        send_email(st.session_state.user_email, f"Order Confirmation - {order_id}", order_email)
+                       
+                        st.success(f"🎉 Order placed successfully! Order ID: {order_id}")
+                        st.session_state.cart = {}
+                        st.balloons()
+                    except requests.exceptions.RequestException as e:
+                        st.error(f"Failed to place order: {str(e)}")
    
     elif choice == "📋 My Orders":
         st.subheader("My Orders")
        
-        orders = load_orders()
-        user_orders = [order for order in orders if order.get("email") == st.session_state.user_email]
+        user_orders = load_user_orders(st.session_state.user_email)
        
         if not user_orders:
             st.info("📦 No orders found!")
@@ -461,69 +686,102 @@ def admin_dashboard():
     if choice == "📊 Overview":
         st.subheader("Dashboard Overview")
        
-        users = load_users()
-        orders = load_orders()
-        products = load_products()
+        # The chart bucket is read before its radio is drawn so every panel loads at once.
+        bucket = st.session_state.get("revenue_bucket", "day")
+        stats, series, top, funnel = load_concurrently(
+            load_stats, partial(load_revenue, bucket), load_top_products, load_status_funnel)
+        orders = stats["orders"]
        
         col1, col2, col3, col4 = st.columns(4)
        
         with col1:
-            # FIXED: Handle new API response structure
-            user_count = len([u for u in users.values() if u.get('role') == 'user']) if isinstance(users, dict) else 0
-            st.metric("👥 Total Users", user_count)
+            st.metric("👥 Total Users", stats["users"]["by_role"].get("user", 0))
        
         with col2:
-            st.metric("📦 Total Orders", len(orders))
+            st.metric("📦 Total Orders", orders["total"])
        
         with col3:
-            st.metric("🛍️ Products", len(products))
+            st.metric("🛍️ Products", stats["products"]["count"])
        
         with col4:
-            total_revenue = sum(order.get('total', 0) for order in orders)
-            st.metric("💰 Revenue", f"Rs {total_revenue:.2f}")
+            st.metric("💰 Revenue", f"Rs {orders['revenue']:.2f}")
        
         st.subheader("Recent Orders")
-        if orders:
-            for order in orders[-5:]:
+        if orders["recent"]:
+            for order in orders["recent"]:
                 status_color = {"pending": "🟡", "shipped": "🔵", "delivered": "🟢", "cancelled": "🔴"}
                 st.write(f"{status_color.get(order['status'], '⚪')} {order['order_id']} - {order['username']} - Rs {order['total']:.2f}")
         else:
             st.info("No orders yet!")
+       
+        st.subheader("Sales Analytics")
+        st.radio("Revenue by", ["day", "week", "month"], horizontal=True, key="revenue_bucket")
+        if series:
+            st.bar_chart({row["bucket"]: row["revenue"] for row in series})
+        else:
+            st.info("No sales yet!")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("**Top Products (quantity)**")
+            if top:
+                st.bar_chart({row["name"]: row["quantity"] for row in top})
+        with col2:
+            st.write("**Order Status Funnel**")
+            if funnel["stages"]:
+                st.dataframe(funnel["stages"], use_container_width=True, hide_index=True)
+            for status, n in funnel["other"].items():
+                st.caption(f"{status}: {n}")
+       
+        with st.expander("⏱️ App Timings"):
+            st.caption("API calls and email queueing as seen by this Streamlit server. Server-side metrics are at /metrics on the API.")
+            for name, rows in REGISTRY.summary("client_").items():
+                if rows:
+                    st.write(f"**{name}**")
+                    st.dataframe(rows, use_container_width=True, hide_index=True)
    
     elif choice == "👥 Manage Users":
         st.subheader("User Management")
        
-        users = load_users()
-        
-        # FIXED: Handle new API response structure
-        if isinstance(users, dict):
-            user_list = [u for email, u in users.items() if u.get('role') == 'user']
-        else:
-            user_list = []
+        sort_label = st.selectbox("Sort by", list(CUSTOMER_SORTS))
+        if st.session_state.get("customers_sort") != sort_label:
+            st.session_state.customers_sort = sort_label
+            st.session_state.customers_offset = 0
+       
+        sort, order = CUSTOMER_SORTS[sort_label]
+        page = load_customers(sort, order, st.session_state.customers_offset)
+        customers = page["customers"]
        
-        if user_list:
-            st.write(f"**Total Users: {len(user_list)}**")
+        if customers:
+            st.write(f"**Total Users: {page['total']}**")
            
-            for email, user in users.items():
-                if user.get('role') == 'user':
-                    with st.expander(f"👤 {user['username']} ({email})"):
-                        st.write(f"**Email:** {email}")
-                        st.write(f"**Joined:** {user.get('created_at', 'Unknown')[:10]}")
-                       
-                        orders = load_orders()
-                        user_orders = [o for o in orders if o.get('email') == email]
-                        st.write(f"**Total Orders:** {len(user_orders)}")
-                       
-                        if user_orders:
-                            total_spent = sum(o['total'] for o in user_orders)
-                            st.write(f"**Total Spent:** Rs {total_spent:.2f}")
+            for customer in customers:
+                with st.expander(f"👤 {customer['username']} ({customer['email']})"):
+                    st.write(f"**Email:** {customer['email']}")
+                    st.write(f"**Joined:** {(customer.get('joined') or 'Unknown')[:10]}")
+                    st.write(f"**Total Orders:** {customer['orders']}")
+                   
+                    if customer["orders"]:
+                        st.write(f"**Total Spent:** Rs {customer['spend']:.2f}")
+                        st.write(f"**Last Order:** {customer['last_order'][:10]}")
+                        st.write("**Orders by Status:** " + ", ".join(f"{s} {n}" for s, n in customer["by_status"].items()))
+           
+            col_prev, col_next = st.columns(2)
+            offset = page["offset"]
+            with col_prev:
+                if offset > 0 and st.button("⬅️ Previous", use_container_width=True):
+                    st.session_state.customers_offset = max(offset - CUSTOMERS_PAGE_SIZE, 0)
+                    st.rerun()
+            with col_next:
+                if offset + len(customers) < page["total"] and st.button("Next ➡️", use_container_width=True):
+                    st.session_state.customers_offset = offset + CUSTOMERS_PAGE_SIZE
+                    st.rerun()
         else:
             st.info("No users registered yet!")
    
     elif choice == "🛍️ Manage Products":
         st.subheader("Product Management")
        
-        tab1, tab2, tab3, tab4 = st.tabs(["➕ Add Product", "✏️ Update Product", "❌ Delete Product", "📋 View Products"])
+        tab1, tab2, tab3, tab4, tab5 = st.tabs(["➕ Add Product", "✏️ Update Product", "❌ Delete Product", "📋 View Products", "📦 Bulk Update"])
        
         products = load_products()
        
@@ -537,7 +795,7 @@ def admin_dashboard():
                 if st.form_submit_button("Add Product"):
                     if name and price > 0 and unit:
                         try:
-                            response = requests.post(f"{API_BASE}/products", json={"name": name, "price": price, "unit": unit})
+                            response = api_request("POST", "/products", json={"name": name, "price": price, "unit": unit})
                             response.raise_for_status()
                             st.success(f"✅ Product '{name.title()}' added successfully!")
                             st.rerun()
@@ -562,7 +820,7 @@ def admin_dashboard():
                     if st.form_submit_button("Update Product"):
                         if new_price > 0 and new_unit:
                             try:
-                                response = requests.put(f"{API_BASE}/products/{product_name}", json={"price": new_price, "unit": new_unit.lower()})
+                                response = api_request("PUT", f"/products/{product_name}", route="/products/{name}", json={"price": new_price, "unit": new_unit.lower()})
                                 response.raise_for_status()
                                 st.success(f"✅ Product '{product_name.title()}' updated successfully!")
                                 st.rerun()
@@ -580,7 +838,7 @@ def admin_dashboard():
                
                 if st.button("🗑️ Delete Product", use_container_width=True):
                     try:
-                        response = requests.delete(f"{API_BASE}/products/{product_to_delete}")
+                        response = api_request("DELETE", f"/products/{product_to_delete}", route="/products/{name}")
                         response.raise_for_status()
                         st.success(f"✅ Product '{product_to_delete.title()}' deleted successfully!")
                         st.rerun()
@@ -597,21 +855,108 @@ def admin_dashboard():
             else:
                 st.info("No products available!")
    
+        with tab5:
+            st.write("**Bulk Price Change**")
+            if products:
+                selected = st.multiselect("Select Products", list(products.keys()), key="bulk_products")
+                change_pct = st.number_input("Change price by (%)", value=0.0, min_value=-90.0, step=1.0)
+               
+                if st.button("Apply to Selected Products", use_container_width=True, disabled=not selected):
+                    items = [{"name": name, "price": round(products[name]["price"] * (1 + change_pct / 100), 2), "unit": products[name]["unit"]}
+                             for name in selected]
+                    try:
+                        applied = apply_product_batch("PATCH", items)
+                        st.success(f"✅ Updated {applied} product(s)!")
+                    except requests.exceptions.RequestException as e:
+                        st.error(f"Failed to update products: {str(e)}")
+            else:
+                st.info("No products available!")
+           
+            st.write("**Import Price List**")
+            uploaded = st.file_uploader("CSV with name, price and unit columns", type="csv")
+            if uploaded is not None and st.button("Import Price List", use_container_width=True):
+                try:
+                    rows = csv.DictReader(io.StringIO(uploaded.getvalue().decode("utf-8")))
+                    items = [{"name": row["name"].strip().lower(), "price": float(row["price"]), "unit": row["unit"].strip().lower()} for row in rows]
+                except (KeyError, ValueError, UnicodeDecodeError) as e:
+                    st.error(f"Invalid price list: {str(e)}")
+                    items = []
+                if items:
+                    try:
+                        added = apply_product_batch("POST", [i for i in items if i["name"] not in products])
+                        updated = apply_product_batch("PATCH", [i for i in items if i["name"] in products])
+                        st.success(f"✅ Added {added} and updated {updated} product(s)!")
+                    except requests.exceptions.RequestException as e:
+                        st.error(f"Failed to import price list: {str(e)}")
+   
     elif choice == "📦 Manage Orders":
         st.subheader("Order Management")
        
-        orders = load_orders()
+        status_filter = st.selectbox("Filter by Status", ["All", "pending", "shipped", "delivered", "cancelled"])
+        if st.session_state.get("orders_filter") != status_filter:
+            st.session_state.orders_filter = status_filter
+            st.session_state.orders_cursor = None
+       
+        with st.expander("📤 Export Orders"):
+            col_format, col_from, col_to = st.columns(3)
+            with col_format:
+                export_format = st.selectbox("Format", ["csv", "ndjson"], key="export_format")
+            with col_from:
+                export_from = st.date_input("From", value=None, key="export_from")
+            with col_to:
+                export_to = st.date_input("To", value=None, key="export_to")
+            params = {"format": export_format}
+            if status_filter != "All":
+                params["status"] = status_filter
+            if export_from:
+                params["from"] = export_from.isoformat()
+            if export_to:
+                params["to"] = export_to.isoformat()
+            st.caption("Exports every matching order, archived ones included; CSV has one row per item.")
+            # The browser downloads straight from the API, which streams the file,
+            # rather than the whole export passing through this app's memory.
+            st.link_button("⬇️ Download Orders", f"{API_BASE}/orders/export?{urlencode(params)}", use_container_width=True)
+       
+        page = load_orders_page(None if status_filter == "All" else status_filter, st.session_state.orders_cursor)
+        orders = page["orders"]
        
         if not orders:
             st.info("No orders yet!")
         else:
-            st.write(f"**Total Orders: {len(orders)}**")
+            st.write(f"**Total Orders: {page['total']}**")
            
-            status_filter = st.selectbox("Filter by Status", ["All", "pending", "shipped", "delivered", "cancelled"])
+            col_prev, col_next = st.columns(2)
+            with col_prev:
+                if page.get("prev_cursor") and st.button("⬅️ Newer", use_container_width=True):
+                    st.session_state.orders_cursor = page["prev_cursor"]
+                    st.rerun()
+            with col_next:
+                if page.get("next_cursor") and st.button("Older ➡️", use_container_width=True):
+                    st.session_state.orders_cursor = page["next_cursor"]
+                    st.rerun()
            
-            filtered_orders = orders if status_filter == "All" else [o for o in orders if o['status'] == status_filter]
+            with st.expander("🗂️ Bulk Status Update"):
+                selected = st.multiselect("Select Orders", [o['order_id'] for o in orders], key="bulk_orders")
+                bulk_status = st.selectbox("New Status", ["pending", "shipped", "delivered", "cancelled"], key="bulk_status")
+               
+                if st.button("Apply to Selected Orders", use_container_width=True, disabled=not selected):
+                    try:
+                        response = api_request("PATCH", "/orders/status", json={"updates": [{"order_id": order_id, "status": bulk_status} for order_id in selected]})
+                        response.raise_for_status()
+                        result = response.json()
+                        orders_by_id = {o['order_id']: o for o in orders}
+                        for item in result["results"]:
+                            if item["success"]:
+                                order = orders_by_id[item["order_id"]]
+                                status_email = create_order_email(order['username'], order['order_id'], order['total'], bulk_status)
+                                send_email(order['email'], f"Order Status Update - {order['order_id']}", status_email)
+                            else:
+                                st.error(f"{item['order_id']}: {item['detail']}")
+                        st.success(f"✅ Updated {result['applied']} order(s) to {bulk_status.title()}!")
+                    except requests.exceptions.RequestException as e:
+                        st.error(f"Failed to update orders: {str(e)}")
            
-            for idx, order in enumerate(reversed(filtered_orders)):
+            for idx, order in enumerate(orders):
                 status_colors = {"pending": "🟡", "shipped": "🔵", "delivered": "🟢", "cancelled": "🔴"}
                
                 with st.expander(f"{status_colors.get(order['status'], '⚪')} Order {order['order_id']} - {order['username']}"):
@@ -638,7 +983,7 @@ def admin_dashboard():
                     if new_status != current_status:
                         if st.button(f"Update Status to {new_status.title()}", key=f"update_{order['order_id']}"):
                             try:
-                                response = requests.put(f"{API_BASE}/orders/{order['order_id']}", json={"status": new_status})
+                                response = api_request("PUT", f"/orders/{order['order_id']}", route="/orders/{order_id}", json={"status": new_status})
                                 response.raise_for_status()
                                 status_email = create_order_email(order['username'], order['order_id'], order['total'], new_status)
                                 send_email(order['email'], f"Order Status Update - {order['order_id']}", status_email)
@@ -0,0 +1,353 @@
+from bisect import bisect_left, bisect_right, insort
+import os
+import threading
+import time
+import codec
+from coordination import SharedVersion
+from records import OrderRecord
+from metrics import JSON_SECONDS, STORAGE_BYTES, STORAGE_SECONDS
+from store import CHECK_INTERVAL, ITER_CHUNK, GroupCommitter, atomic_write_json, file_stamp, read_json
+
+COMPACT_EVERY = 1000
+
+class OrderLog:
+    """Orders kept as a snapshot file plus an append-only journal of changes
+
+    Orders are held as compact OrderRecords; they become dicts again only
+    when serialized (journal, snapshot, API responses). Processes share a
+    SharedVersion next to the snapshot: writers hold its lock exclusively,
+    loads hold it shared, and when another process has only appended to the
+    journal just the new records are read and applied.
+    """
+
+    def __init__(self, snapshot_path, journal_path, compact_every=COMPACT_EVERY, check_interval=CHECK_INTERVAL):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.compact_every = compact_every
+        self.check_interval = check_interval
+        self.version = 0
+        self.shared_version = SharedVersion(f"{snapshot_path}.version")
+        self._lock = threading.Lock()
+        self._orders = None
+        self._positions = {}
+        self._by_email = {}
+        self._by_status = {}
+        self._journal_entries = 0
+        # Bytes of the journal already applied.
+        self._journal_offset = 0
+        self._stamp = None
+        self._checked_at = 0.0
+        self._listeners = []
+        self._writer = GroupCommitter(self._commit_group)
+
+    def subscribe(self, listener):
+        """Register an object with reset(orders), order_added(order) and
+        status_changed(order, old_status) hooks"""
+        with self._lock:
+            self._listeners.append(listener)
+            if self._orders is not None:
+                listener.reset(self._orders)
+
+    def _read_snapshot(self):
+        if os.path.exists(self.snapshot_path):
+            return read_json(self.snapshot_path)
+        return []
+
+    def _read_journal(self, offset=0):
+        """Return the records from byte offset on, and the offset after the last whole line"""
+        if not os.path.exists(self.journal_path):
+            return [], 0
+        name = os.path.basename(self.journal_path)
+        with STORAGE_SECONDS.time(store=name, op="load"):
+            with open(self.journal_path, "rb") as f:
+                f.seek(offset)
+                raw = f.read()
+        STORAGE_BYTES.inc(len(raw), store=name, op="load")
+        # A crash mid-append leaves an unterminated last line. It was never
+        # acknowledged, so it is ignored here and cut off by the next append.
+        end = raw.rfind(b"\n") + 1
+        records = []
+        with JSON_SECONDS.time(store=name, op="decode"):
+            for line in raw[:end].splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    records.append(codec.loads(line))
+                except ValueError:
+                    # Journals written before appends cut the tail can hold
+                    # a fragment merged with the next record; skip it.
+                    continue
+        return records, offset + end
+
+    def _apply(self, record, notify=False):
+        """Apply one journal record to the in-memory view"""
+        if record["op"] == "create":
+            order = OrderRecord.from_dict(record["order"])
+            # Replaying after a compaction that crashed before the journal was
+            # truncated must not duplicate orders already in the snapshot.
+            if order.order_id not in self._positions:
+                self._index(order)
+                if notify:
+                    for listener in self._listeners:
+                        listener.order_added(order)
+        elif record["op"] == "status":
+            idx = self._positions.get(record["order_id"])
+            if idx is not None:
+                order = self._orders[idx]
+                old_status = order.status
+                old = self._by_status[old_status]
+                del old[bisect_left(old, idx)]
+                insort(self._by_status.setdefault(record["status"], []), idx)
+                order.status = record["status"]
+                if notify:
+                    for listener in self._listeners:
+                        listener.status_changed(order, old_status)
+
+    def _index(self, order):
+        idx = len(self._orders)
+        self._orders.append(order)
+        self._positions[order.order_id] = idx
+        self._by_email.setdefault(order.email, []).append(idx)
+        self._by_status.setdefault(order.status, []).append(idx)
+
+    def _current_stamp(self):
+        return (file_stamp(self.snapshot_path), file_stamp(self.journal_path))
+
+    def _load(self, force=False):
+        """Bring the in-memory view up to date if the shared version or either file moved"""
+        now = time.monotonic()
+        shared = self.shared_version
+        if self._orders is not None and shared.value() == self.version:
+            if not force and now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            if self._current_stamp() == self._stamp:
+                return
+        self._checked_at = now
+        with shared.lock(shared=True):
+            version = shared.value()
+            stamp = self._current_stamp()
+            if version != self.version:
+                if self._orders is not None and self._only_appended(stamp):
+                    self._tail(version, stamp)
+                else:
+                    self._rebuild(version, stamp)
+                return
+            if stamp == self._stamp:
+                return
+        # The files changed without a commit (edited by hand): take a new
+        # version so every process rebuilds.
+        with shared.lock():
+            if shared.value() == self.version:
+                shared.bump()
+            self._rebuild(shared.value(), self._current_stamp())
+
+    def _only_appended(self, stamp):
+        """Whether the snapshot is the one loaded and the journal has only grown since"""
+        snapshot, journal = stamp
+        return snapshot == self._stamp[0] and journal is not None and journal[1] >= self._journal_offset
+
+    def _tail(self, version, stamp):
+        """Apply the journal records another process appended since the last load"""
+        records, self._journal_offset = self._read_journal(self._journal_offset)
+        for record in records:
+            self._apply(record, notify=True)
+        self._journal_entries += len(records)
+        self._stamp = stamp
+        self.version = version
+
+    def _rebuild(self, version, stamp):
+        self._orders = []
+        self._positions = {}
+        self._by_email = {}
+        self._by_status = {}
+        snapshot = self._read_snapshot()
+        # Convert from the back so each decoded dict is freed as its record is built.
+        snapshot.reverse()
+        while snapshot:
+            self._index(OrderRecord.from_dict(snapshot.pop()))
+        self._journal_entries = 0
+        records, self._journal_offset = self._read_journal()
+        for record in records:
+            self._apply(record)
+            self._journal_entries += 1
+        self._stamp = stamp
+        self.version = version
+        for listener in self._listeners:
+            listener.reset(self._orders)
+
+    def _append(self, records):
+        name = os.path.basename(self.journal_path)
+        with JSON_SECONDS.time(store=name, op="encode"):
+            raw = b"".join(codec.dumps(r) + b"\n" for r in records)
+        with STORAGE_SECONDS.time(store=name, op="save"):
+            with open(self.journal_path, "ab") as f:
+                # Start on a fresh line: drop whatever follows the last whole one.
+                f.truncate(self._journal_offset)
+                f.write(raw)
+                f.flush()
+                os.fsync(f.fileno())
+                self._journal_offset = f.tell()
+        STORAGE_BYTES.inc(len(raw), store=name, op="save")
+        for record in records:
+            self._apply(record, notify=True)
+        self._journal_entries += len(records)
+        self.version = self.shared_version.bump()
+        if self.compact_every and self._journal_entries >= self.compact_every:
+            self._compact()
+        self._stamp = self._current_stamp()
+
+    def _compact(self):
+        """Fold the journal into a fresh snapshot and start a new journal"""
+        atomic_write_json(self.snapshot_path, self._orders)
+        # A crash before the truncate only means replaying records the
+        # snapshot already contains, which _apply tolerates.
+        open(self.journal_path, "w").close()
+        self._journal_entries = 0
+        self._journal_offset = 0
+        self._stamp = self._current_stamp()
+
+    def _commit_group(self, jobs):
+        """Validate each job's records, then append all accepted ones with one fsync"""
+        with self._lock, self.shared_version.lock():
+            self._load(force=True)
+            created = set()
+            results = []
+            accepted = []
+            for records in jobs:
+                job_results = []
+                for record in records:
+                    if record["op"] == "create":
+                        order_id = record["order"]["order_id"]
+                        ok = order_id not in self._positions and order_id not in created
+                        if ok:
+                            created.add(order_id)
+                    else:
+                        order_id = record["order_id"]
+                        ok = order_id in self._positions or order_id in created
+                    if ok:
+                        accepted.append(record)
+                    job_results.append(ok)
+                results.append(job_results)
+            if accepted:
+                self._append(accepted)
+            return results
+
+    def refresh(self):
+        with self._lock:
+            self._load()
+
+    def current_version(self):
+        """Return the version after picking up any change on disk"""
+        with self._lock:
+            self._load()
+            return self.version
+
+    def all(self):
+        with self._lock:
+            self._load()
+            return list(self._orders)
+
+    def get(self, order_id):
+        with self._lock:
+            self._load()
+            idx = self._positions.get(order_id)
+            return None if idx is None else self._orders[idx]
+
+    def by_email(self, email):
+        with self._lock:
+            self._load()
+            return [self._orders[idx] for idx in self._by_email.get(email, [])]
+
+    def by_status(self, status):
+        with self._lock:
+            self._load()
+            return [self._orders[idx] for idx in self._by_status.get(status, [])]
+
+    def iter_orders(self, status=None, start=None, end=None, chunk=ITER_CHUNK):
+        """Yield orders oldest first, holding the lock for one chunk at a time
+
+        start and end are inclusive YYYY-MM-DD days; orders outside them are
+        skipped on their record's day, without being turned into dicts.
+        """
+        last = -1
+        while True:
+            with self._lock:
+                self._load()
+                seq = range(len(self._orders)) if status is None else self._by_status.get(status, [])
+                lo = bisect_right(seq, last)
+                batch = [self._orders[seq[i]] for i in range(lo, min(lo + chunk, len(seq)))]
+                if batch:
+                    last = seq[lo + len(batch) - 1]
+            if not batch:
+                return
+            if start is not None or end is not None:
+                batch = [o for o in batch if (start is None or o.day >= start) and (end is None or o.day <= end)]
+            yield from batch
+
+    def page(self, status=None, limit=20, before=None, after=None):
+        """Return one page of orders, newest first
+
+        The result is (orders, total, older, newer) where older/newer are the
+        positions to page from, or None at either end. Pages are cut from the
+        position lists with bisect, so the cost depends on the page size
+        rather than on how many orders exist.
+        """
+        with self._lock:
+            self._load()
+            seq = range(len(self._orders)) if status is None else self._by_status.get(status, [])
+            if after is not None:
+                lo = bisect_right(seq, after)
+                hi = min(lo + limit, len(seq))
+            else:
+                hi = len(seq) if before is None else bisect_left(seq, before)
+                lo = max(hi - limit, 0)
+            orders = [self._orders[seq[i]] for i in range(hi - 1, lo - 1, -1)]
+            older = seq[lo] if lo > 0 else None
+            newer = seq[hi - 1] if hi < len(seq) else None
+            return orders, len(seq), older, newer
+
+    def append_order(self, order):
+        return self._writer.submit([{"op": "create", "order": order}])[0]
+
+    def set_status(self, order_id, status):
+        return self.set_statuses([(order_id, status)])[0]
+
+    def set_statuses(self, updates):
+        """Apply (order_id, status) updates in one durable journal write
+
+        Returns one bool per update; unknown order ids are skipped.
+        """
+        return self._writer.submit([{"op": "status", "order_id": order_id, "status": status}
+                                    for order_id, status in updates])
+
+    async def append_order_async(self, order):
+        return (await self._writer.submit_async([{"op": "create", "order": order}]))[0]
+
+    async def set_statuses_async(self, updates):
+        """set_statuses() for event-loop callers; waits for the fsync without holding a thread"""
+        return await self._writer.submit_async([{"op": "status", "order_id": order_id, "status": status}
+                                                for order_id, status in updates])
+
+    def compact(self):
+        with self._lock, self.shared_version.lock():
+            self._load(force=True)
+            self._compact()
+            # Same orders, but other processes cannot tail a rewritten journal.
+            self.version = self.shared_version.bump()
+
+    def remove(self, order_ids):
+        """Drop orders (e.g. once archived) by rewriting the snapshot without them
+
+        Returns how many were removed. Listeners get a reset, as after a reload.
+        """
+        order_ids = set(order_ids)
+        with self._lock, self.shared_version.lock():
+            self._load(force=True)
+            keep = [o for o in self._orders if o.order_id not in order_ids]
+            removed = len(self._orders) - len(keep)
+            if removed:
+                atomic_write_json(self.snapshot_path, keep)
+                open(self.journal_path, "w").close()
+                self._rebuild(self.shared_version.bump(), self._current_stamp())
+            return removed
@@ -0,0 +1,185 @@
+import random
+import smtplib
+import sqlite3
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from metrics import REGISTRY
+
+OUTBOX_FILE = "outbox.db"
+BATCH_SIZE = 20
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 600.0
+LEASE_SECONDS = 120.0
+POLL_INTERVAL = 5.0
+IDLE_TIMEOUT = 60.0
+
+DELIVERY_SECONDS = REGISTRY.histogram(
+    "client_email_delivery_seconds", "SMTP delivery time per message by result", ["result"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    to_email TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    lease_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+class Outbox:
+    """Durable email queue drained by background workers over reused SMTP connections"""
+
+    def __init__(self, host, port, sender, password=None, starttls=True, path=OUTBOX_FILE,
+                 workers=1, batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS, smtp_factory=smtplib.SMTP):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.password = password
+        self.starttls = starttls
+        self.path = path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.smtp_factory = smtp_factory
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        db = self._connect()
+        try:
+            db.executescript(SCHEMA)
+        finally:
+            db.close()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def enqueue(self, to_email, subject, body):
+        db = self._connect()
+        try:
+            db.execute(
+                "INSERT INTO outbox (to_email, subject, body, created_at) VALUES (?, ?, ?, ?)",
+                (to_email, subject, body, time.time()))
+        finally:
+            db.close()
+        self._wake.set()
+
+    def counts(self):
+        """Return the number of queued messages per status"""
+        db = self._connect()
+        try:
+            return dict(db.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status"))
+        finally:
+            db.close()
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"outbox-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _claim(self, db):
+        """Lease a batch of due messages so no other worker picks them up"""
+        now = time.time()
+        return db.execute(
+            """UPDATE outbox SET lease_until = ?
+               WHERE id IN (SELECT id FROM outbox
+                            WHERE status = 'pending' AND next_attempt_at <= ? AND lease_until <= ?
+                            ORDER BY id LIMIT ?)
+               RETURNING id, to_email, subject, body, attempts""",
+            (now + LEASE_SECONDS, now, now, self.batch_size)).fetchall()
+
+    def _open_smtp(self):
+        server = self.smtp_factory(self.host, self.port, timeout=30)
+        if self.starttls:
+            server.starttls()
+        if self.password:
+            server.login(self.sender, self.password)
+        return server
+
+    def _build(self, to_email, subject, body):
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'html'))
+        return msg
+
+    def _retry(self, db, msg_id, attempts, error):
+        attempts += 1
+        if attempts >= self.max_attempts:
+            db.execute("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ?, lease_until = 0 WHERE id = ?",
+                       (attempts, str(error), msg_id))
+            return
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempts) * random.uniform(0.5, 1.0)
+        db.execute("UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ?, lease_until = 0 WHERE id = ?",
+                   (attempts, time.time() + delay, str(error), msg_id))
+
+    def _close(self, server):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def _run(self):
+        db = self._connect()
+        server = None
+        last_used = 0.0
+        try:
+            while not self._stopping.is_set():
+                self._wake.clear()
+                batch = self._claim(db)
+                if not batch:
+                    if server is not None and time.monotonic() - last_used > IDLE_TIMEOUT:
+                        self._close(server)
+                        server = None
+                    self._wake.wait(POLL_INTERVAL)
+                    continue
+                for msg_id, to_email, subject, body, attempts in batch:
+                    msg = self._build(to_email, subject, body)
+                    started = time.perf_counter()
+                    try:
+                        if server is None:
+                            server = self._open_smtp()
+                        try:
+                            server.send_message(msg)
+                        except smtplib.SMTPServerDisconnected:
+                            # The server dropped our idle connection; reconnect once.
+                            server = self._open_smtp()
+                            server.send_message(msg)
+                    except (smtplib.SMTPException, OSError) as e:
+                        DELIVERY_SECONDS.observe(time.perf_counter() - started, result="error")
+                        if server is not None:
+                            server.close()
+                            server = None
+                        self._retry(db, msg_id, attempts, e)
+                        continue
+                    DELIVERY_SECONDS.observe(time.perf_counter() - started, result="sent")
+                    db.execute("UPDATE outbox SET status = 'sent', sent_at = ?, lease_until = 0 WHERE id = ?",
+                               (time.time(), msg_id))
+                    last_used = time.monotonic()
+        finally:
+            if server is not None:
+                self._close(server)
+            db.close()
@@ -0,0 +1,77 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+from metrics import BCRYPT_SECONDS
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 1))
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", HASH_WORKERS * 4))
+# Forking the threaded server could copy a lock another thread holds into the
+# worker, so workers start from a clean process.
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+class PoolBusy(Exception):
+    """Raised when the hashing queue is full and the job was not accepted"""
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    try:
+        return bcrypt.checkpw(password, hashed)
+    except ValueError:
+        # A malformed stored hash matches no password.
+        return False
+
+def needs_rehash(hashed: str, rounds: int = BCRYPT_ROUNDS) -> bool:
+    """True for legacy $2a$ hashes, malformed hashes or hashes made with a different work factor"""
+    parts = hashed.split("$")
+    return len(parts) < 4 or parts[1] != "2b" or not parts[2].isdigit() or int(parts[2]) != rounds
+
+class HashPool:
+    """Runs bcrypt on a size-limited process pool with a bounded queue"""
+
+    def __init__(self, workers=HASH_WORKERS, queue_limit=HASH_QUEUE_LIMIT, rounds=BCRYPT_ROUNDS):
+        self.workers = workers
+        self.rounds = rounds
+        self._slots = threading.BoundedSemaphore(queue_limit)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context(START_METHOD))
+            return self._executor
+
+    def _submit(self, fn, *args):
+        # Reject straight away instead of queueing without bound: a burst of
+        # logins should get fast 503s, not time out behind each other.
+        if not self._slots.acquire(blocking=False):
+            raise PoolBusy()
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda f: self._slots.release())
+        return asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        with BCRYPT_SECONDS.time(op="hash"):
+            hashed = await self._submit(_hash, password.encode('utf-8'), self.rounds)
+        return hashed.decode('utf-8')
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        with BCRYPT_SECONDS.time(op="verify"):
+            return await self._submit(_check, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
@@ -0,0 +1,230 @@
+import sys
+from array import array
+from collections.abc import Mapping
+from datetime import date, datetime, timezone
+from functools import lru_cache
+import codec
+
+EPOCH_DAY = date(1970, 1, 1).toordinal()
+DAY_MICROS = 86_400_000_000
+STATUSES = ("pending", "processing", "shipped", "delivered", "cancelled")
+# Cancelled orders count by status but not towards revenue, product totals or spend.
+EXCLUDED_STATUSES = ("cancelled",)
+AMOUNTS = ("subtotal", "discount_amount", "tax_amount", "total")
+FIELDS = frozenset(("order_id", "email", "username", "items", "status", "date") + AMOUNTS)
+# Marks an amount the order does not have.
+NAN = float("nan")
+# Orders usually repeat a handful of baskets; share their name tuples up to this many.
+NAME_TUPLES_CACHED = 1 << 16
+REPORT_SAMPLE = 100_000
+
+_status_codes = {status: code for code, status in enumerate(STATUSES)}
+_name_tuples = {}
+
+def datetime_micros(dt: datetime) -> int:
+    """Microseconds since 1970-01-01 for a naive datetime"""
+    seconds = (((dt.toordinal() - EPOCH_DAY) * 24 + dt.hour) * 60 + dt.minute) * 60 + dt.second
+    return seconds * 1_000_000 + dt.microsecond
+
+def to_micros(text: str) -> int:
+    dt = datetime.fromisoformat(text)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return datetime_micros(dt)
+
+@lru_cache(maxsize=4096)
+def _day_text(day: int) -> str:
+    return date.fromordinal(day + EPOCH_DAY).isoformat()
+
+def from_micros(micros: int) -> str:
+    """ISO text for to_micros' result, as datetime.isoformat() writes it"""
+    day, rest = divmod(micros, DAY_MICROS)
+    seconds, us = divmod(rest, 1_000_000)
+    minutes, second = divmod(seconds, 60)
+    hour, minute = divmod(minutes, 60)
+    if us:
+        return "%sT%02d:%02d:%02d.%06d" % (_day_text(day), hour, minute, second, us)
+    return "%sT%02d:%02d:%02d" % (_day_text(day), hour, minute, second)
+
+def status_code(status: str):
+    """Index of status in STATUSES; any other status is kept as its own string"""
+    code = _status_codes.get(status)
+    return sys.intern(status) if code is None else code
+
+def status_text(code) -> str:
+    return STATUSES[code] if type(code) is int else code
+
+def name_tuple(names) -> tuple:
+    names = tuple(sys.intern(name) for name in names)
+    shared = _name_tuples.get(names)
+    if shared is not None:
+        return shared
+    if len(_name_tuples) < NAME_TUPLES_CACHED:
+        _name_tuples[names] = names
+    return names
+
+class OrderRecord(Mapping):
+    """Resident form of one order
+
+    Emails, usernames and item names are interned, the date is held as epoch
+    microseconds, the status as its index in STATUSES, and the four amounts
+    plus the item quantities as one packed array of doubles. It reads like
+    the order dict (order["items"], order.get("total")) so listeners work
+    unchanged, and codec serializes it through to_dict().
+    """
+
+    __slots__ = ("order_id", "email", "username", "_date", "_status", "_names", "_values", "_extra")
+
+    def __init__(self, order_id, email, username, date, status, names, values, extra=None):
+        self.order_id = order_id
+        self.email = email
+        self.username = username
+        self._date = date
+        self._status = status
+        self._names = names
+        self._values = values
+        self._extra = extra
+
+    @classmethod
+    def from_dict(cls, order: dict) -> "OrderRecord":
+        when = order["date"]
+        try:
+            dt = datetime.fromisoformat(when)
+            # Keep the text when it would not come back byte-identical (offsets, odd precision).
+            if dt.tzinfo is None and dt.isoformat() == when:
+                when = datetime_micros(dt)
+        except (TypeError, ValueError):
+            pass
+        items = order["items"]
+        values = array("d", [NAN if order.get(name) is None else order[name] for name in AMOUNTS])
+        values.extend(map(float, items.values()))
+        extra = {k: order[k] for k in order.keys() - FIELDS} or None
+        return cls(order["order_id"], sys.intern(order["email"]), sys.intern(order["username"]),
+                   when, status_code(order["status"]), name_tuple(items), values, extra)
+
+    @property
+    def status(self) -> str:
+        return status_text(self._status)
+
+    @status.setter
+    def status(self, status: str):
+        self._status = status_code(status)
+
+    @property
+    def date(self) -> str:
+        return from_micros(self._date) if isinstance(self._date, int) else self._date
+
+    @property
+    def day(self) -> str:
+        """YYYY-MM-DD of the date, without building the full date text"""
+        return _day_text(self._date // DAY_MICROS) if isinstance(self._date, int) else str(self._date)[:10]
+
+    def lines(self):
+        """(item, quantity) pairs"""
+        return zip(self._names, self._values[len(AMOUNTS):])
+
+    def to_dict(self) -> dict:
+        """The public JSON shape"""
+        values = self._values
+        order = {"order_id": self.order_id, "email": self.email, "username": self.username,
+                 "items": dict(zip(self._names, values[4:]))}
+        subtotal, discount_amount, tax_amount, total = values[:4]
+        if subtotal == subtotal and discount_amount == discount_amount and tax_amount == tax_amount and total == total:
+            order["subtotal"] = subtotal
+            order["discount_amount"] = discount_amount
+            order["tax_amount"] = tax_amount
+            order["total"] = total
+        else:
+            for name, value in zip(AMOUNTS, values):
+                if value == value:
+                    order[name] = value
+        order["status"] = status_text(self._status)
+        order["date"] = from_micros(self._date) if type(self._date) is int else self._date
+        if self._extra:
+            order.update(self._extra)
+        return order
+
+    def __getitem__(self, key):
+        if key in ("order_id", "email", "username"):
+            return getattr(self, key)
+        if key == "status":
+            return status_text(self._status)
+        if key == "date":
+            return self.date
+        if key == "items":
+            return dict(self.lines())
+        if key in AMOUNTS:
+            value = self._values[AMOUNTS.index(key)]
+            if value == value:
+                return value
+        elif self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        yield from ("order_id", "email", "username", "items")
+        for name, value in zip(AMOUNTS, self._values):
+            if value == value:
+                yield name
+        yield from ("status", "date")
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"OrderRecord({self.to_dict()!r})"
+
+def deep_size(obj, seen=None) -> int:
+    """Bytes held by obj and everything it references, counting shared objects once"""
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        else:
+            for cls in type(o).__mro__:
+                for name in getattr(cls, "__slots__", ()):
+                    if hasattr(o, name):
+                        stack.append(getattr(o, name))
+    return total
+
+def memory_report(orders, sample=REPORT_SAMPLE) -> dict:
+    """Bytes per order as plain decoded dicts versus OrderRecords
+
+    Measured on an evenly spaced sample of up to `sample` orders and scaled
+    to the full count. The dict side is decoded from JSON the way stores
+    used to hold orders, so no strings are shared between orders.
+    """
+    orders = list(orders)
+    step = max(1, len(orders) // sample) if sample else 1
+    picked = orders[::step]
+    if not picked:
+        return {"orders": 0, "sampled": 0, "dict_bytes_per_order": 0, "record_bytes_per_order": 0,
+                "dict_mb": 0.0, "record_mb": 0.0, "ratio": None}
+    records = [o if isinstance(o, OrderRecord) else OrderRecord.from_dict(o) for o in picked]
+    dicts = codec.loads(codec.dumps(records))
+    # Only the per-order contents count, not the list holding them.
+    dict_bytes = deep_size(dicts) - sys.getsizeof(dicts)
+    record_bytes = deep_size(records) - sys.getsizeof(records)
+    per_dict = dict_bytes / len(picked)
+    per_record = record_bytes / len(picked)
+    return {
+        "orders": len(orders),
+        "sampled": len(picked),
+        "dict_bytes_per_order": round(per_dict),
+        "record_bytes_per_order": round(per_record),
+        "dict_mb": round(per_dict * len(orders) / 2**20, 1),
+        "record_mb": round(per_record * len(orders) / 2**20, 1),
+        "ratio": round(per_record / per_dict, 3)
+    }
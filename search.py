@@ -0,0 +1,155 @@
+import bisect
+import threading
+from collections import Counter
+
+SEARCH_LIMIT = 20
+MIN_SIMILARITY = 0.25
+CATALOG_PAGE_SIZE = 24
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def trigrams(text: str) -> set:
+    # Pad so short queries and word starts still produce grams to match on.
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class ProductIndex:
+    """Prefix and trigram index over product names, plus name-ordered catalog
+    lists (all products and per unit), kept current from products store notifications"""
+
+    def __init__(self, min_similarity=MIN_SIMILARITY):
+        self.min_similarity = min_similarity
+        self._lock = threading.Lock()
+        self._products = {}
+        self._grams = {}
+        self._words = []
+        self._names = []
+        self._by_unit = {}
+
+    def _entries(self, name):
+        key = normalize(name)
+        # The whole name is an entry too, so multi-word queries prefix-match.
+        words = [(word, name) for word in set(key.split()) | {key}]
+        return key, words
+
+    def _insert(self, name, data):
+        key, words = self._entries(name)
+        grams = trigrams(key)
+        self._products[name] = (key, len(grams), data)
+        for gram in grams:
+            self._grams.setdefault(gram, set()).add(name)
+        for entry in words:
+            bisect.insort(self._words, entry)
+        bisect.insort(self._names, name)
+        bisect.insort(self._by_unit.setdefault(data.get("unit"), []), name)
+
+    def _discard_sorted(self, names, name):
+        i = bisect.bisect_left(names, name)
+        if i < len(names) and names[i] == name:
+            del names[i]
+
+    def _remove(self, name):
+        key, words = self._entries(name)
+        unit = self._products.pop(name)[2].get("unit")
+        self._discard_sorted(self._names, name)
+        self._discard_sorted(self._by_unit[unit], name)
+        if not self._by_unit[unit]:
+            del self._by_unit[unit]
+        for gram in trigrams(key):
+            names = self._grams[gram]
+            names.discard(name)
+            if not names:
+                del self._grams[gram]
+        for entry in words:
+            self._discard_sorted(self._words, entry)
+
+    def reset(self, products):
+        with self._lock:
+            self._products = {}
+            self._grams = {}
+            self._words = []
+            self._by_unit = {}
+            for name, data in products:
+                key, words = self._entries(name)
+                grams = trigrams(key)
+                self._products[name] = (key, len(grams), data)
+                for gram in grams:
+                    self._grams.setdefault(gram, set()).add(name)
+                self._words.extend(words)
+                self._by_unit.setdefault(data.get("unit"), []).append(name)
+            self._words.sort()
+            self._names = sorted(self._products)
+            for names in self._by_unit.values():
+                names.sort()
+
+    def changed(self, name, old, new):
+        with self._lock:
+            if name in self._products:
+                if new is not None:
+                    # Price or unit changed; the name and its grams did not.
+                    key, size, old = self._products[name]
+                    self._products[name] = (key, size, new)
+                    if old.get("unit") != new.get("unit"):
+                        self._discard_sorted(self._by_unit[old.get("unit")], name)
+                        if not self._by_unit[old.get("unit")]:
+                            del self._by_unit[old.get("unit")]
+                        bisect.insort(self._by_unit.setdefault(new.get("unit"), []), name)
+                    return
+                self._remove(name)
+            elif new is not None:
+                self._insert(name, new)
+
+    def _prefix_matches(self, prefix):
+        i = bisect.bisect_left(self._words, (prefix,))
+        while i < len(self._words) and self._words[i][0].startswith(prefix):
+            yield self._words[i][1]
+            i += 1
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> list:
+        """Return up to limit {"name", "price", "unit"} dicts, best match first
+
+        Names starting with the query rank first, then names with a word
+        starting with it, then names containing it, then names that share
+        enough trigrams with it to be a likely typo.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        with self._lock:
+            scores = {}
+            for name in self._prefix_matches(query):
+                key = self._products[name][0]
+                scores[name] = 3.0 if key.startswith(query) else 2.0
+            grams = trigrams(query)
+            shared = Counter()
+            for gram in grams:
+                shared.update(self._grams.get(gram, ()))
+            for name, common in shared.items():
+                if name in scores:
+                    continue
+                key, size, _ = self._products[name]
+                if query in key:
+                    scores[name] = 1.0 + common / len(grams)
+                    continue
+                similarity = common / (len(grams) + size - common)
+                if similarity >= self.min_similarity:
+                    scores[name] = similarity
+            ranked = sorted(scores, key=lambda n: (-scores[n], len(n), n))[:limit]
+            return [{"name": name, **self._products[name][2]} for name in ranked]
+
+    def catalog(self, unit=None, min_price=None, max_price=None, offset=0, limit=CATALOG_PAGE_SIZE):
+        """One name-ordered page of {"name", "price", "unit"} dicts, the matching count and all units
+
+        Without a price range a page is sliced straight out of the name
+        (or per-unit) list; a price range has to check every candidate.
+        """
+        with self._lock:
+            names = self._names if unit is None else self._by_unit.get(unit, [])
+            if min_price is not None or max_price is not None:
+                low = float("-inf") if min_price is None else min_price
+                high = float("inf") if max_price is None else max_price
+                names = [n for n in names if low <= self._products[n][2]["price"] <= high]
+            page = [{"name": name, **self._products[name][2]} for name in names[offset:offset + limit]]
+            units = sorted(u for u in self._by_unit if u is not None)
+            return page, len(names), units
@@ -0,0 +1,560 @@
+import os
+import sqlite3
+from array import array
+import threading
+import time
+import codec
+from coordination import first_version
+from metrics import JSON_SECONDS, STORAGE_BYTES, STORAGE_SECONDS
+from store import CHECK_INTERVAL, ITER_CHUNK, GroupCommitter
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    email TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS products (
+    name TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS orders (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id TEXT NOT NULL UNIQUE,
+    email TEXT NOT NULL,
+    status TEXT NOT NULL,
+    date TEXT NOT NULL,
+    total REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_email ON orders (email, seq);
+CREATE INDEX IF NOT EXISTS orders_status ON orders (status, seq);
+CREATE INDEX IF NOT EXISTS orders_date ON orders (date);
+CREATE TABLE IF NOT EXISTS order_counts (
+    status TEXT PRIMARY KEY,
+    n INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS orders_count_insert AFTER INSERT ON orders BEGIN
+    INSERT INTO order_counts (status, n) VALUES (NEW.status, 1)
+        ON CONFLICT (status) DO UPDATE SET n = n + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS orders_count_delete AFTER DELETE ON orders BEGIN
+    UPDATE order_counts SET n = n - 1 WHERE status = OLD.status;
+END;
+CREATE TRIGGER IF NOT EXISTS orders_count_update AFTER UPDATE OF status ON orders
+WHEN OLD.status != NEW.status BEGIN
+    UPDATE order_counts SET n = n - 1 WHERE status = OLD.status;
+    INSERT INTO order_counts (status, n) VALUES (NEW.status, 1)
+        ON CONFLICT (status) DO UPDATE SET n = n + 1;
+END;
+CREATE TABLE IF NOT EXISTS record_changes (
+    tbl TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    old TEXT,
+    new TEXT
+);
+CREATE INDEX IF NOT EXISTS record_changes_version ON record_changes (tbl, version);
+CREATE TABLE IF NOT EXISTS order_changes (
+    version INTEGER NOT NULL,
+    order_id TEXT NOT NULL,
+    old_status TEXT,
+    new_status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS order_changes_version ON order_changes (version);
+"""
+
+# Versions kept in the change logs. A connection further behind than this
+# (or behind a write that was not logged, such as a bulk load or an archive
+# removal) reloads everything instead of replaying changes.
+CHANGE_LOG_VERSIONS = 10_000
+
+def fetch_json(store, cursor):
+    """Fetch rows whose last column is JSON and decode it, recording fetch and decode time"""
+    with STORAGE_SECONDS.time(store=store, op="load"):
+        rows = cursor.fetchall()
+    STORAGE_BYTES.inc(sum(len(row[-1]) for row in rows), store=store, op="load")
+    with JSON_SECONDS.time(store=store, op="decode"):
+        return [row[:-1] + (codec.loads(row[-1]),) for row in rows]
+
+class SqliteDatabase:
+    """SQLite file in WAL mode with one connection per thread"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            self._local.conn = conn
+        return conn
+
+    def version(self, conn, name):
+        row = conn.execute("SELECT version FROM versions WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, conn, name):
+        conn.execute("INSERT INTO versions (name, version) VALUES (?, ?) "
+                     "ON CONFLICT (name) DO UPDATE SET version = version + 1", (name, first_version()))
+        return self.version(conn, name)
+
+    def transaction(self, fn):
+        """Run fn(conn) inside BEGIN IMMEDIATE ... COMMIT"""
+        conn = self.connection()
+        with STORAGE_SECONDS.time(store=os.path.basename(self.path), op="save"):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        return result
+
+    def read(self, fn):
+        """Run fn(conn) inside one read transaction so all its queries see the same snapshot
+
+        Joins the transaction already open on this thread's connection, if any.
+        """
+        conn = self.connection()
+        if conn.in_transaction:
+            return fn(conn)
+        conn.execute("BEGIN")
+        try:
+            return fn(conn)
+        finally:
+            conn.execute("COMMIT")
+
+class OrderScan:
+    """Every stored order, oldest first, read afresh each time it is iterated
+
+    Handed to listeners on reset so each of them can make its own pass
+    without the whole table being held in memory.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def __iter__(self):
+        rows = self.db.connection().execute("SELECT data FROM orders ORDER BY seq")
+        return (codec.loads(data) for (data,) in rows)
+
+class SqliteTable:
+    """Key -> JSON record table with the same interface as store.JsonFile"""
+
+    def __init__(self, db, table, key, default=None, check_interval=CHECK_INTERVAL):
+        self.db = db
+        self.table = table
+        self.key = key
+        self.check_interval = check_interval
+        self.version = db.version(db.connection(), table)
+        self._lock = threading.Lock()
+        self._cache = None
+        self._checked_at = time.monotonic()
+        self._listeners = []
+        self._writer = GroupCommitter(self._commit_group)
+        if default is not None and self.version == 0:
+            # Same first-run behaviour as the JSON backend: seed defaults once.
+            self.batch([("add", k, v) for k, v in default().items()])
+
+    def _items(self):
+        rows = self.db.connection().execute(f"SELECT {self.key}, data FROM {self.table}")
+        return ((k, codec.loads(data)) for k, data in rows)
+
+    def subscribe(self, listener):
+        """Register an object with reset(items) and changed(key, old, new) hooks"""
+        with self._lock:
+            def reset(conn):
+                self._catch_up(conn)
+                self._listeners.append(listener)
+                listener.reset(self._items())
+
+            self.db.read(reset)
+
+    def _reset(self, version):
+        """Reload everything; runs inside the transaction that read version"""
+        self.version = version
+        self._cache = None
+        for listener in self._listeners:
+            listener.reset(self._items())
+
+    def _apply(self, version, changes):
+        self.version = version
+        if self._cache is not None:
+            cache = dict(self._cache)
+            for key, old, new in changes:
+                if new is None:
+                    cache.pop(key, None)
+                else:
+                    cache[key] = new
+            self._cache = cache
+        for key, old, new in changes:
+            for listener in self._listeners:
+                listener.changed(key, old, new)
+
+    def _catch_up(self, conn):
+        """Bring the cache and listeners up to the stored version; runs inside a transaction
+
+        Replays the changes other connections logged since this one last
+        looked, like OrderLog does with its journal tail, and reloads only
+        when the log does not cover every version in between.
+        """
+        version = self.db.version(conn, self.table)
+        if version == self.version:
+            return
+        rows = conn.execute("SELECT version, key, old, new FROM record_changes WHERE tbl = ? AND version > ? "
+                            "ORDER BY version, rowid", (self.table, self.version)).fetchall()
+        if len({row[0] for row in rows}) != version - self.version:
+            self._reset(version)
+            return
+        self._apply(version, [(key, codec.loads(old) if old is not None else None,
+                               codec.loads(new) if new is not None else None) for _, key, old, new in rows])
+
+    def _sync(self, force=False):
+        """Pick up writes made by other connections, at most once per check_interval"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        if self.db.version(self.db.connection(), self.table) != self.version:
+            self.db.read(self._catch_up)
+
+    def refresh(self):
+        with self._lock:
+            self._sync()
+
+    def current_version(self):
+        with self._lock:
+            self._sync()
+            return self.version
+
+    def get(self):
+        """Return every record as a dict; callers must treat it as read-only"""
+        with self._lock:
+            self._sync()
+            if self._cache is None:
+                def load(conn):
+                    self._catch_up(conn)
+                    cursor = conn.execute(f"SELECT {self.key}, data FROM {self.table}")
+                    self._cache = dict(fetch_json(self.table, cursor))
+
+                self.db.read(load)
+            return self._cache
+
+    def lookup(self, key):
+        row = self.db.connection().execute(
+            f"SELECT data FROM {self.table} WHERE {self.key} = ?", (key,)).fetchone()
+        return codec.loads(row[0]) if row else None
+
+    def batch(self, ops):
+        """Apply ("add" | "replace" | "delete", key, value) operations in one transaction"""
+        return self._writer.submit(ops)
+
+    async def batch_async(self, ops):
+        return await self._writer.submit_async(ops)
+
+    def _commit_group(self, jobs):
+        with self._lock:
+            def write(conn):
+                # Other connections' writes first, so ours apply on top of them.
+                self._catch_up(conn)
+                results = []
+                changes = []
+                logged = []
+                for ops in jobs:
+                    job_results = []
+                    for op, key, value in ops:
+                        row = conn.execute(f"SELECT data FROM {self.table} WHERE {self.key} = ?", (key,)).fetchone()
+                        if (op == "add") == (row is not None):
+                            job_results.append(False)
+                            continue
+                        text = None
+                        if op == "delete":
+                            conn.execute(f"DELETE FROM {self.table} WHERE {self.key} = ?", (key,))
+                        else:
+                            text = codec.dumps_text(value)
+                            conn.execute(f"INSERT OR REPLACE INTO {self.table} ({self.key}, data) VALUES (?, ?)",
+                                         (key, text))
+                        changes.append((key, codec.loads(row[0]) if row else None, value))
+                        logged.append((key, row[0] if row else None, text))
+                        job_results.append(True)
+                    results.append(job_results)
+                if not changes:
+                    return results, changes, self.version
+                version = self.db.bump(conn, self.table)
+                conn.executemany("INSERT INTO record_changes (tbl, version, key, old, new) VALUES (?, ?, ?, ?, ?)",
+                                 [(self.table, version) + entry for entry in logged])
+                conn.execute("DELETE FROM record_changes WHERE tbl = ? AND version <= ?",
+                             (self.table, version - CHANGE_LOG_VERSIONS))
+                return results, changes, version
+
+            results, changes, version = self.db.transaction(write)
+            if changes:
+                self._apply(version, changes)
+            return results
+
+    def add(self, key, value):
+        return self.batch([("add", key, value)])[0]
+
+    def replace(self, key, value):
+        return self.batch([("replace", key, value)])[0]
+
+    def delete(self, key):
+        return self.batch([("delete", key, None)])[0]
+
+class SqliteOrders:
+    """Orders table with the same interface as order_log.OrderLog
+
+    Positions used for paging are the table's autoincrement sequence.
+    """
+
+    def __init__(self, db, check_interval=CHECK_INTERVAL):
+        self.db = db
+        self.check_interval = check_interval
+        self.version = db.version(db.connection(), "orders")
+        self._lock = threading.Lock()
+        self._checked_at = time.monotonic()
+        self._listeners = []
+        self._writer = GroupCommitter(self._commit_group)
+
+    def _query(self, sql, params=()):
+        return [data for (data,) in fetch_json("orders", self.db.connection().execute(sql, params))]
+
+    def subscribe(self, listener):
+        """Register an object with reset(orders), order_added(order) and
+        status_changed(order, old_status) hooks"""
+        with self._lock:
+            def reset(conn):
+                self._catch_up(conn)
+                self._listeners.append(listener)
+                listener.reset(OrderScan(self.db))
+
+            self.db.read(reset)
+
+    def _reset(self, version):
+        """Reload every listener; runs inside the transaction that read version"""
+        self.version = version
+        for listener in self._listeners:
+            listener.reset(OrderScan(self.db))
+
+    def _apply(self, version, events):
+        self.version = version
+        for order, old_status in events:
+            for listener in self._listeners:
+                if old_status is None:
+                    listener.order_added(order)
+                else:
+                    listener.status_changed(order, old_status)
+
+    def _catch_up(self, conn):
+        """Bring listeners up to the stored version; runs inside a transaction
+
+        Replays order_changes since the version this connection last saw.
+        Each order is read as it is now, with the status it had at that
+        change, since nothing but the status is ever rewritten.
+        """
+        version = self.db.version(conn, "orders")
+        if version == self.version:
+            return
+        rows = conn.execute("SELECT c.version, c.old_status, c.new_status, o.data FROM order_changes c "
+                            "LEFT JOIN orders o ON o.order_id = c.order_id WHERE c.version > ? "
+                            "ORDER BY c.version, c.rowid", (self.version,)).fetchall()
+        if len({row[0] for row in rows}) != version - self.version or any(row[3] is None for row in rows):
+            self._reset(version)
+            return
+        events = []
+        for _, old_status, new_status, data in rows:
+            order = codec.loads(data)
+            order["status"] = new_status
+            events.append((order, old_status))
+        self._apply(version, events)
+
+    def _sync(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        if self.db.version(self.db.connection(), "orders") != self.version:
+            self.db.read(self._catch_up)
+
+    def refresh(self):
+        with self._lock:
+            self._sync()
+
+    def current_version(self):
+        with self._lock:
+            self._sync()
+            return self.version
+
+    def all(self):
+        return self._query("SELECT data FROM orders ORDER BY seq")
+
+    def get(self, order_id):
+        orders = self._query("SELECT data FROM orders WHERE order_id = ?", (order_id,))
+        return orders[0] if orders else None
+
+    def by_email(self, email):
+        return self._query("SELECT data FROM orders WHERE email = ? ORDER BY seq", (email,))
+
+    def by_status(self, status):
+        return self._query("SELECT data FROM orders WHERE status = ? ORDER BY seq", (status,))
+
+    def iter_orders(self, status=None, start=None, end=None, chunk=ITER_CHUNK):
+        """Yield orders oldest first, one query per chunk
+
+        start and end are inclusive YYYY-MM-DD days. Each chunk is a fresh
+        query on the calling thread's connection, so the generator can be
+        resumed from any thread (as streaming responses do).
+        """
+        where = "status = ?" if status is not None else "1"
+        params = (status,) if status is not None else ()
+        if start is None and end is None:
+            last = -1
+            while True:
+                rows = self.db.connection().execute(
+                    f"SELECT seq, data FROM orders WHERE {where} AND seq > ? ORDER BY seq LIMIT ?",
+                    params + (last, chunk)).fetchall()
+                if not rows:
+                    return
+                last = rows[-1][0]
+                for _, data in rows:
+                    yield codec.loads(data)
+        if start is not None:
+            where += " AND date >= ?"
+            params += (start,)
+        if end is not None:
+            # Sorts after any date text on the end day, whatever follows the day.
+            where += " AND date < ?"
+            params += (end + "\U0010ffff",)
+        # Find the range on the orders_date index first, then read the orders
+        # a chunk of positions at a time instead of scanning the whole table.
+        seqs = array("q", (seq for seq, in self.db.connection().execute(
+            f"SELECT seq FROM orders WHERE {where} ORDER BY seq", params)))
+        for i in range(0, len(seqs), chunk):
+            batch = seqs[i:i + chunk]
+            rows = self.db.connection().execute(
+                f"SELECT data FROM orders WHERE seq IN ({', '.join('?' * len(batch))}) AND {where} ORDER BY seq",
+                (*batch, *params)).fetchall()
+            for data, in rows:
+                yield codec.loads(data)
+
+    def page(self, status=None, limit=20, before=None, after=None):
+        """Return (orders newest first, total, older, newer) like OrderLog.page"""
+        conn = self.db.connection()
+        where = "status = ?" if status is not None else "1"
+        params = (status,) if status is not None else ()
+        if after is not None:
+            rows = conn.execute(f"SELECT seq, data FROM orders WHERE {where} AND seq > ? ORDER BY seq LIMIT ?",
+                                params + (after, limit)).fetchall()[::-1]
+        else:
+            bound = before if before is not None else -1
+            rows = conn.execute(f"SELECT seq, data FROM orders WHERE {where} AND (? < 0 OR seq < ?) "
+                                "ORDER BY seq DESC LIMIT ?", params + (bound, bound, limit)).fetchall()
+        if status is not None:
+            total = conn.execute("SELECT n FROM order_counts WHERE status = ?", (status,)).fetchone()
+        else:
+            total = conn.execute("SELECT SUM(n) FROM order_counts").fetchone()
+        total = (total[0] if total else 0) or 0
+        older = newer = None
+        if rows:
+            oldest, newest = rows[-1][0], rows[0][0]
+            if conn.execute(f"SELECT 1 FROM orders WHERE {where} AND seq < ? LIMIT 1", params + (oldest,)).fetchone():
+                older = oldest
+            if conn.execute(f"SELECT 1 FROM orders WHERE {where} AND seq > ? LIMIT 1", params + (newest,)).fetchone():
+                newer = newest
+        return [codec.loads(data) for _, data in rows], total, older, newer
+
+    def append_order(self, order):
+        return self._writer.submit([{"op": "create", "order": order}])[0]
+
+    def set_status(self, order_id, status):
+        return self.set_statuses([(order_id, status)])[0]
+
+    def set_statuses(self, updates):
+        return self._writer.submit([{"op": "status", "order_id": order_id, "status": status}
+                                    for order_id, status in updates])
+
+    async def append_order_async(self, order):
+        return (await self._writer.submit_async([{"op": "create", "order": order}]))[0]
+
+    async def set_statuses_async(self, updates):
+        return await self._writer.submit_async([{"op": "status", "order_id": order_id, "status": status}
+                                                for order_id, status in updates])
+
+    def compact(self):
+        """Nothing to fold; kept for interface parity with OrderLog"""
+
+    def remove(self, order_ids):
+        """Delete orders (e.g. once archived); returns how many were removed"""
+        order_ids = list(order_ids)
+        with self._lock:
+            def delete(conn):
+                removed = 0
+                for i in range(0, len(order_ids), 500):
+                    chunk = order_ids[i:i + 500]
+                    removed += conn.execute(f"DELETE FROM orders WHERE order_id IN ({','.join('?' * len(chunk))})",
+                                            chunk).rowcount
+                if removed:
+                    self.db.bump(conn, "orders")
+                return removed
+
+            removed = self.db.transaction(delete)
+            if removed:
+                # Deletes are not logged, so this reloads like every other connection will.
+                self.db.read(self._catch_up)
+            return removed
+
+    def _commit_group(self, jobs):
+        with self._lock:
+            def write(conn):
+                self._catch_up(conn)
+                results = []
+                events = []
+                for records in jobs:
+                    job_results = []
+                    for record in records:
+                        if record["op"] == "create":
+                            order = record["order"]
+                            cur = conn.execute(
+                                "INSERT OR IGNORE INTO orders (order_id, email, status, date, total, data) "
+                                "VALUES (?, ?, ?, ?, ?, ?)",
+                                (order["order_id"], order["email"], order["status"], order["date"],
+                                 order["total"], codec.dumps_text(order)))
+                            ok = cur.rowcount == 1
+                            if ok:
+                                events.append((order, None))
+                        else:
+                            row = conn.execute("SELECT data FROM orders WHERE order_id = ?",
+                                               (record["order_id"],)).fetchone()
+                            ok = row is not None
+                            if ok:
+                                order = codec.loads(row[0])
+                                old_status = order["status"]
+                                order["status"] = record["status"]
+                                conn.execute("UPDATE orders SET status = ?, data = ? WHERE order_id = ?",
+                                             (order["status"], codec.dumps_text(order), order["order_id"]))
+                                events.append((order, old_status))
+                        job_results.append(ok)
+                    results.append(job_results)
+                if not events:
+                    return results, events, self.version
+                version = self.db.bump(conn, "orders")
+                conn.executemany("INSERT INTO order_changes (version, order_id, old_status, new_status) "
+                                 "VALUES (?, ?, ?, ?)",
+                                 [(version, order["order_id"], old_status, order["status"])
+                                  for order, old_status in events])
+                conn.execute("DELETE FROM order_changes WHERE version <= ?", (version - CHANGE_LOG_VERSIONS,))
+                return results, events, version
+
+            results, events, version = self.db.transaction(write)
+            if events:
+                self._apply(version, events)
+            return results
@@ -0,0 +1,99 @@
+import threading
+from collections import Counter, deque
+from records import EXCLUDED_STATUSES
+
+RECENT_ORDERS = 5
+
+class UserStats:
+    """User counts by role, kept current from users store notifications"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_role = Counter()
+
+    def reset(self, users):
+        with self._lock:
+            self.by_role = Counter(u.get("role", "user") for _, u in users)
+
+    def changed(self, email, old, new):
+        with self._lock:
+            if old is not None:
+                self.by_role[old.get("role", "user")] -= 1
+            if new is not None:
+                self.by_role[new.get("role", "user")] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {role: n for role, n in self.by_role.items() if n}
+
+class ProductStats:
+    """Product count, kept current from products store notifications"""
+
+    def __init__(self):
+        self.count = 0
+
+    def reset(self, products):
+        self.count = sum(1 for _ in products)
+
+    def changed(self, name, old, new):
+        self.count += (new is not None) - (old is not None)
+
+class OrderStats:
+    """Order counts by status, revenue and the most recent orders
+
+    Revenue leaves out EXCLUDED_STATUSES, the same as the analytics rollups.
+    """
+
+    def __init__(self, recent=RECENT_ORDERS):
+        self._lock = threading.Lock()
+        self.by_status = Counter()
+        self.revenue = 0.0
+        self.recent = deque(maxlen=recent)
+
+    def reset(self, orders, archive=None):
+        # orders may be a one-shot iterator over a large table, so walk it once.
+        by_status = Counter()
+        revenue = 0.0
+        recent = deque(maxlen=self.recent.maxlen)
+        if archive is not None and archive.rows:
+            statuses = archive.dictionary("status")
+            for code, n in Counter(archive.column("status")).items():
+                by_status[statuses[code]] += n
+            excluded = {code for code, status in enumerate(statuses) if status in EXCLUDED_STATUSES}
+            revenue += sum(total for status, total in archive.scan("status", "total") if status not in excluded)
+            recent.extend(archive.orders(range(max(archive.rows - recent.maxlen, 0), archive.rows)))
+        for order in orders:
+            by_status[order["status"]] += 1
+            if order["status"] not in EXCLUDED_STATUSES:
+                revenue += order.get("total", 0)
+            recent.append(order)
+        with self._lock:
+            self.by_status = by_status
+            self.revenue = revenue
+            self.recent = recent
+
+    def order_added(self, order):
+        with self._lock:
+            self.by_status[order["status"]] += 1
+            if order["status"] not in EXCLUDED_STATUSES:
+                self.revenue += order.get("total", 0)
+            self.recent.append(order)
+
+    def status_changed(self, order, old_status):
+        with self._lock:
+            self.by_status[old_status] -= 1
+            self.by_status[order["status"]] += 1
+            was, now = old_status not in EXCLUDED_STATUSES, order["status"] not in EXCLUDED_STATUSES
+            self.revenue += (now - was) * order.get("total", 0)
+            ids = [o["order_id"] for o in self.recent]
+            if order["order_id"] in ids:
+                self.recent[ids.index(order["order_id"])] = order
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "total": sum(self.by_status.values()),
+                "by_status": {status: n for status, n in self.by_status.items() if n},
+                "revenue": round(self.revenue, 2),
+                "recent": [dict(o) for o in reversed(self.recent)]
+            }
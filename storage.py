@@ -0,0 +1,232 @@
+import argparse
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, Optional, Protocol
+import codec
+from archive import ARCHIVE_DIR, ArchivedOrders, OrderArchive
+from order_log import OrderLog
+from records import REPORT_SAMPLE, memory_report
+from sqlite_store import SqliteDatabase, SqliteOrders, SqliteTable
+from store import JsonFile, atomic_write_json
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "grocery.db")
+USERS_FILE = "users.json"
+PRODUCTS_FILE = "products.json"
+ORDERS_FILE = "orders.json"
+ORDERS_JOURNAL_FILE = "orders.journal"
+ORDERS_ARCHIVE_DIR = os.getenv("ORDERS_ARCHIVE_DIR", ARCHIVE_DIR)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 90))
+
+def default_products():
+    return {
+        "apple": {"price": 100, "unit": "kg"},
+        "banana": {"price": 50, "unit": "dozen"},
+        "milk": {"price": 120, "unit": "litre"},
+        "bread": {"price": 80, "unit": "loaf"},
+        "egg": {"price": 15, "unit": "piece"},
+        "orange": {"price": 60, "unit": "kg"},
+        "mango": {"price": 150, "unit": "kg"},
+        "potato": {"price": 30, "unit": "kg"},
+        "tomato": {"price": 40, "unit": "kg"},
+        "onion": {"price": 25, "unit": "kg"},
+        "carrot": {"price": 50, "unit": "kg"},
+        "cucumber": {"price": 20, "unit": "kg"},
+        "spinach": {"price": 30, "unit": "kg"},
+        "cauliflower": {"price": 40, "unit": "piece"},
+        "broccoli": {"price": 60, "unit": "kg"},
+        "juice": {"price": 150, "unit": "litre"},
+        "biscuits": {"price": 80, "unit": "packet"},
+        "chips": {"price": 50, "unit": "packet"},
+        "soap": {"price": 60, "unit": "piece"},
+        "shampoo": {"price": 200, "unit": "bottle"},
+        "detergent": {"price": 120, "unit": "kg"},
+        "toothpaste": {"price": 90, "unit": "tube"},
+        "oil": {"price": 200, "unit": "litre"},
+        "salt": {"price": 20, "unit": "kg"},
+        "sugar": {"price": 60, "unit": "kg"},
+        "tea": {"price": 200, "unit": "packet"},
+        "coffee": {"price": 300, "unit": "packet"},
+        "butter": {"price": 250, "unit": "pack"},
+        "cheese": {"price": 400, "unit": "kg"},
+        "yogurt": {"price": 100, "unit": "litre"},
+        "chicken": {"price": 300, "unit": "kg"},
+        "fish": {"price": 500, "unit": "kg"},
+        "rice": {"price": 80, "unit": "kg"},
+        "wheat": {"price": 45, "unit": "kg"},
+        "pasta": {"price": 100, "unit": "packet"},
+        "noodles": {"price": 70, "unit": "packet"},
+        "jam": {"price": 150, "unit": "jar"},
+        "honey": {"price": 300, "unit": "jar"},
+        "cereal": {"price": 200, "unit": "box"},
+        "chocolate": {"price": 100, "unit": "bar"}
+    }
+
+class KeyValueRepository(Protocol):
+    """Users (keyed by email) and products (keyed by name)"""
+
+    version: int
+
+    def get(self) -> dict:
+        """Every record; callers must treat the dict as read-only"""
+
+    def lookup(self, key: str) -> Optional[dict]: ...
+
+    def batch(self, ops: list) -> list:
+        """Apply ("add" | "replace" | "delete", key, value) ops, one bool each"""
+
+    async def batch_async(self, ops: list) -> list:
+        """batch() that awaits the commit instead of blocking a thread"""
+
+    def add(self, key: str, value: dict) -> bool: ...
+
+    def replace(self, key: str, value: dict) -> bool: ...
+
+    def delete(self, key: str) -> bool: ...
+
+    def refresh(self) -> None: ...
+
+    def current_version(self) -> int: ...
+
+    def subscribe(self, listener) -> None:
+        """listener gets reset(items) on (re)load and changed(key, old, new) per write"""
+
+class OrderRepository(Protocol):
+    """Orders in insertion order, addressed by order_id or by position"""
+
+    version: int
+
+    def all(self) -> list: ...
+
+    def get(self, order_id: str) -> Optional[dict]: ...
+
+    def by_email(self, email: str) -> list: ...
+
+    def by_status(self, status: str) -> list: ...
+
+    def iter_orders(self, status: Optional[str] = None, start: Optional[str] = None,
+                    end: Optional[str] = None) -> Iterator[dict]:
+        """Every order (or every order in status, dated from start to end, inclusive
+        YYYY-MM-DD days), oldest first, without building a list"""
+
+    def page(self, status: Optional[str] = None, limit: int = 20,
+             before: Optional[int] = None, after: Optional[int] = None) -> tuple: ...
+
+    def append_order(self, order: dict) -> bool: ...
+
+    def set_status(self, order_id: str, status: str) -> bool: ...
+
+    def set_statuses(self, updates: Iterable) -> list: ...
+
+    async def append_order_async(self, order: dict) -> bool: ...
+
+    async def set_statuses_async(self, updates: Iterable) -> list: ...
+
+    def compact(self) -> None: ...
+
+    def remove(self, order_ids: Iterable) -> int: ...
+
+    def refresh(self) -> None: ...
+
+    def current_version(self) -> int: ...
+
+    def subscribe(self, listener) -> None:
+        """listener gets reset(orders, archive), order_added(order) and status_changed(order, old_status)"""
+
+    def replay(self, listener) -> None:
+        """Call listener.reset() again with every stored order"""
+
+class Storage:
+    def __init__(self, users: KeyValueRepository, products: KeyValueRepository, orders: OrderRepository):
+        self.users = users
+        self.products = products
+        self.orders = orders
+
+def open_json_storage():
+    return Storage(
+        JsonFile(USERS_FILE),
+        JsonFile(PRODUCTS_FILE, default_products, save_default=True),
+        ArchivedOrders(OrderLog(ORDERS_FILE, ORDERS_JOURNAL_FILE), OrderArchive(ORDERS_ARCHIVE_DIR))
+    )
+
+def open_sqlite_storage(path=SQLITE_PATH):
+    db = SqliteDatabase(path)
+    return Storage(
+        SqliteTable(db, "users", "email"),
+        SqliteTable(db, "products", "name", default=default_products),
+        ArchivedOrders(SqliteOrders(db), OrderArchive(ORDERS_ARCHIVE_DIR))
+    )
+
+def open_storage(backend=STORAGE_BACKEND):
+    """Open the backend named by STORAGE_BACKEND ("json" or "sqlite")"""
+    if backend == "json":
+        return open_json_storage()
+    if backend == "sqlite":
+        return open_sqlite_storage()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+def migrate_json_to_sqlite(path=SQLITE_PATH):
+    """Import users.json, products.json and the order snapshot + journal into SQLite
+
+    Records that already exist in the database are left alone, so the
+    migration can be re-run safely.
+    """
+    source = open_json_storage()
+    db = SqliteDatabase(path)
+
+    def copy(conn):
+        users = source.users.get()
+        conn.executemany("INSERT OR IGNORE INTO users (email, data) VALUES (?, ?)",
+                         ((email, codec.dumps_text(u)) for email, u in users.items()))
+        products = source.products.get()
+        conn.executemany("INSERT OR IGNORE INTO products (name, data) VALUES (?, ?)",
+                         ((name, codec.dumps_text(p)) for name, p in products.items()))
+        # Archived orders stay in the archive, which both backends share.
+        orders = source.orders.live.all()
+        conn.executemany(
+            "INSERT OR IGNORE INTO orders (order_id, email, status, date, total, data) VALUES (?, ?, ?, ?, ?, ?)",
+            ((o["order_id"], o["email"], o["status"], o["date"], o["total"], codec.dumps_text(o)) for o in orders))
+        for name in ("users", "products", "orders"):
+            db.bump(conn, name)
+        return len(users), len(products), len(orders)
+
+    return db.transaction(copy)
+
+def export_pretty(directory, backend=STORAGE_BACKEND):
+    """Write indented users.json, products.json and orders.json into directory for people to read"""
+    source = open_storage(backend)
+    os.makedirs(directory, exist_ok=True)
+    data = {USERS_FILE: source.users.get(), PRODUCTS_FILE: source.products.get(), ORDERS_FILE: source.orders.all()}
+    for name, records in data.items():
+        atomic_write_json(os.path.join(directory, name), records, pretty=True)
+    return {name: len(records) for name, records in data.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Grocery store storage tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="import the JSON files into an SQLite database")
+    migrate.add_argument("--db", default=SQLITE_PATH, help="SQLite file to create or update")
+    archive = sub.add_parser("archive", help="move old delivered and cancelled orders into the columnar archive")
+    archive.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="archive closed orders older than this")
+    export = sub.add_parser("export", help="write an indented, human-readable copy of all data")
+    export.add_argument("--out", default="export", help="directory to write the JSON files to")
+    memory = sub.add_parser("memory", help="report bytes per order held as dicts versus compact records")
+    memory.add_argument("--sample", type=int, default=REPORT_SAMPLE, help="orders to measure (0 for all)")
+    args = parser.parse_args()
+    if args.command == "migrate":
+        users, products, orders = migrate_json_to_sqlite(args.db)
+        print(f"Imported {users} users, {products} products and {orders} orders into {args.db}")
+    elif args.command == "archive":
+        moved = open_storage().orders.archive_closed(datetime.now() - timedelta(days=args.days))
+        print(f"Archived {moved} closed orders older than {args.days} days into {ORDERS_ARCHIVE_DIR}/")
+    elif args.command == "export":
+        counts = export_pretty(args.out)
+        print(f"Exported {', '.join(f'{n} records to {name}' for name, n in counts.items())} in {args.out}/")
+    elif args.command == "memory":
+        report = memory_report(open_storage().orders.live.all(), args.sample)
+        print(f"{report['orders']} live orders, measured on {report['sampled']}:")
+        print(f"  dicts:   {report['dict_bytes_per_order']} bytes/order, {report['dict_mb']} MB")
+        print(f"  records: {report['record_bytes_per_order']} bytes/order, {report['record_mb']} MB")
+
+if __name__ == "__main__":
+    main()
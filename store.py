@@ -0,0 +1,263 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import codec
+from coordination import SharedVersion
+from metrics import JSON_SECONDS, STORAGE_BYTES, STORAGE_SECONDS
+
+CHECK_INTERVAL = 1.0
+GROUP_COMMIT_WINDOW = 0.002
+MAX_GROUP_SIZE = 256
+# Orders handed out per lock acquisition (or query) when streaming a whole store.
+ITER_CHUNK = 1000
+
+def file_stamp(path):
+    """Return an (mtime, size) stamp for path, or None if it does not exist"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def fsync_dir(path):
+    """Make a rename in path's directory durable (no-op where unsupported)"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def read_json(path):
+    """Load a JSON file, recording read and decode time separately"""
+    name = os.path.basename(path)
+    with STORAGE_SECONDS.time(store=name, op="load"):
+        with open(path, "rb") as f:
+            raw = f.read()
+    STORAGE_BYTES.inc(len(raw), store=name, op="load")
+    with JSON_SECONDS.time(store=name, op="decode"):
+        return codec.loads(raw)
+
+def atomic_write_json(path, data, pretty=False):
+    """Replace path with data so a crash leaves either the old or the new file
+
+    Files are written compact; pretty=True is for copies meant for people.
+    """
+    name = os.path.basename(path)
+    with JSON_SECONDS.time(store=name, op="encode"):
+        raw = codec.dumps_pretty(data) if pretty else codec.dumps(data)
+    tmp_path = f"{path}.tmp"
+    with STORAGE_SECONDS.time(store=name, op="save"):
+        with open(tmp_path, "wb") as f:
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        fsync_dir(path)
+    STORAGE_BYTES.inc(len(raw), store=name, op="save")
+
+class GroupCommitter:
+    """Funnels mutations through one writer thread and flushes them in groups
+
+    Jobs that arrive within `window` seconds of the first one, or while the
+    previous group is still being written, are handed to `commit` together
+    so one fsync covers all of them.
+    """
+
+    def __init__(self, commit, window=GROUP_COMMIT_WINDOW, max_group=MAX_GROUP_SIZE):
+        self.commit = commit
+        self.window = window
+        self.max_group = max_group
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+
+    def enqueue(self, job):
+        """Queue job; the returned Future resolves once the group containing it is durable"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((job, future))
+        return future
+
+    def submit(self, job):
+        """Queue job and block until the group containing it is durable"""
+        return self.enqueue(job).result()
+
+    async def submit_async(self, job):
+        """submit() for event-loop callers: waits for the commit without holding a thread"""
+        return await asyncio.wrap_future(self.enqueue(job))
+
+    def _run(self):
+        while True:
+            group = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(group) < self.max_group:
+                try:
+                    group.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            try:
+                results = self.commit([job for job, _ in group])
+            except BaseException as e:
+                for _, future in group:
+                    future.set_exception(e)
+            else:
+                for (_, future), result in zip(group, results):
+                    future.set_result(result)
+
+class JsonFile:
+    """Parsed copy of a JSON object file, reloaded only when the file changes on disk
+
+    Processes sharing the file (API workers, the storage command) coordinate
+    through a SharedVersion next to it: writes hold its lock and bump it,
+    and everyone else reloads as soon as it moves.
+    """
+
+    def __init__(self, path, default=dict, save_default=False, check_interval=CHECK_INTERVAL):
+        self.path = path
+        self.default = default
+        self.save_default = save_default
+        self.check_interval = check_interval
+        self.version = 0
+        self.shared_version = SharedVersion(f"{path}.version")
+        self._lock = threading.Lock()
+        self._data = None
+        self._stamp = None
+        self._checked_at = 0.0
+        self._listeners = []
+        self._writer = GroupCommitter(self._commit_group)
+
+    def subscribe(self, listener):
+        """Register an object with reset(items) and changed(key, old, new) hooks"""
+        with self._lock:
+            self._listeners.append(listener)
+            if self._data is not None:
+                listener.reset(self._data.items())
+
+    def _refresh(self, force=False):
+        now = time.monotonic()
+        shared = self.shared_version
+        if self._data is not None and shared.value() == self.version:
+            if not force and now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            if file_stamp(self.path) == self._stamp:
+                return
+        self._checked_at = now
+        with shared.lock(shared=True):
+            version = shared.value()
+            stamp = file_stamp(self.path)
+            if version == self.version and stamp == self._stamp:
+                return
+            if version != self.version and not (stamp is None and self.save_default):
+                # Another process committed (or this is the first load).
+                self._reload(version, stamp)
+                return
+        # The file changed without a commit (edited by hand) or the default
+        # is not saved yet: take a new version so every process reloads.
+        with shared.lock():
+            if self.save_default and file_stamp(self.path) is None:
+                atomic_write_json(self.path, self.default())
+                shared.bump()
+            elif shared.value() == self.version:
+                shared.bump()
+            self._reload(shared.value(), file_stamp(self.path))
+
+    def _reload(self, version, stamp):
+        self._data = self.default() if stamp is None else read_json(self.path)
+        self._stamp = stamp
+        self.version = version
+        for listener in self._listeners:
+            listener.reset(self._data.items())
+
+    def _write(self, data):
+        atomic_write_json(self.path, data)
+        self._stamp = file_stamp(self.path)
+
+    def refresh(self):
+        with self._lock:
+            self._refresh()
+
+    def current_version(self):
+        """Return the version after picking up any change on disk"""
+        with self._lock:
+            self._refresh()
+            return self.version
+
+    def get(self):
+        """Return the cached data; callers must treat it as read-only"""
+        # Writers swap in a new dict rather than mutating this one, so a fresh
+        # enough copy can be handed out without waiting on a flush in progress.
+        data = self._data
+        if (data is not None and self.shared_version.value() == self.version
+                and time.monotonic() - self._checked_at < self.check_interval):
+            return data
+        with self._lock:
+            self._refresh()
+            return self._data
+
+    def lookup(self, key):
+        return self.get().get(key)
+
+    def batch(self, ops):
+        """Apply ("add" | "replace" | "delete", key, value) operations durably
+
+        Returns one bool per operation: add fails if the key exists, replace
+        and delete fail if it does not. Failed operations are skipped and the
+        rest are still applied. Concurrent batches are written together.
+        """
+        return self._writer.submit(ops)
+
+    async def batch_async(self, ops):
+        return await self._writer.submit_async(ops)
+
+    def _commit_group(self, jobs):
+        with self._lock, self.shared_version.lock():
+            self._refresh(force=True)
+            data = dict(self._data)
+            results = []
+            changes = []
+            for ops in jobs:
+                job_results = []
+                for op, key, value in ops:
+                    exists = key in data
+                    if (op == "add") == exists:
+                        job_results.append(False)
+                        continue
+                    old = data.get(key)
+                    if op == "delete":
+                        del data[key]
+                    else:
+                        data[key] = value
+                    changes.append((key, old, value))
+                    job_results.append(True)
+                results.append(job_results)
+            if changes:
+                # Readers hold references to the previous dict, so writers
+                # always swap in a new one instead of mutating the shared copy.
+                self._write(data)
+                self._data = data
+                self.version = self.shared_version.bump()
+                for key, old, new in changes:
+                    for listener in self._listeners:
+                        listener.changed(key, old, new)
+            return results
+
+    def add(self, key, value):
+        return self.batch([("add", key, value)])[0]
+
+    def replace(self, key, value):
+        return self.batch([("replace", key, value)])[0]
+
+    def delete(self, key):
+        return self.batch([("delete", key, None)])[0]
@@ -0,0 +1,42 @@
+import importlib
+import os
+import sys
+import pytest
+
+# Cheap hashes and one hashing process keep API tests fast.
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("HASH_WORKERS", "1")
+
+def load_api(backend):
+    """Import a fresh api module whose storage lives in the current directory"""
+    os.environ["STORAGE_BACKEND"] = backend
+    os.environ["SQLITE_PATH"] = "grocery.db"
+    for name in ("api", "storage"):
+        sys.modules.pop(name, None)
+    return importlib.import_module("api")
+
+@pytest.fixture(params=["json", "sqlite"])
+def backend(request):
+    return request.param
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def api(data_dir, backend):
+    from fastapi.testclient import TestClient
+    module = load_api(backend)
+    module.client = TestClient(module.app)
+    yield module
+    module.password_pool.shutdown()
+    sys.modules.pop("api", None)
+
+@pytest.fixture
+def client(api):
+    return api.client
+
+def make_order(order_id, email="ann@example.com", items=None, status="pending", date="2024-03-01T10:00:00", total=100.0):
+    return {"order_id": order_id, "email": email, "username": email.split("@")[0], "items": items or {"apple": 1.0},
+            "subtotal": total, "discount_amount": 0.0, "tax_amount": 0.0, "total": total, "status": status, "date": date}
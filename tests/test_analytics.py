@@ -0,0 +1,64 @@
+import random
+from conftest import make_order
+import storage
+from analytics import CUSTOMER_SORTS, CustomerLedger, SalesRollups, bucket_keys
+from stats import OrderStats
+
+def test_bucket_keys_week_starts_monday():
+    assert bucket_keys("2024-03-06") == ("2024-03-06", "2024-03-04", "2024-03")
+
+def test_rollups_follow_status_changes():
+    rollups = SalesRollups()
+    rollups.reset([make_order("R1", total=50.0, items={"apple": 2.0}), make_order("R2", total=30.0, status="cancelled")])
+    assert rollups.revenue_series("day") == [{"bucket": "2024-03-01", "orders": 1, "revenue": 50.0}]
+    order = make_order("R1", total=50.0, items={"apple": 2.0}, status="cancelled")
+    rollups.status_changed(order, "pending")
+    assert rollups.revenue_series("day") == []
+    assert rollups.top_products() == []
+    assert rollups.status_funnel()["other"] == {"cancelled": 2}
+
+def test_every_listener_sees_orders_written_by_another_process(data_dir):
+    # Two storages on one database stand in for two API workers.
+    worker = storage.open_sqlite_storage("grocery.db")
+    other = storage.open_sqlite_storage("grocery.db")
+    stats, rollups = OrderStats(), SalesRollups()
+    worker.orders.subscribe(stats)
+    worker.orders.subscribe(rollups)
+    other.orders.append_order(make_order("W1", total=40.0))
+    worker.orders.live.check_interval = 0
+    worker.orders.refresh()
+    assert stats.snapshot()["total"] == 1
+    assert rollups.status_funnel()["total"] == 1
+    assert rollups.revenue_series("month") == [{"bucket": "2024-03", "orders": 1, "revenue": 40.0}]
+
+def brute_force_summary(ledger, users, sort, descending, offset, limit):
+    rows = []
+    for email, user in sorted(users.items()):
+        if user.get("role", "user") != "user":
+            continue
+        n, spend, last_order, _ = ledger.customers.get(email) or (0, 0.0, "", {})
+        rows.append((email, {"spend": round(spend, 2), "orders": n, "last_order": last_order,
+                             "username": user["username"], "email": email}[sort]))
+    rows.sort(key=lambda r: r[1], reverse=descending)
+    return [email for email, _ in rows[offset:offset + limit]]
+
+def test_customer_pages_match_a_full_sort_and_follow_changes():
+    rng = random.Random(3)
+    users = {f"u{i:03d}@example.com": {"username": f"n{rng.randint(0, 40)}", "role": rng.choice(["user"] * 5 + ["admin"])}
+             for i in range(300)}
+    emails = list(users)
+    ledger = CustomerLedger()
+    ledger.reset([make_order(f"O{i}", email=rng.choice(emails), total=rng.choice([10.0, 20.0]),
+                             date=f"2024-03-{rng.randint(10, 28)}T10:00:00") for i in range(500)])
+    for step in range(4):
+        for sort in CUSTOMER_SORTS:
+            for descending in (True, False):
+                for offset, limit in ((0, 10), (5, 10), (100, 200), (240, 50)):
+                    page, total = ledger.summary(users, sort, descending, offset, limit)
+                    assert [row["email"] for row in page] == brute_force_summary(ledger, users, sort, descending,
+                                                                                 offset, limit)
+                    assert total == sum(u["role"] == "user" for u in users.values())
+        if step % 2 == 0:
+            ledger.order_added(make_order(f"N{step}", email=emails[step], total=1000.0, date="2024-04-01T10:00:00"))
+        else:
+            users = dict(users, **{f"new{step}@example.com": {"username": "zz", "role": "user"}})
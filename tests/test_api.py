@@ -0,0 +1,56 @@
+import asyncio
+import pytest
+from conftest import make_order
+
+@pytest.fixture
+def accept_emails(api, monkeypatch):
+    # Deliverability checks need DNS, which tests cannot count on.
+    monkeypatch.setattr(api, "validate_email_format", lambda email: True)
+
+def on_event_loop():
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+def test_user_lookups_run_off_the_event_loop(api, client, accept_emails, monkeypatch):
+    lookup = api.users_store.lookup
+    seen = []
+
+    def spy(email):
+        seen.append(on_event_loop())
+        return lookup(email)
+
+    monkeypatch.setattr(api.users_store, "lookup", spy)
+    user = {"username": "ann", "email": "ann@example.com", "password": "secret"}
+    assert client.post("/users", json=user).json() == {"success": True}
+    assert client.post("/users", json=user).status_code == 400
+    assert client.post("/login", json={"email": "ann@example.com", "password": "secret"}).status_code == 200
+    assert client.post("/login", json={"email": "ann@example.com", "password": "wrong"}).status_code == 400
+    assert seen == [False] * 4
+
+def test_create_order_prices_and_rejects_duplicates(client):
+    order = {"order_id": "O1", "email": "ann@example.com", "username": "ann", "items": {"apple": 2},
+             "date": "2024-03-01T10:00:00"}
+    assert client.post("/orders", json=order).json() == {"success": True}
+    assert client.post("/orders", json=order).status_code == 400
+    assert client.post("/orders", json=dict(order, order_id="O2", items={"durian": 1})).status_code == 400
+
+def test_order_listing_pages_with_cursors(api, client):
+    for i in range(5):
+        api.orders_store.append_order(make_order(f"C{i}", status="shipped" if i < 3 else "pending"))
+    seen, cursor = [], None
+    while True:
+        body = client.get("/orders", params={"limit": 2, **({"cursor": cursor} if cursor else {})}).json()
+        assert body["total"] == 5
+        seen += [o["order_id"] for o in body["orders"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ["C4", "C3", "C2", "C1", "C0"]
+    back = client.get("/orders", params={"limit": 2, "cursor": body["prev_cursor"]}).json()
+    assert [o["order_id"] for o in back["orders"]] == ["C2", "C1"]
+    shipped = client.get("/orders", params={"status": "shipped", "limit": 10}).json()
+    assert ([o["order_id"] for o in shipped["orders"]], shipped["total"]) == (["C2", "C1", "C0"], 3)
+    assert [o["order_id"] for o in client.get("/orders", params={"status": "pending"}).json()] == ["C3", "C4"]
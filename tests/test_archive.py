@@ -0,0 +1,107 @@
+from datetime import datetime
+import pytest
+from conftest import make_order
+from analytics import CustomerLedger, SalesRollups
+from archive import ArchivedOrders, OrderArchive
+from order_log import OrderLog
+from stats import OrderStats
+
+def closed_orders(n):
+    return [make_order(f"Z{i}", email=f"c{i % 3}@example.com", items={"apple": 1.0 + i % 2, f"item {i % 4}": 2.0},
+                       status="cancelled" if i % 4 == 0 else "delivered", date=f"2024-01-{1 + i % 28:02d}T08:30:00",
+                       total=10.0 * (i + 1)) for i in range(n)]
+
+def test_append_find_and_rebuild(tmp_path):
+    archive = OrderArchive(str(tmp_path / "archive"))
+    orders = closed_orders(30)
+    assert archive.append(orders[:20]) == 20
+    assert archive.append(orders) == 10
+    reopened = OrderArchive(str(tmp_path / "archive"))
+    assert reopened.rows == 30
+    row = reopened.find("Z17")
+    assert dict(reopened.order(row)) == {**orders[17], "items": {k: float(v) for k, v in orders[17]["items"].items()}}
+    assert reopened.find("Z99") is None
+    assert list(reopened.rows_for(email="c1@example.com")) == list(range(1, 30, 3))
+    assert list(reopened.rows_for(email="nobody@example.com")) == list(reopened.rows_for(status="pending")) == []
+    reopened.append([make_order("N1", email="new@example.com", status="delivered", date="2024-01-03T08:00:00")])
+    reopened.refresh()
+    assert list(reopened.rows_for(email="new@example.com")) == [30]
+    assert list(reopened.rows_for(status="cancelled")) == list(range(0, 30, 4))
+    assert list(reopened.rows_between(range(31), "2024-01-02", "2024-01-03")) == [1, 2, 29, 30]
+    assert list(reopened.rows_between([0, 4, 8], "2024-01-05")) == [4, 8]
+    assert list(reopened.rows_between(range(31), "2024-02-01")) == []
+
+def test_torn_append_is_ignored(tmp_path):
+    archive = OrderArchive(str(tmp_path / "archive"))
+    archive.append(closed_orders(5))
+    with open(tmp_path / "archive" / "total.col", "ab") as f:
+        f.write(b"torn!")
+    reopened = OrderArchive(str(tmp_path / "archive"))
+    assert reopened.rows == 5
+    assert reopened.append(closed_orders(8)) == 3
+    assert OrderArchive(str(tmp_path / "archive")).find("Z7") == 7
+
+def test_listeners_reset_from_columns_match_orders(tmp_path):
+    store = ArchivedOrders(OrderLog(str(tmp_path / "orders.json"), str(tmp_path / "orders.journal")),
+                           OrderArchive(str(tmp_path / "archive")))
+    for order in closed_orders(40):
+        store.append_order(order)
+    store.append_order(make_order("L1", email="c1@example.com", date="2024-02-01T09:00:00"))
+    assert store.archive_closed(datetime(2024, 3, 1)) == 40
+    assert store.get("Z5")["order_id"] == "Z5"
+    every = [dict(o) for o in store.all()]
+    users = {f"c{i}@example.com": {"username": f"c{i}"} for i in range(3)}
+    for listener in (OrderStats(), SalesRollups(), CustomerLedger()):
+        expected = type(listener)()
+        expected.reset(every)
+        store.subscribe(listener)
+        if isinstance(listener, OrderStats):
+            assert listener.snapshot() == expected.snapshot()
+        elif isinstance(listener, SalesRollups):
+            assert listener.revenue_series("day") == expected.revenue_series("day")
+            assert listener.top_products(20) == expected.top_products(20)
+            assert listener.status_funnel() == expected.status_funnel()
+        else:
+            assert listener.summary(users) == expected.summary(users)
+
+def fetch(client, params, cursor=None):
+    body = client.get("/orders", params={**params, **({"cursor": cursor} if cursor else {})}).json()
+    return [o["order_id"] for o in body["orders"]], body
+
+def check_walk(client, params, expected, limit):
+    """Page to the oldest order and back again; expected is newest first"""
+    params = {**params, "limit": limit}
+    ids, body = fetch(client, params)
+    start = 0
+    assert (ids, body["total"]) == (expected[:limit], len(expected))
+    while body["next_cursor"]:
+        start += len(ids)
+        ids, body = fetch(client, params, body["next_cursor"])
+        assert ids == expected[start:start + limit]
+    assert start + len(ids) == len(expected)
+    while body["prev_cursor"]:
+        ids, body = fetch(client, params, body["prev_cursor"])
+        assert ids == expected[max(start - limit, 0):start]
+        start = max(start - limit, 0)
+        if body["next_cursor"]:
+            assert fetch(client, params, body["next_cursor"])[0] == expected[start + len(ids):start + len(ids) + limit]
+        else:
+            assert start + len(ids) == len(expected)
+    assert start == 0
+
+@pytest.mark.parametrize("archived", [0, 1, 3, 6])
+@pytest.mark.parametrize("live", [0, 1, 4])
+def test_cursor_pages_cross_the_archive(api, client, archived, live):
+    closed = closed_orders(archived)
+    for order in closed:
+        api.orders_store.append_order(order)
+    assert api.orders_store.archive_closed(datetime(2024, 2, 1)) == archived
+    opened = [make_order(f"L{i}", status="delivered" if i % 2 else "pending", date="2024-03-01T10:00:00")
+              for i in range(live)]
+    for order in opened:
+        api.orders_store.append_order(order)
+    every = closed + opened
+    for status in (None, "delivered"):
+        expected = [o["order_id"] for o in reversed(every) if status is None or o["status"] == status]
+        for limit in (1, 2, 3, 5):
+            check_walk(client, {"status": status} if status else {}, expected, limit)
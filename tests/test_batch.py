@@ -0,0 +1,33 @@
+from conftest import make_order
+
+def test_product_batches_report_each_item_and_commit_once(api, client):
+    before = api.products_store.current_version()
+    body = client.post("/products/batch", json={"products": [
+        {"name": "durian", "price": 90, "unit": "piece"},
+        {"name": "durian", "price": 95, "unit": "piece"},
+        {"name": "kiwi", "price": 12, "unit": "piece"}]}).json()
+    assert (body["success"], body["applied"]) == (False, 2)
+    assert body["results"][1] == {"name": "durian", "success": False, "detail": "Product already exists"}
+    assert api.products_store.current_version() == before + 1
+    body = client.patch("/products/batch", json={"products": [
+        {"name": "kiwi", "price": 14, "unit": "piece"}, {"name": "nope", "price": 1, "unit": "kg"}]}).json()
+    assert [r["success"] for r in body["results"]] == [True, False]
+    assert api.products_store.get()["kiwi"]["price"] == 14
+
+def test_order_status_batch(api, client):
+    for i in range(3):
+        api.orders_store.append_order(make_order(f"B{i}"))
+    before = api.orders_store.current_version()
+    body = client.patch("/orders/status", json={"updates": [
+        {"order_id": "B0", "status": "shipped"}, {"order_id": "B2", "status": "cancelled"},
+        {"order_id": "missing", "status": "shipped"}]}).json()
+    assert (body["success"], body["applied"]) == (False, 2)
+    assert body["results"][2]["detail"] == "Order not found"
+    assert [api.orders_store.get(f"B{i}")["status"] for i in range(3)] == ["shipped", "pending", "cancelled"]
+    assert api.orders_store.current_version() == before + 1
+
+def test_oversized_batches_are_refused(api, client, monkeypatch):
+    monkeypatch.setattr(api, "MAX_BATCH_SIZE", 2)
+    products = [{"name": f"p{i}", "price": 1, "unit": "kg"} for i in range(3)]
+    assert client.post("/products/batch", json={"products": products}).status_code == 400
+    assert "p0" not in api.products_store.get()
@@ -0,0 +1,36 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+import bench
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_failed_statuses_ignore_success_and_not_modified():
+    assert bench.failed_statuses({"200": 5, "304": 2, "503": 1}, {"201": 1, "422": 2, "503": 3}) == {"503": 4, "422": 2}
+    assert bench.failed_statuses({"204": 1}) == {}
+
+def test_memory_helpers():
+    assert bench.rss_delta(None, 10.0) is None
+    assert bench.rss_delta(10.0, 12.5) == 2.5
+    if os.path.exists("/proc/self/statm"):
+        assert bench.rss_mb() > 0
+
+def test_every_route_gets_a_request():
+    routes = bench.endpoints(1000, 100, ["red apple 0", "tea 1", "milk 2"], 50)
+    assert len({name for name, _, _ in routes}) == len(routes)
+    for name, count, make_request in routes:
+        method, path, kwargs = make_request(0)
+        assert count >= 3 and name.startswith(method + " /")
+        assert set(kwargs) <= {"json", "params"}
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_small_run_hits_every_route_without_errors(backend):
+    script = f"import bench, json; print(json.dumps(bench.run_scale(1000, {backend!r}, 3, 2)))"
+    child = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, timeout=300)
+    assert child.returncode == 0, child.stderr
+    report = json.loads(child.stdout)
+    assert report["orders"] == 1000
+    assert {name: result["failed"] for name, result in report["endpoints"].items() if "failed" in result} == {}
+    assert all("peak_alloc_mb" in result for result in report["endpoints"].values())
@@ -0,0 +1,72 @@
+from decimal import Decimal
+import pytest
+from billing import PriceEngine, PricingError, parse_tiers
+
+PRODUCTS = {"apple": {"price": 100, "unit": "kg"}, "egg": {"price": 15.5, "unit": "piece"}}
+
+def test_parse_tiers_highest_first():
+    assert parse_tiers("1000:0.10, 2000:0.15") == [(Decimal("2000"), Decimal("0.15")), (Decimal("1000"), Decimal("0.10"))]
+
+def test_quote_applies_tier_then_tax():
+    bill = PriceEngine().quote({"apple": 12}, PRODUCTS.get)
+    assert bill["subtotal"] == Decimal("1200.00")
+    assert bill["discount_amount"] == Decimal("120.00")
+    assert bill["tax_amount"] == Decimal("54.00")
+    assert bill["total"] == Decimal("1134.00")
+
+@pytest.mark.parametrize("items", [{"pear": 1}, {"apple": 0}, {"apple": "x"}, {"apple": "nan"}, {"apple": 1e30},
+                                   {"apple": 10001}, {}])
+def test_quote_rejects_bad_carts(items):
+    with pytest.raises(PricingError):
+        PriceEngine().quote(items, PRODUCTS.get)
+
+def test_huge_quantities_and_empty_carts_are_bad_requests(client, api):
+    assert client.post("/quote", json={"items": {"apple": 1e30}}).status_code == 400
+    assert client.post("/quote", json={"items": {}}).status_code == 400
+    for order_id, items in (("Q2", {"apple": 1e30}), ("Q3", {})):
+        response = client.post("/orders", json={"order_id": order_id, "email": "ann@example.com", "username": "ann",
+                                                "items": items})
+        assert response.status_code == 400
+        assert api.orders_store.get(order_id) is None
+
+def test_order_stores_priced_quantities(client, api):
+    response = client.post("/orders", json={"order_id": "Q1", "email": "ann@example.com", "username": "ann",
+                                            "items": {"apple": "3", "egg": 2}})
+    assert response.status_code == 200
+    order = api.orders_store.get("Q1")
+    assert order["items"] == {"apple": 3.0, "egg": 2.0}
+    assert order["total"] == 346.5
+    assert client.get("/analytics/top-products").json()[0] == {"name": "apple", "orders": 1, "quantity": 3.0}
+
+def random_catalog(rng, size=40):
+    # Prices down to the paisa, some with a half paisa that to_money() rounds up.
+    prices = [round(rng.uniform(1, 500), rng.choice([0, 1, 2, 3])) for _ in range(size)]
+    return {f"p{i}": {"price": price, "unit": "kg"} for i, price in enumerate(prices)}
+
+def random_quantity(rng):
+    return rng.choice([1, 2, 3, 0.5, 1.5, 0.25, 0.125, 0.1, 0.3, 1.005, 2.345, 0.0625, rng.randint(1, 20) / 8,
+                       round(rng.uniform(0.01, 10), 3), round(rng.uniform(0.01, 5), 7)])
+
+def test_batch_pricing_matches_quote_on_random_carts():
+    np = pytest.importorskip("numpy")
+    import random
+    rng = random.Random(7)
+    catalog = random_catalog(rng)
+    names = list(catalog)
+    engine = PriceEngine(parse_tiers("2000:0.15,1000:0.10,500:0.035"), Decimal("0.075"))
+    carts = []
+    for _ in range(20_000):
+        carts.append({name: random_quantity(rng) for name in rng.sample(names, rng.randint(1, 6))})
+    matrix = np.zeros((len(carts), len(names)))
+    for i, cart in enumerate(carts):
+        for name, qty in cart.items():
+            matrix[i, names.index(name)] = qty
+    batch = engine.price_carts(matrix, [catalog[n]["price"] for n in names])
+    repriced = engine.reprice_orders([{"items": cart} for cart in carts], {n: p["price"] for n, p in catalog.items()})
+    for i, cart in enumerate(carts):
+        bill = engine.quote(cart, catalog.get)
+        for field in ("subtotal", "discount_amount", "tax_amount", "total"):
+            assert round(batch[field][i], 2) == float(bill[field]), (cart, field)
+            assert round(repriced[field][i], 2) == float(bill[field]), (cart, field)
+        assert batch["discount_rate"][i] == float(bill["discount_rate"])
+    assert repriced["unpriced_lines"] == 0
@@ -0,0 +1,33 @@
+import main
+from search import ProductIndex
+
+def catalog_index():
+    products = ProductIndex()
+    products.reset((f"item {i:02d}", {"price": i * 10, "unit": "kg" if i % 2 else "piece"}) for i in range(30))
+    return products
+
+def names(page):
+    return [p["name"] for p in page]
+
+def test_pages_are_name_ordered_and_filtered():
+    products = catalog_index()
+    page, total, units = products.catalog(offset=24, limit=24)
+    assert (names(page), total, units) == (["item 24", "item 25", "item 26", "item 27", "item 28", "item 29"], 30,
+                                            ["kg", "piece"])
+    page, total, _ = products.catalog(unit="kg", min_price=100, max_price=150, limit=2)
+    assert (names(page), total) == (["item 11", "item 13"], 3)
+    assert products.catalog(unit="litre")[:2] == ([], 0)
+
+def test_filtered_products_endpoint(api, client):
+    api.products_store.batch([("add", "zz kiwi", {"price": 5, "unit": "box"}),
+                              ("add", "aa fig", {"price": 7, "unit": "box"})])
+    body = client.get("/products", params={"unit": "box", "max_price": 6}).json()
+    assert ([p["name"] for p in body["products"]], body["total"], body["limit"]) == (["zz kiwi"], 1, 24)
+    assert "box" in body["units"]
+    # Without filter or paging parameters the whole catalog comes back as before.
+    assert client.get("/products").json()["aa fig"] == {"price": 7, "unit": "box"}
+
+def test_cards_escape_product_text():
+    cards = main.catalog_cards([{"name": "<b>fig</b>", "price": 7, "unit": "box & tin"}])
+    assert "&lt;B&gt;Fig&lt;/B&gt;" in cards and "box &amp; tin" in cards
+    assert "<b>" not in cards
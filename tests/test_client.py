@@ -0,0 +1,73 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+import pytest
+import main
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Answers 503 to the first `failures` requests, then 200; records each (method, client port)"""
+
+    protocol_version = "HTTP/1.1"
+    failures = 0
+    seen = []
+
+    def _answer(self):
+        FlakyHandler.seen.append((self.command, self.client_address[1]))
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        status = 503 if FlakyHandler.failures > 0 else 200
+        FlakyHandler.failures -= 1
+        body = json.dumps({"ok": status == 200}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _answer
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server(monkeypatch):
+    FlakyHandler.failures, FlakyHandler.seen = 0, []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(main, "API_BASE", f"http://127.0.0.1:{httpd.server_address[1]}")
+    yield FlakyHandler
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_requests_share_one_keep_alive_session(server):
+    assert main.get_http_session() is main.get_http_session()
+    for _ in range(3):
+        assert main.api_request("GET", "/").json() == {"ok": True}
+    assert len({port for _, port in server.seen}) == 1
+
+def test_gets_are_retried_but_posts_are_not(server):
+    server.failures = 2
+    assert main.api_request("GET", "/stats").status_code == 200
+    assert [method for method, _ in server.seen] == ["GET"] * 3
+    server.failures, server.seen = 1, []
+    assert main.api_request("POST", "/orders", json={}).status_code == 503
+    assert [method for method, _ in server.seen] == ["POST"]
+
+def test_every_call_gets_the_default_timeouts(monkeypatch):
+    calls = []
+    monkeypatch.setattr(main.get_http_session(), "request",
+                        lambda method, url, **kwargs: calls.append(kwargs) or SimpleNamespace(status_code=200))
+    main.api_request("GET", "/")
+    main.api_request("GET", "/", timeout=1)
+    assert [kwargs["timeout"] for kwargs in calls] == [main.HTTP_TIMEOUT, 1]
+
+def test_dashboard_loads_run_at_once_and_keep_their_order():
+    started = threading.Barrier(3, timeout=5)
+
+    def loader(value):
+        # Only returns once all three loaders are running at the same time.
+        started.wait()
+        return value
+
+    assert main.load_concurrently(*(lambda v=v: loader(v) for v in "abc")) == ["a", "b", "c"]
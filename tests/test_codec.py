@@ -0,0 +1,47 @@
+import builtins
+import importlib.util
+import json
+from decimal import Decimal
+import pytest
+import codec
+from records import OrderRecord
+
+def load_codec(without_orjson=False, monkeypatch=None):
+    """A separate copy of the codec module, optionally as if orjson were not installed"""
+    if without_orjson:
+        real_import = builtins.__import__
+
+        def fake_import(name, *args, **kwargs):
+            if name == "orjson":
+                raise ImportError(name)
+            return real_import(name, *args, **kwargs)
+
+        monkeypatch.setattr(builtins, "__import__", fake_import)
+    spec = importlib.util.spec_from_file_location("codec_copy", codec.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+@pytest.fixture(params=["default", "json"])
+def backend(request, monkeypatch):
+    return load_codec(request.param == "json", monkeypatch)
+
+def test_round_trip_is_compact_and_keeps_unicode(backend):
+    data = {"name": "Crème", "items": {"egg": 2.5}, "n": [1, None, True]}
+    raw = backend.dumps(data)
+    assert raw == '{"name":"Crème","items":{"egg":2.5},"n":[1,null,true]}'.encode("utf-8")
+    assert backend.loads(raw) == data == backend.loads(backend.dumps_text(data))
+    assert json.loads(backend.dumps_pretty(data)) == data
+    assert b"\n  " in backend.dumps_pretty(data)
+
+def test_decimals_and_records_are_encoded(backend):
+    order = {"order_id": "R1", "email": "a@example.com", "username": "a", "items": {"apple": 1.5}, "subtotal": 10.0,
+             "discount_amount": 0.0, "tax_amount": 0.5, "total": 10.5, "status": "pending",
+             "date": "2024-03-01T10:00:00"}
+    encoded = backend.loads(backend.dumps({"price": Decimal("12.50"), "order": OrderRecord.from_dict(order)}))
+    assert encoded == {"price": 12.5, "order": order}
+    with pytest.raises(TypeError):
+        backend.dumps({"bad": object()})
+
+def test_fallback_is_picked_without_orjson(monkeypatch):
+    assert load_codec(True, monkeypatch).BACKEND == "json"
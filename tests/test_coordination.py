@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+from conftest import make_order
+import sqlite_store
+import storage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WRITER = """
+import sys
+import storage
+from conftest import make_order
+store = storage.open_sqlite_storage("grocery.db") if sys.argv[1] == "sqlite" else storage.open_json_storage()
+for i in range(int(sys.argv[2])):
+    store.orders.append_order(make_order(f"C{i}"))
+    if i % 3 == 0:
+        store.orders.set_status(f"C{i}", "shipped")
+store.users.add("child@example.com", {"email": "child@example.com"})
+"""
+
+class Recorder:
+    """Order listener that keeps order_id -> status and counts resets"""
+
+    def __init__(self):
+        self.resets = 0
+        self.statuses = {}
+
+    def reset(self, orders, archive=None):
+        self.resets += 1
+        self.statuses = {o["order_id"]: o["status"] for o in orders}
+
+    def order_added(self, order):
+        self.statuses[order["order_id"]] = order["status"]
+
+    def status_changed(self, order, old_status):
+        assert self.statuses[order["order_id"]] == old_status
+        self.statuses[order["order_id"]] = order["status"]
+
+def open_store(backend):
+    return storage.open_sqlite_storage("grocery.db") if backend == "sqlite" else storage.open_json_storage()
+
+def test_two_processes_writing_converge(data_dir, backend):
+    store = open_store(backend)
+    recorder = Recorder()
+    store.orders.subscribe(recorder)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ROOT, os.path.join(ROOT, "tests")]))
+    child = subprocess.Popen([sys.executable, "-c", WRITER, backend, "150"], cwd=data_dir, env=env)
+    for i in range(150):
+        assert store.orders.append_order(make_order(f"P{i}"))
+    assert child.wait(timeout=120) == 0
+    store.orders.live.check_interval = 0
+    store.orders.refresh()
+    fresh = Recorder()
+    open_store(backend).orders.subscribe(fresh)
+    assert len(fresh.statuses) == 300
+    assert list(fresh.statuses.values()).count("shipped") == 50
+    assert recorder.statuses == fresh.statuses
+    store.users.check_interval = 0
+    assert "child@example.com" in store.users.get()
+    if backend == "sqlite":
+        # Everything the other process wrote was replayed from the change log.
+        assert recorder.resets == 1
+
+def test_sqlite_reloads_when_change_log_does_not_cover_the_gap(data_dir, monkeypatch):
+    monkeypatch.setattr(sqlite_store, "CHANGE_LOG_VERSIONS", 1)
+    worker, other = open_store("sqlite"), open_store("sqlite")
+    recorder = Recorder()
+    worker.orders.subscribe(recorder)
+    for i in range(3):
+        other.orders.append_order(make_order(f"G{i}"))
+    worker.orders.live.check_interval = 0
+    worker.orders.refresh()
+    assert recorder.resets == 2
+    assert list(recorder.statuses) == ["G0", "G1", "G2"]
+    other.orders.set_status("G1", "shipped")
+    worker.orders.refresh()
+    assert recorder.resets == 2
+    assert recorder.statuses["G1"] == "shipped"
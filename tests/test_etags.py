@@ -0,0 +1,36 @@
+import pytest
+from conftest import make_order
+
+def write(api, path):
+    if path == "/products":
+        api.products_store.add("durian", {"price": 90, "unit": "piece"})
+    elif path == "/users":
+        api.users_store.add("ann@example.com", {"username": "ann", "role": "user"})
+    else:
+        api.orders_store.append_order(make_order("T1"))
+
+@pytest.mark.parametrize("path", ["/products", "/users", "/orders"])
+def test_revalidation_until_the_collection_changes(api, client, path):
+    first = client.get(path)
+    etag = first.headers["etag"]
+    assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(path, headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert client.get(path, headers={"If-None-Match": '"other"'}).status_code == 200
+    write(api, path)
+    changed = client.get(path, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json() != first.json()
+
+def test_tags_name_the_collection(client):
+    products, users = client.get("/products").headers["etag"], client.get("/users").headers["etag"]
+    assert products.startswith('"products-') and users.startswith('"users-')
+    assert client.get("/users", headers={"If-None-Match": products}).status_code == 200
+
+def test_customer_summary_tag_follows_users_and_orders(api, client):
+    assert api.make_etag("customers", 3, 7) == '"customers-3.7"'
+    etag = client.get("/users/summary").headers["etag"]
+    assert etag == api.make_etag("customers", api.users_store.current_version(), api.orders_store.current_version())
+    assert client.get("/users/summary", headers={"If-None-Match": etag}).status_code == 304
+    write(api, "/orders")
+    assert client.get("/users/summary", headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+from datetime import datetime
+from conftest import make_order
+
+def fill(api):
+    api.orders_store.append_order(make_order("E1", status="delivered", date="2024-01-05T09:00:00"))
+    api.orders_store.append_order(make_order("E2", items={"apple": 1.0, "egg": 6.0}, date="2024-03-01T10:00:00"))
+    api.orders_store.append_order(make_order("E3", status="shipped", date="2024-03-09T10:00:00"))
+    assert api.orders_store.archive_closed(datetime(2024, 2, 1)) == 1
+
+def test_ndjson_streams_every_order_archive_included(api, client):
+    fill(api)
+    response = client.get("/orders/export")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    orders = [json.loads(line) for line in response.text.splitlines()]
+    assert [o["order_id"] for o in orders] == ["E1", "E2", "E3"]
+    assert orders[1]["items"] == {"apple": 1.0, "egg": 6.0}
+    filtered = client.get("/orders/export", params={"from": "2024-01-06", "to": "2024-03-01"}).text
+    assert [json.loads(line)["order_id"] for line in filtered.splitlines()] == ["E2"]
+    assert client.get("/orders/export", params={"status": "shipped"}).text.count("\n") == 1
+
+def test_csv_has_one_row_per_order_line(api, client):
+    fill(api)
+    response = client.get("/orders/export", params={"format": "csv", "status": "pending"})
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == api.EXPORT_CSV_COLUMNS
+    assert [(row[0], row[5], row[6]) for row in rows[1:]] == [("E2", "apple", "1.0"), ("E2", "egg", "6.0")]
+    assert "orders.csv" in response.headers["content-disposition"]
+
+def test_bodies_are_cut_into_chunks(api, monkeypatch):
+    monkeypatch.setattr(api, "EXPORT_CHUNK_BYTES", 200)
+    orders = [make_order(f"C{i}") for i in range(10)]
+    chunks = list(api.export_ndjson(iter(orders)))
+    assert len(chunks) > 1
+    assert [json.loads(line)["order_id"] for line in b"".join(chunks).splitlines()] == [f"C{i}" for i in range(10)]
+    assert len(list(api.export_csv(iter(orders)))) > 1
+
+def test_date_ranges_are_read_from_storage(api, client):
+    fill(api)
+    api.orders_store.append_order(make_order("E4", date="2024-03-09T23:59:59+05:30"))
+    api.orders_store.append_order(make_order("E5", date="2024-03-10T00:00:00"))
+    every = [o["order_id"] for o in api.orders_store.iter_orders()]
+    assert every == ["E1", "E2", "E3", "E4", "E5"]
+    for start, end in (("2024-01-05", "2024-01-05"), ("2024-03-09", None), (None, "2024-03-09"),
+                       ("2024-02-01", "2024-02-28"), ("2023-01-01", "2025-01-01")):
+        expected = [o["order_id"] for o in api.orders_store.iter_orders()
+                    if (start is None or o["date"][:10] >= start) and (end is None or o["date"][:10] <= end)]
+        assert [o["order_id"] for o in api.orders_store.iter_orders(None, start, end)] == expected
+        params = {k: v for k, v in (("from", start), ("to", end)) if v}
+        body = client.get("/orders/export", params=params).text
+        assert [json.loads(line)["order_id"] for line in body.splitlines()] == expected
+    assert [o["order_id"] for o in api.orders_store.iter_orders("pending", "2024-03-01", "2024-03-09")] == ["E2", "E4"]
+    assert client.get("/orders/export", params={"to": "2024-02-30"}).status_code == 400
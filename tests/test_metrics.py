@@ -0,0 +1,37 @@
+from conftest import make_order
+from metrics import Registry
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    latency = registry.histogram("op_seconds", "Op time", ["op"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(value, op="load")
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP op_seconds Op time", "# TYPE op_seconds histogram"]
+    assert lines[2:] == [
+        'op_seconds_bucket{op="load",le="0.1"} 1',
+        'op_seconds_bucket{op="load",le="1.0"} 3',
+        'op_seconds_bucket{op="load",le="+Inf"} 4',
+        'op_seconds_sum{op="load"} 4.05',
+        'op_seconds_count{op="load"} 4',
+    ]
+    assert registry.summary()["op_seconds"] == [{"op": "load", "count": 4, "avg_ms": 1012.5, "total_s": 4.05}]
+
+def test_counters_escape_labels_and_keep_the_first_registration():
+    registry = Registry()
+    written = registry.counter("bytes_total", "Bytes", ["store"])
+    assert registry.counter("bytes_total", "Bytes", ["store"]) is written
+    written.inc(10, store='a"b')
+    written.inc(5, store='a"b')
+    assert 'bytes_total{store="a\\"b"} 15' in registry.render()
+
+def test_requests_are_timed_by_route_template(api, client):
+    api.orders_store.append_order(make_order("X1"))
+    client.get("/orders/X1")
+    client.get("/orders/missing")
+    client.post("/products/batch", json={"products": [{"name": "kiwi", "price": 1, "unit": "kg"}]})
+    body = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/orders/{order_id}",status="200"}' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/orders/{order_id}",status="404"}' in body
+    assert "/orders/X1" not in body
+    assert 'storage_io_seconds_count{store=' in body
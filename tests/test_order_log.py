@@ -0,0 +1,40 @@
+import os
+from conftest import make_order
+from order_log import OrderLog
+
+def open_log(path, **kwargs):
+    return OrderLog(str(path / "orders.json"), str(path / "orders.journal"), **kwargs)
+
+def test_journal_replays_after_reopen(tmp_path):
+    log = open_log(tmp_path)
+    assert log.append_order(make_order("A1"))
+    assert log.set_status("A1", "shipped")
+    assert not log.append_order(make_order("A1"))
+    reopened = open_log(tmp_path)
+    assert [(o["order_id"], o["status"]) for o in reopened.all()] == [("A1", "shipped")]
+
+def test_compaction_folds_journal_into_snapshot(tmp_path):
+    log = open_log(tmp_path, compact_every=3)
+    for i in range(4):
+        log.append_order(make_order(f"C{i}"))
+    assert os.path.getsize(tmp_path / "orders.journal") > 0
+    reopened = open_log(tmp_path)
+    assert [o["order_id"] for o in reopened.all()] == ["C0", "C1", "C2", "C3"]
+
+def test_replay_tolerates_journal_already_in_snapshot(tmp_path):
+    log = open_log(tmp_path)
+    log.append_order(make_order("D1"))
+    journal = (tmp_path / "orders.journal").read_bytes()
+    log.compact()
+    # As if the compaction crashed before truncating the journal.
+    (tmp_path / "orders.journal").write_bytes(journal)
+    assert [o["order_id"] for o in open_log(tmp_path).all()] == ["D1"]
+
+def test_append_after_torn_write_survives_reload(tmp_path):
+    open_log(tmp_path).append_order(make_order("X1"))
+    with open(tmp_path / "orders.journal", "ab") as f:
+        f.write(b'{"op": "create", "order": {"order_id": "X2", "ema')
+    log = open_log(tmp_path)
+    assert [o["order_id"] for o in log.all()] == ["X1"]
+    assert log.append_order(make_order("X3"))
+    assert [o["order_id"] for o in open_log(tmp_path).all()] == ["X1", "X3"]
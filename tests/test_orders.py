@@ -0,0 +1,40 @@
+import pytest
+from conftest import make_order
+from order_log import OrderLog
+from sqlite_store import SqliteDatabase, SqliteOrders
+
+@pytest.fixture(params=["log", "sqlite"])
+def orders(request, tmp_path):
+    if request.param == "log":
+        return OrderLog(str(tmp_path / "orders.json"), str(tmp_path / "orders.journal"))
+    return SqliteOrders(SqliteDatabase(str(tmp_path / "grocery.db")))
+
+def ids(orders):
+    return [o["order_id"] for o in orders]
+
+def test_lookups_by_id_email_and_status_follow_changes(orders):
+    for i in range(6):
+        orders.append_order(make_order(f"I{i}", email=f"c{i % 2}@example.com"))
+    assert orders.set_statuses([("I1", "shipped"), ("I4", "shipped"), ("missing", "shipped")]) == [True, True, False]
+    assert orders.get("I4")["status"] == "shipped"
+    assert orders.get("missing") is None
+    assert ids(orders.by_email("c0@example.com")) == ["I0", "I2", "I4"]
+    assert ids(orders.by_status("shipped")) == ["I1", "I4"]
+    assert ids(orders.by_status("pending")) == ["I0", "I2", "I3", "I5"]
+    orders.set_status("I1", "pending")
+    assert ids(orders.by_status("pending")) == ["I0", "I1", "I2", "I3", "I5"]
+    assert ids(orders.by_status("shipped")) == ["I4"]
+
+def test_pages_walk_newest_first_and_back(orders):
+    for i in range(7):
+        orders.append_order(make_order(f"P{i}", status="shipped" if i % 2 else "pending"))
+    page, total, older, newer = orders.page(limit=3)
+    assert (ids(page), total, newer) == (["P6", "P5", "P4"], 7, None)
+    page, _, older, newer = orders.page(limit=3, before=older)
+    assert ids(page) == ["P3", "P2", "P1"]
+    page, _, last, _ = orders.page(limit=3, before=older)
+    assert (ids(page), last) == (["P0"], None)
+    assert ids(orders.page(limit=3, after=newer)[0]) == ["P6", "P5", "P4"]
+    page, total, older, newer = orders.page(status="shipped", limit=2)
+    assert (ids(page), total, newer) == (["P5", "P3"], 3, None)
+    assert ids(orders.page(status="shipped", limit=2, before=older)[0]) == ["P1"]
@@ -0,0 +1,76 @@
+import smtplib
+import time
+import outbox
+from outbox import Outbox
+
+class FakeSMTP:
+    """Stands in for smtplib.SMTP; drops the connection once if asked, and refuses some recipients"""
+
+    opened = []
+    sent = []
+    drop_next = False
+    refused = set()
+
+    def __init__(self, host, port, timeout=None):
+        FakeSMTP.opened.append((host, port))
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def send_message(self, msg):
+        if FakeSMTP.drop_next:
+            FakeSMTP.drop_next = False
+            raise smtplib.SMTPServerDisconnected("idle")
+        if msg["To"] in FakeSMTP.refused:
+            raise smtplib.SMTPRecipientsRefused({msg["To"]: (550, b"no such user")})
+        FakeSMTP.sent.append(msg["To"])
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+def open_outbox(tmp_path, monkeypatch, **kwargs):
+    FakeSMTP.opened, FakeSMTP.sent, FakeSMTP.drop_next, FakeSMTP.refused = [], [], False, set()
+    monkeypatch.setattr(outbox, "POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(outbox, "BACKOFF_BASE", 0.0)
+    return Outbox("smtp.test", 587, "shop@example.com", path=str(tmp_path / "outbox.db"), smtp_factory=FakeSMTP,
+                  **kwargs)
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_queued_mail_goes_out_over_one_connection(tmp_path, monkeypatch):
+    box = open_outbox(tmp_path, monkeypatch)
+    for i in range(3):
+        box.enqueue(f"c{i}@example.com", "Order received", "<p>Thanks</p>")
+    assert box.counts() == {"pending": 3}
+    box.start()
+    try:
+        wait_for(lambda: box.counts() == {"sent": 3})
+    finally:
+        box.stop(timeout=5)
+    assert FakeSMTP.sent == ["c0@example.com", "c1@example.com", "c2@example.com"]
+    assert len(FakeSMTP.opened) == 1
+
+def test_dropped_connection_is_reopened_and_failures_retried(tmp_path, monkeypatch):
+    box = open_outbox(tmp_path, monkeypatch, max_attempts=2)
+    FakeSMTP.drop_next = True
+    FakeSMTP.refused = {"bounce@example.com"}
+    box.enqueue("ok@example.com", "Hi", "<p>1</p>")
+    box.enqueue("bounce@example.com", "Hi", "<p>2</p>")
+    box.start()
+    try:
+        wait_for(lambda: box.counts() == {"sent": 1, "failed": 1})
+    finally:
+        box.stop(timeout=5)
+    # The first message survives the dropped connection; the second fails twice and gives up.
+    assert FakeSMTP.sent == ["ok@example.com"]
+    assert len(FakeSMTP.opened) >= 2
@@ -0,0 +1,50 @@
+import asyncio
+import bcrypt
+import pytest
+from passwords import HashPool, PoolBusy, needs_rehash
+
+@pytest.fixture
+def pool():
+    pool = HashPool(workers=1, queue_limit=1, rounds=4)
+    yield pool
+    pool.shutdown()
+
+def test_hash_and_verify_round_trip(pool):
+    async def run():
+        hashed = await pool.hash("secret")
+        return hashed, await pool.verify("secret", hashed), await pool.verify("wrong", hashed)
+
+    hashed, right, wrong = asyncio.run(run())
+    assert hashed.startswith("$2b$04$") and right and not wrong
+
+def test_full_queue_rejects_instead_of_waiting(pool):
+    async def run():
+        return await asyncio.gather(pool.hash("a"), pool.hash("b"), return_exceptions=True)
+
+    first, second = asyncio.run(run())
+    assert isinstance(first, str)
+    assert isinstance(second, PoolBusy)
+
+def test_needs_rehash_for_legacy_prefix_and_other_cost():
+    assert not needs_rehash("$2b$12$" + "x" * 53, 12)
+    assert needs_rehash("$2a$12$" + "x" * 53, 12)
+    assert needs_rehash("$2b$10$" + "x" * 53, 12)
+    assert needs_rehash("plain", 12)
+    assert needs_rehash("$2b$xx$" + "x" * 53, 12)
+
+def test_workers_do_not_fork_the_server(pool):
+    asyncio.run(pool.hash("secret"))
+    assert pool._executor._mp_context.get_start_method() in ("forkserver", "spawn")
+
+def test_malformed_stored_hash_is_an_invalid_password(api, client):
+    api.users_store.add("bob@example.com", {"username": "bob", "password": "$2b$xx$garbage", "role": "user"})
+    response = client.post("/login", json={"email": "bob@example.com", "password": "secret"})
+    assert (response.status_code, response.json()["detail"]) == (400, "Incorrect password")
+
+def test_login_upgrades_a_legacy_hash(api, client):
+    legacy = "$2a$" + bcrypt.hashpw(b"secret", bcrypt.gensalt(4)).decode()[4:]
+    api.users_store.add("ann@example.com", {"username": "ann", "password": legacy, "role": "user"})
+    assert client.post("/login", json={"email": "ann@example.com", "password": "secret"}).status_code == 200
+    upgraded = api.users_store.lookup("ann@example.com")["password"]
+    assert upgraded.startswith("$2b$04$")
+    assert bcrypt.checkpw(b"secret", upgraded.encode())
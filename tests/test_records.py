@@ -0,0 +1,44 @@
+import codec
+from conftest import make_order
+from records import STATUSES, OrderRecord, from_micros, memory_report, to_micros
+
+def test_record_reads_and_serializes_like_the_dict():
+    order = make_order("R1", items={"apple": 1.5, "egg": 12.0}, total=10.25)
+    record = OrderRecord.from_dict(order)
+    assert dict(record) == order == record.to_dict()
+    assert record["items"] == {"apple": 1.5, "egg": 12.0}
+    assert record.get("total") == 10.25 and record.get("missing") is None
+    assert codec.loads(codec.dumps(record)) == order
+    record.status = "shipped"
+    assert record["status"] == "shipped"
+
+def test_missing_amounts_odd_dates_and_extra_fields_survive():
+    order = {"order_id": "R2", "email": "a@example.com", "username": "a", "items": {}, "total": 5.0,
+             "status": "on hold", "date": "2024-03-01T10:00:00+05:30", "note": "leave at door"}
+    record = OrderRecord.from_dict(order)
+    assert record.to_dict() == order
+    assert "subtotal" not in record and record["note"] == "leave at door"
+    assert record.status == "on hold"
+    record.status = "returned"
+    assert (record["status"], record.to_dict()["status"]) == ("returned", "returned")
+    assert STATUSES == ("pending", "processing", "shipped", "delivered", "cancelled")
+
+def test_api_rejects_unknown_statuses(api, client):
+    api.orders_store.append_order(make_order("S1"))
+    assert client.put("/orders/S1", json={"status": "lost in space"}).status_code == 400
+    batch = {"updates": [{"order_id": "S1", "status": "shipped"}, {"order_id": "S1", "status": "x" * 50}]}
+    assert client.patch("/orders/status", json=batch).status_code == 400
+    new = {"order_id": "S2", "email": "ann@example.com", "username": "ann", "items": {"apple": 1}, "status": "weird"}
+    assert client.post("/orders", json=new).status_code == 400
+    assert api.orders_store.get("S1")["status"] == "pending" and api.orders_store.get("S2") is None
+    assert client.put("/orders/S1", json={"status": "shipped"}).status_code == 200
+
+def test_micros_round_trip():
+    for text in ("2024-03-01T10:00:00", "1999-12-31T23:59:59.000123", "1970-01-01T00:00:00"):
+        assert from_micros(to_micros(text)) == text
+    assert to_micros("2024-03-01T10:00:00+01:00") == to_micros("2024-03-01T09:00:00")
+
+def test_records_take_less_memory_than_dicts():
+    report = memory_report([make_order(f"M{i}", items={"apple": 1.0, "rice": 2.0}) for i in range(500)])
+    assert report["orders"] == report["sampled"] == 500
+    assert report["record_bytes_per_order"] < report["dict_bytes_per_order"]
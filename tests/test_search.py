@@ -0,0 +1,47 @@
+from search import ProductIndex
+
+PRODUCTS = {
+    "Basmati Rice": {"price": 120, "unit": "kg"},
+    "Brown Rice": {"price": 90, "unit": "kg"},
+    "Rice Flour": {"price": 60, "unit": "packet"},
+    "Banana": {"price": 40, "unit": "dozen"},
+    "Green Tea": {"price": 200, "unit": "packet"},
+}
+
+def names(results):
+    return [r["name"] for r in results]
+
+def index():
+    products = ProductIndex()
+    products.reset(PRODUCTS.items())
+    return products
+
+def test_prefix_then_word_then_substring_matches():
+    products = index()
+    assert names(products.search("rice")) == ["Rice Flour", "Brown Rice", "Basmati Rice"]
+    # Prefix matches outrank the fuzzy ones that follow them.
+    assert names(products.search("  BAS ")) == ["Basmati Rice", "Banana"]
+    assert names(products.search("brown ri")) == ["Brown Rice"]
+    assert sorted(names(products.search("ice"))) == ["Basmati Rice", "Brown Rice", "Rice Flour"]
+    assert products.search("rice", limit=1)[0] == {"name": "Rice Flour", "price": 60, "unit": "packet"}
+    assert products.search("") == []
+
+def test_typos_match_by_trigrams():
+    assert names(index().search("bananna")) == ["Banana"]
+    assert names(index().search("gren tea")) == ["Green Tea"]
+    assert index().search("xyzzy") == []
+
+def test_index_follows_product_changes():
+    products = index()
+    products.changed("Mango", None, {"price": 150, "unit": "kg"})
+    products.changed("Banana", PRODUCTS["Banana"], None)
+    products.changed("Green Tea", PRODUCTS["Green Tea"], {"price": 180, "unit": "box"})
+    assert names(products.search("mang")) == ["Mango"]
+    assert products.search("banana") == []
+    assert products.search("green")[0]["price"] == 180
+    assert products.catalog(unit="box")[0][0]["name"] == "Green Tea"
+
+def test_search_endpoint(api, client):
+    api.products_store.add("Jackfruit", {"price": 80, "unit": "piece"})
+    assert names(client.get("/products/search", params={"q": "jack"}).json())[0] == "Jackfruit"
+    assert names(client.get("/products/search", params={"q": "jakfruit"}).json())[0] == "Jackfruit"
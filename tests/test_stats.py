@@ -0,0 +1,46 @@
+from conftest import make_order
+from stats import OrderStats, ProductStats, UserStats
+
+def test_order_revenue_leaves_out_cancelled_orders():
+    stats = OrderStats()
+    stats.reset([make_order("S1", total=10.0), make_order("S2", total=20.0, status="cancelled")])
+    assert stats.snapshot()["revenue"] == 10.0
+    stats.order_added(make_order("S3", total=5.0, status="cancelled"))
+    assert stats.snapshot()["revenue"] == 10.0
+    stats.status_changed(make_order("S1", total=10.0, status="cancelled"), "pending")
+    assert stats.snapshot()["revenue"] == 0.0
+    stats.status_changed(make_order("S2", total=20.0, status="processing"), "cancelled")
+    snapshot = stats.snapshot()
+    assert snapshot["revenue"] == 20.0
+    assert snapshot["total"] == 3
+    assert snapshot["by_status"] == {"cancelled": 2, "processing": 1}
+
+def test_recent_orders_newest_first_and_follow_status():
+    stats = OrderStats(recent=2)
+    stats.reset([make_order(f"R{i}") for i in range(3)])
+    stats.status_changed(make_order("R2", status="shipped"), "pending")
+    assert [(o["order_id"], o["status"]) for o in stats.snapshot()["recent"]] == [("R2", "shipped"), ("R1", "pending")]
+
+def test_user_and_product_counts_follow_changes():
+    users, products = UserStats(), ProductStats()
+    users.reset([("a@example.com", {"role": "admin"}), ("b@example.com", {})])
+    users.changed("b@example.com", {}, None)
+    users.changed("c@example.com", None, {"role": "admin"})
+    assert users.snapshot() == {"admin": 2}
+    products.reset([("apple", {}), ("egg", {})])
+    products.changed("egg", {}, None)
+    assert products.count == 1
+
+def test_stats_endpoint_follows_writes(api, client):
+    products = len(api.products_store.get())
+    api.users_store.add("ann@example.com", {"username": "ann", "role": "user"})
+    api.products_store.add("durian", {"price": 90, "unit": "piece"})
+    api.orders_store.append_order(make_order("E1", total=12.5))
+    api.orders_store.append_order(make_order("E2", total=7.5))
+    api.orders_store.set_status("E2", "cancelled")
+    stats = client.get("/stats").json()
+    assert stats["users"] == {"by_role": {"user": 1}}
+    assert stats["products"] == {"count": products + 1}
+    assert {k: stats["orders"][k] for k in ("total", "by_status", "revenue")} == \
+        {"total": 2, "by_status": {"pending": 1, "cancelled": 1}, "revenue": 12.5}
+    assert [o["order_id"] for o in stats["orders"]["recent"]] == ["E2", "E1"]
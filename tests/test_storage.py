@@ -0,0 +1,37 @@
+import pytest
+from conftest import make_order
+import storage
+
+def test_migration_copies_json_data_and_can_be_rerun(data_dir):
+    source = storage.open_json_storage()
+    source.users.add("ann@example.com", {"username": "ann", "role": "user"})
+    products = len(source.products.get())
+    source.orders.append_order(make_order("M1"))
+    source.orders.append_order(make_order("M2"))
+    source.orders.set_status("M2", "shipped")
+    # Opened before the import, so it has to notice a write that is not in the change log.
+    early = storage.open_sqlite_storage("grocery.db")
+    early.users.check_interval = 0
+    assert early.users.get() == {}
+    assert storage.migrate_json_to_sqlite("grocery.db") == (1, products, 2)
+    assert storage.migrate_json_to_sqlite("grocery.db") == (1, products, 2)
+    target = storage.open_sqlite_storage("grocery.db")
+    assert target.users.get() == source.users.get() == early.users.get()
+    assert target.products.get() == source.products.get()
+    assert [(o["order_id"], o["status"]) for o in target.orders.all()] == [("M1", "pending"), ("M2", "shipped")]
+    assert [o["order_id"] for o in target.orders.by_status("shipped")] == ["M2"]
+
+def test_both_backends_behave_alike(data_dir, backend):
+    store = storage.open_sqlite_storage("grocery.db") if backend == "sqlite" else storage.open_json_storage()
+    assert store.users.add("a@example.com", {"n": 1})
+    assert not store.users.add("a@example.com", {"n": 2})
+    assert store.users.replace("a@example.com", {"n": 3})
+    assert store.users.lookup("a@example.com") == {"n": 3}
+    assert store.users.delete("a@example.com") and store.users.lookup("a@example.com") is None
+    assert store.orders.append_order(make_order("K1"))
+    assert not store.orders.append_order(make_order("K1"))
+    assert store.orders.get("K1")["email"] == "ann@example.com"
+
+def test_unknown_backend_is_refused():
+    with pytest.raises(ValueError):
+        storage.open_storage("mongo")
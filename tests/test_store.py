@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from store import GroupCommitter, JsonFile, atomic_write_json
+
+class Recorder:
+    """Key-value listener that mirrors the store"""
+
+    def __init__(self):
+        self.items = {}
+        self.resets = 0
+
+    def reset(self, items):
+        self.resets += 1
+        self.items = dict(items)
+
+    def changed(self, key, old, new):
+        assert self.items.get(key) == old
+        if new is None:
+            del self.items[key]
+        else:
+            self.items[key] = new
+
+def test_cached_dict_is_shared_until_a_write_swaps_it(tmp_path):
+    users = JsonFile(str(tmp_path / "users.json"))
+    first = users.get()
+    assert first == {} and users.get() is first
+    assert users.batch([("add", "a", {"n": 1}), ("add", "a", {"n": 2}), ("replace", "b", {}), ("delete", "c", None)]) \
+        == [True, False, False, False]
+    assert first == {}
+    assert users.get() == {"a": {"n": 1}}
+    assert JsonFile(str(tmp_path / "users.json")).get() == {"a": {"n": 1}}
+
+def test_listeners_follow_writes_and_hand_edits(tmp_path):
+    path = tmp_path / "users.json"
+    users = JsonFile(str(path), check_interval=0)
+    recorder = Recorder()
+    users.get()
+    users.subscribe(recorder)
+    users.add("a", {"n": 1})
+    users.replace("a", {"n": 2})
+    users.add("b", {"n": 3})
+    users.delete("b")
+    assert recorder.items == {"a": {"n": 2}} and recorder.resets == 1
+    # Edited by hand (a different size, so the stamp moves even within one mtime tick).
+    path.write_text(json.dumps({"z": {"edited": True}}))
+    assert users.get() == {"z": {"edited": True}}
+    assert recorder.items == {"z": {"edited": True}} and recorder.resets == 2
+
+def test_other_instances_reload_when_the_shared_version_moves(tmp_path):
+    reader = JsonFile(str(tmp_path / "products.json"), check_interval=60)
+    writer = JsonFile(str(tmp_path / "products.json"))
+    assert reader.get() == {}
+    writer.add("apple", {"price": 10})
+    assert reader.get() == {"apple": {"price": 10}}
+    assert reader.current_version() == writer.current_version()
+
+def test_default_is_saved_once(tmp_path):
+    products = JsonFile(str(tmp_path / "products.json"), default=lambda: {"apple": {"price": 1}}, save_default=True)
+    assert products.get() == {"apple": {"price": 1}}
+    assert json.loads((tmp_path / "products.json").read_text()) == {"apple": {"price": 1}}
+
+def test_concurrent_jobs_share_commits_and_get_their_own_results():
+    groups = []
+
+    def commit(jobs):
+        groups.append(len(jobs))
+        time.sleep(0.01)
+        return [job * 2 for job in jobs]
+
+    committer = GroupCommitter(commit)
+    with ThreadPoolExecutor(16) as pool:
+        results = list(pool.map(committer.submit, range(64)))
+    assert results == [i * 2 for i in range(64)]
+    assert sum(groups) == 64 and len(groups) < 64
+
+def test_a_failed_commit_fails_every_job_in_its_group():
+    def commit(jobs):
+        raise OSError("disk full")
+
+    with pytest.raises(OSError, match="disk full"):
+        GroupCommitter(commit).submit("job")
+
+def test_interrupted_write_leaves_the_old_file(tmp_path, monkeypatch):
+    path = tmp_path / "users.json"
+    atomic_write_json(str(path), {"a": 1})
+
+    def crash(src, dst):
+        raise OSError("power cut")
+
+    monkeypatch.setattr(os, "replace", crash)
+    with pytest.raises(OSError):
+        atomic_write_json(str(path), {"a": 2})
+    assert json.loads(path.read_text()) == {"a": 1}
+
+def test_concurrent_writers_all_land(tmp_path):
+    users = JsonFile(str(tmp_path / "users.json"))
+    threads = [threading.Thread(target=users.add, args=(f"u{i}", {"n": i})) for i in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert JsonFile(str(tmp_path / "users.json")).get() == {f"u{i}": {"n": i} for i in range(50)}
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]